@@ -28,4 +28,8 @@ def create_app(config_name):
     # 导入 tasks 以注册 Huey 任务
     from . import tasks
 
+    # 阅读与封面生成优先读取扫描时持久化的页索引
+    from .services.page_index_service import install_page_index_loader
+    install_page_index_loader()
+
     return app 
@@ -1,25 +1,79 @@
-from flask import abort, current_app, jsonify, request, Response, send_file, stream_with_context
+from flask import abort, current_app, g, jsonify, request, Response, send_file, stream_with_context
+from werkzeug.wsgi import wrap_file
 from . import api
-from ...models import File, Tag
+from .bookmarks import bookmark_to_dict
+from ...models import Bookmark, File, Tag
 from ... import db
-import io
 import os
 import re
 import hashlib
+import json
+import uuid
+from dataclasses import replace
 from loguru import logger
-from PIL import Image, ImageOps
 from sqlalchemy.orm import selectinload
 from sqlalchemy.sql.expression import func
 from ...infrastructure.archive_reader import (
+    close_archive_handles,
+    get_archive_handle_pool,
     get_entry_by_index,
+    get_entry_flights,
     get_entry_metadata as get_cached_entry_metadata,
+    get_rar_extract_cache,
+    get_seven_zip_reader,
+    get_stored_entry_range,
     guess_mimetype,
     iter_entry_chunks,
-    read_entry_stream,
 )
-from ...services.cover_service import CoverPathConfig, get_cover_path
-from ...services.settings_service import get_bool_setting, get_cover_cache_shard_count, get_int_setting, get_str_setting
+from ...infrastructure.file_range import open_file_range
+from ...services.auto_size_service import (
+    CLIENT_HINT_HEADERS,
+    client_key,
+    get_auto_size_mode,
+    get_throughput_estimator,
+    record_reported_samples,
+    resolve_auto_max_side_px,
+)
+from ...services.book_warm_service import get_book_warmer, note_reader_params, schedule_next_book_warm, schedule_startup_warm
+from ...services.cover_service import ensure_cover_variant, select_cover_width
+from ...services.cover_store_service import get_cover_store
+from ...services.page_geometry_service import load_page_geometry, probe_entry_size, seed_page_tones
+from ...services.page_prefetch_service import get_page_prefetcher, schedule_page_prefetch, should_warm_original
+from ...infrastructure.admission import AdmissionRejected
+from ...services.page_render_service import (
+    configure_preview_sources_from_settings,
+    configure_render_admission_from_settings,
+    configure_render_pool_from_settings,
+    find_cached_downscaled,
+    get_page_tone_stats,
+    get_preview_sources,
+    get_render_admission,
+    get_render_pool,
+    get_encode_stats,
+    get_render_flights,
+    is_format_negotiation_enabled,
+    iter_page_batch,
+    lookup_preview_source,
+    negotiate_output_format,
+    page_cache_key,
+    plan_page_batch,
+    render_page_cached,
+    resolve_page_render_params,
+)
+from ...services.page_thumbnail_service import (
+    ThumbnailPathConfig,
+    claim_thumbnail_request,
+    get_thumbnail_settings,
+    get_thumbnail_stats,
+    load_thumbnail_index,
+)
+from ...services.page_tile_service import compute_tile_levels, render_page_tile, tile_base_key, tile_cache_key
+from ...services.rar_extract_service import configure_rar_extract_cache_from_settings
+from ...services.reader_manifest_service import build_manifest_pages, render_query
+from ...services.render_cache_service import configure_render_cache_from_settings, get_render_cache, is_render_cache_enabled
+from ...services.settings_service import get_bool_setting, get_cover_cache_shard_count, get_cover_sizes, get_int_setting, get_str_setting
 from ...tasks.rename import rename_single_file_inplace, sanitize_filename
+from ...tasks.thumbnails import build_thumbnail_pack_task
 from ...services.task_service import create_task_record, fail_task, finish_task, mark_task_running, update_task_progress
 READING_STATUS_OPTIONS = {'unread', 'in_progress', 'finished'}
 SORTABLE_COLUMNS = {
@@ -32,6 +86,22 @@ SORTABLE_COLUMNS = {
     'reading_status': lambda: File.reading_status,
 }
 
+def cover_variant_widths():
+    """返回 (可用的封面缩略宽度, 主封面宽度)；缩略宽度只保留小于主封面的，同一请求内只读取一次设置。"""
+    cached = getattr(g, 'cover_variant_widths', None)
+    if cached is None:
+        max_width = get_int_setting('scan.cover.max_width', default=500, min_value=64, max_value=4000)
+        cached = ([width for width in get_cover_sizes() if width < max_width], max_width)
+        g.cover_variant_widths = cached
+    return cached
+
+def cover_srcset(cover_url):
+    """封面的 srcset：各缩略宽度 + 主封面，浏览器按显示宽度与 DPR 选择。"""
+    widths, max_width = cover_variant_widths()
+    candidates = [f'{cover_url}&size={width} {width}w' for width in widths]
+    candidates.append(f'{cover_url} {max_width}w')
+    return ', '.join(candidates)
+
 def file_to_dict(file_obj, is_liked=False):
     """将 File 对象转换为前端使用的字典。"""
     display_name = os.path.basename(file_obj.file_path) if file_obj.file_path else ''
@@ -49,6 +119,7 @@ def file_to_dict(file_obj, is_liked=False):
     else:
         progress_percent = max(0, min(100, round((last_read_page / (total_pages - 1)) * 100)))
 
+    cover_url = f'/api/v1/files/{file_obj.id}/cover?v={file_obj.cover_updated_at or file_obj.file_mtime}'
     data = {
         'id': file_obj.id,
         'file_path': file_obj.file_path,
@@ -66,7 +137,8 @@ def file_to_dict(file_obj, is_liked=False):
         'progress_percent': progress_percent,
         'is_missing': file_obj.is_missing,
         'integrity_status': file_obj.integrity_status,
-        'cover_url': f'/api/v1/files/{file_obj.id}/cover?v={file_obj.cover_updated_at or file_obj.file_mtime}',
+        'cover_url': cover_url,
+        'cover_srcset': cover_srcset(cover_url),
         'tags': [{'id': t.id, 'name': t.name, 'type_id': t.type_id} for t in file_obj.tags],
         'tag_ids': [t.id for t in file_obj.tags]
     }
@@ -81,234 +153,263 @@ def file_to_dict(file_obj, is_liked=False):
         data['liked_at'] = file_obj.like_item.added_at.isoformat() if file_obj.like_item.added_at else None
     return data
 
-def build_page_response(file_path, page_num):
+def request_client_key():
+    """当前请求的客户端键（经反向代理时取 X-Forwarded-For 中的原始地址）。"""
+    route = request.access_route
+    return client_key(route[0] if route else (request.remote_addr or ''), request.headers.get('User-Agent', ''))
+
+
+def lookup_page_size(file_record, page_num):
+    """扫描后记录的页面尺寸；尚未记录时返回 None（不为此读取压缩包）。"""
+    sizes = load_page_geometry(file_record)
+    if sizes is not None and 0 <= page_num < len(sizes):
+        return sizes[page_num]
+    return None
+
+
+def apply_auto_max_side_px(params, file_record, page_num):
     """
-    按页返回图片。
+    自动分辨率：max_side_px=auto 的请求（cap 模式下为所有请求）按客户端提示与实测吞吐选择预设。
 
-    - 默认：流式输出原图，避免整本或整页一次性堆入内存。
-    - 可选：根据参数对页面做缩放渲染（用于降低加载成本/缓解摩尔纹）。
+    - auto：直接使用选出的预设（0 表示原图）；无法判断时使用设置中的默认值。
+    - cap：选出的预设只作为上限，原图请求同样受限。
     """
-    entry = get_entry_by_index(file_path, page_num)
-    if entry is None:
-        return None
+    mode = get_auto_size_mode()
+    wants_auto = str(request.args.get('max_side_px') or '').strip().lower() == 'auto'
+    if params.preview or mode == 'off' or not (wants_auto or mode == 'cap'):
+        return params
+
+    # 结果随客户端提示变化：响应需要 Vary 这些请求头
+    g.render_vary_hints = True
+    target = resolve_auto_max_side_px(
+        request.headers,
+        client=request_client_key(),
+        page_size=lookup_page_size(file_record, page_num),
+    )
+    if target is None:
+        return params
+    if wants_auto or params.max_side_px <= 0:
+        return replace(params, max_side_px=target)
+    if target > 0:
+        return replace(params, max_side_px=min(params.max_side_px, target))
+    return params
 
-    # 说明：前端会把设置拼到查询参数里，确保“切换分辨率/质量”可以立刻刷新当前页。
-    # 未传参数时仍保持老行为（原图流式输出）。
-    max_side_px_raw = request.args.get('max_side_px')
-    format_raw = request.args.get('format')
-    quality_raw = request.args.get('quality')
-    resample_raw = request.args.get('resample')
 
-    default_max_side_px = get_int_setting('ui.reader.image.max_side_px', default=0, min_value=0, max_value=20000)
-    default_format = get_str_setting('ui.reader.image.render.format', default='webp')
-    default_quality = get_int_setting('ui.reader.image.render.quality', default=82, min_value=1, max_value=100)
-    default_resample = get_str_setting('ui.reader.image.render.resample', default='bilinear')
-    default_optimize = get_bool_setting('ui.reader.image.render.optimize', default=False)
-    default_webp_method = get_int_setting('ui.reader.image.render.webp_method', default=0, min_value=0, max_value=6)
+@api.route('/reader/throughput-samples', methods=['POST'])
+def report_throughput_samples():
+    """
+    阅读器上报页图下载样本：{"samples": [{"bytes": transferSize, "ms": 响应体下载耗时}, ...]}。
 
-    cache_enabled = get_bool_setting('ui.reader.image.cache.enabled', default=True)
-    cache_max_age_s = get_int_setting('ui.reader.image.cache.max_age_s', default=31536000, min_value=0, max_value=31536000)
-    cache_immutable = get_bool_setting('ui.reader.image.cache.immutable', default=True)
+    样本更新该客户端的下行吞吐估计，供自动分辨率使用；自动分辨率关闭时直接忽略。
+    """
+    payload = request.get_json(silent=True) or {}
+    samples = payload.get('samples') if isinstance(payload, dict) else None
+    if not isinstance(samples, list):
+        return jsonify({'error': 'samples 必须是数组'}), 400
+    if get_auto_size_mode() != 'off':
+        record_reported_samples(request_client_key(), samples)
+    return '', 204
 
-    def parse_int(raw_value):
-        if raw_value is None or raw_value == '':
-            return None
-        try:
-            return int(str(raw_value).strip())
-        except ValueError:
-            return None
 
-    max_side_px = parse_int(max_side_px_raw)
-    if max_side_px is None:
-        max_side_px = default_max_side_px
-    max_side_px = max(0, min(20000, int(max_side_px)))
+def resolve_request_render_params(*, negotiate_original=False, file_record=None, page_num=0):
+    """
+    解析当前请求的渲染参数：传入 file_record 时应用自动分辨率，开启格式协商时按 Accept 选择缩放输出格式。
+
+    原图请求（max_side_px=0）不协商，ETag 不随 Accept 变化；瓦片始终重新编码，传 negotiate_original=True。
+    """
+    params = resolve_page_render_params(request.args)
+    if file_record is not None:
+        params = apply_auto_max_side_px(params, file_record, page_num)
+    if (params.max_side_px > 0 or negotiate_original) and is_format_negotiation_enabled():
+        accepted = [value for value, quality in request.accept_mimetypes if quality > 0]
+        params = replace(params, output_format=negotiate_output_format(params.output_format, accepted))
+    return params
 
-    output_format = str(format_raw or default_format or 'webp').strip().lower()
-    quality = parse_int(quality_raw)
-    if quality is None:
-        quality = default_quality
-    quality = max(1, min(100, int(quality)))
 
-    resample_name = str(resample_raw or default_resample or 'lanczos').strip().lower()
+def add_render_vary(response, params=None):
+    """
+    声明影响渲染结果的请求头：输出格式随 Accept 协商时加入 Accept（避免共享缓存把 AVIF/WebP 交给不支持的客户端），
+    使用自动分辨率时加入客户端提示头，并以 X-Render-Max-Side 告知实际使用的最长边（0 表示原图）。
+    """
+    if is_format_negotiation_enabled() and (params is None or params.max_side_px > 0):
+        response.vary.add('Accept')
+    if g.get('render_vary_hints'):
+        for header in CLIENT_HINT_HEADERS:
+            response.vary.add(header)
+        if params is not None:
+            response.headers['X-Render-Max-Side'] = str(params.max_side_px)
+    return response
 
-    optimize = parse_bool(request.args.get('optimize'))
-    if optimize is None:
-        optimize = default_optimize
 
-    webp_method = parse_int(request.args.get('webp_method'))
-    if webp_method is None:
-        webp_method = default_webp_method
-    webp_method = max(0, min(6, int(webp_method)))
+def build_page_response(file_path, page_num, params=None):
+    """
+    按页返回图片。
 
-    # ETag：基于文件签名 + 页码 + 渲染参数，避免重复缩放/解压。
+    - 默认：流式输出原图，避免整本或整页一次性堆入内存。
+    - 可选：根据参数对页面做缩放渲染（用于降低加载成本/缓解摩尔纹）。
+    - params 缺省时从查询参数解析（见 resolve_page_render_params）。
+    - 渲染并发已满时按 reader.overload.policy 降级（原图 / 已缓存的较小尺寸 / 503），
+      降级响应不带 ETag 且禁止缓存，避免客户端长期保留降级结果。
+    """
+    entry = get_entry_by_index(file_path, page_num)
+    if entry is None:
+        return None
+
+    if params is None:
+        params = resolve_request_render_params()
+    configure_rar_extract_cache_from_settings(file_path)
+
+    cache_control = get_page_cache_control()
+
+    # ETag：基于文件签名 + 页码 + 渲染参数，避免重复缩放/解压；同时作为服务端渲染缓存的键。
     # - 即使开启 immutable 缓存，该 ETag 也可用于更保守的缓存策略（或调试）。
-    try:
-        stat = os.stat(file_path)
-        file_sig = f'{int(stat.st_mtime)}-{int(stat.st_size)}'
-    except Exception:
-        file_sig = '0-0'
-
-    etag_source = '|'.join(
-        [
-            file_sig,
-            str(page_num),
-            str(entry.name or ''),
-            str(entry.size or ''),
-            str(max_side_px),
-            str(output_format),
-            str(quality),
-            str(resample_name),
-            str(int(optimize)),
-            str(webp_method),
-        ]
-    )
-    etag_value = f'W/"{hashlib.sha1(etag_source.encode("utf-8")).hexdigest()}"'
-    if request.headers.get('If-None-Match') == etag_value:
+    etag_digest = page_cache_key(file_path, page_num, entry, params)
+    etag_value = f'W/"{etag_digest}"'
+    # 字节区间输出的页面与压缩包内字节完全一致，使用强 ETag（If-Range 只接受强校验）
+    stored_etag = f'"{etag_digest}"'
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match in (etag_value, stored_etag):
         response = Response(status=304)
-        response.headers['ETag'] = etag_value
-        if cache_enabled and cache_max_age_s > 0:
-            response.headers['Cache-Control'] = f'private, max-age={cache_max_age_s}{", immutable" if cache_immutable else ""}'
-        else:
-            response.headers['Cache-Control'] = 'no-store'
+        response.headers['ETag'] = if_none_match
+        response.headers['Cache-Control'] = cache_control
         return response
 
-    if max_side_px > 0:
-        rendered = render_page_image(
-            file_path,
-            entry,
-            max_side_px=max_side_px,
-            output_format=output_format,
-            quality=quality,
-            resample=resample_name,
-            optimize=optimize,
-            webp_method=webp_method,
-        )
-        if rendered is not None:
-            data, mimetype = rendered
+    degraded = None
+    if params.max_side_px > 0:
+        configure_render_pool_from_settings()
+        configure_preview_sources_from_settings()
+        admission = configure_render_admission_from_settings()
+        # 服务端渲染缓存：键与 ETag 同源，命中时既不读压缩包也不经过 Pillow
+        render_cache = configure_render_cache_from_settings() if is_render_cache_enabled() else None
+        wait_ms = get_int_setting('reader.overload.wait_ms', default=800, min_value=0, max_value=30000)
+        try:
+            rendered = render_page_cached(
+                file_path,
+                entry,
+                params,
+                cache_key=etag_digest,
+                cache=render_cache,
+                wait_s=wait_ms / 1000,
+            )
+        except AdmissionRejected:
+            policy = get_str_setting('reader.overload.policy', default='original').strip().lower()
+            logger.info('渲染并发已满，按 {} 策略降级: {} | 页码: {} | {}', policy, file_path, page_num, admission.stats())
+            if policy == 'reject':
+                return build_overload_response()
+            if policy == 'downscale':
+                found = find_cached_downscaled(file_path, page_num, entry, params, render_cache)
+                if found is not None:
+                    max_side_px, smaller = found
+                    response = Response(smaller.data, mimetype=smaller.mimetype, direct_passthrough=True)
+                    response.headers['Content-Length'] = str(len(smaller.data))
+                    response.headers['Cache-Control'] = 'no-store'
+                    response.headers['X-Render-Degraded'] = f'downscaled:{max_side_px}'
+                    return response
+            # 没有可用的较小尺寸时同样回退为原图：原图只需解压，不经过 Pillow
+            degraded = 'original'
+            rendered = None
+        if rendered is not None and not rendered.passthrough:
+            data, mimetype = rendered.data, rendered.mimetype
             response = Response(data, mimetype=mimetype, direct_passthrough=True)
             response.headers['Content-Length'] = str(len(data))
             response.headers['ETag'] = etag_value
-            if cache_enabled and cache_max_age_s > 0:
-                response.headers['Cache-Control'] = f'private, max-age={cache_max_age_s}{", immutable" if cache_immutable else ""}'
-            else:
-                response.headers['Cache-Control'] = 'no-store'
+            response.headers['Cache-Control'] = cache_control
             return response
 
     mimetype = guess_mimetype(entry.name)
     content_length = entry.size
+
+    def finish(response, etag=etag_value):
+        if degraded:
+            response.headers['Cache-Control'] = 'no-store'
+            response.headers['X-Render-Degraded'] = degraded
+        else:
+            response.headers['ETag'] = etag
+            response.headers['Cache-Control'] = cache_control
+        return response
+
+    # RAR/7z 原图：后台预热过的页面直接从内存返回，不再解压
+    if not degraded and should_warm_original(file_path) and is_render_cache_enabled():
+        warmed = configure_render_cache_from_settings().get(etag_digest, memory_only=True)
+        if warmed is not None and not warmed.passthrough:
+            response = Response(warmed.data, mimetype=warmed.mimetype, direct_passthrough=True)
+            response.headers['Content-Length'] = str(len(warmed.data))
+            return finish(response)
     chunk_kb = get_int_setting('reader.stream.chunk_kb', default=512, min_value=64, max_value=4096)
     chunk_size = chunk_kb * 1024
 
+    # 未压缩的 Zip 页面：直接输出压缩包文件中的字节区间，不经过解压流程
+    stored_range = None
+    if get_bool_setting('reader.stream.zero_copy', default=True):
+        stored_range = get_stored_entry_range(file_path, entry)
+    if stored_range is not None:
+        response = build_stored_page_response(file_path, stored_range, mimetype, None if degraded else stored_etag, chunk_size)
+        if response is not None and response.status_code == 416:
+            return response
+        if response is not None:
+            return finish(response, etag=stored_etag)
+
+    # 刚请求过预览图的页面：直接使用预览读取的原始字节，不再解压
+    kept = lookup_preview_source(file_path, entry)
+    if kept is not None:
+        response = Response(kept, mimetype=mimetype, direct_passthrough=True)
+        response.headers['Content-Length'] = str(len(kept))
+        return finish(response)
+
     def generate():
         yield from iter_entry_chunks(file_path, entry, chunk_size=chunk_size)
 
     response = Response(stream_with_context(generate()), mimetype=mimetype, direct_passthrough=True)
     if content_length:
         response.headers['Content-Length'] = str(content_length)
-    response.headers['ETag'] = etag_value
-    if cache_enabled and cache_max_age_s > 0:
-        response.headers['Cache-Control'] = f'private, max-age={cache_max_age_s}{", immutable" if cache_immutable else ""}'
-    else:
-        response.headers['Cache-Control'] = 'no-store'
-    return response
+    return finish(response)
 
 
-def render_page_image(file_path, entry, *, max_side_px: int, output_format: str, quality: int, resample: str, optimize: bool, webp_method: int):
+def build_stored_page_response(file_path, stored_range, mimetype, etag_value, chunk_size):
     """
-    将页面图片缩放后再返回（用于降低传输与渲染压力）。
+    以文件字节区间返回未压缩页面（支持单段 Range 请求）。
 
-    返回： (bytes, mimetype) 或 None（表示回退到原图流式输出）。
+    - 响应体为 wsgi.file_wrapper：gunicorn 等服务器会使用 sendfile，页面数据不经过 Python。
+    - 多段 Range 或单位不是 bytes 时忽略 Range，返回完整页面。
+    - etag_value 必须是强 ETag（或 None）：带 If-Range 的请求只有与之完全一致时才按 Range 返回，
+      弱 ETag、日期或 etag_value 为 None 时一律返回完整页面（RFC 9110 13.1.5）。
+      响应头中的 ETag 由调用方设置。
+
+    返回：Response 或 None（文件不可读，调用方回退为解压流式输出）。
     """
-    if max_side_px <= 0:
-        return None
+    data_offset, length = stored_range
+    start, stop = 0, length
+    status = 200
+
+    byte_range = request.range
+    # If-Range 与当前强 ETag 不一致时说明客户端持有的可能是旧内容，按规范返回完整页面
+    if_range = request.headers.get('If-Range')
+    range_valid = not if_range or (etag_value is not None and not etag_value.startswith('W/') and if_range == etag_value)
+    if byte_range is not None and byte_range.units == 'bytes' and len(byte_range.ranges) == 1 and range_valid:
+        bounds = byte_range.range_for_length(length)
+        if bounds is None:
+            response = Response(status=416)
+            response.headers['Content-Range'] = f'bytes */{length}'
+            response.headers['Accept-Ranges'] = 'bytes'
+            return response
+        start, stop = bounds
+        status = 206
 
-    stream = read_entry_stream(file_path, entry)
-    if stream is None:
+    body = open_file_range(file_path, data_offset + start, stop - start)
+    if body is None:
         return None
 
-    resampling = getattr(Image, 'Resampling', Image)
-    resample_map = {
-        'nearest': resampling.NEAREST,
-        'bilinear': resampling.BILINEAR,
-        'bicubic': resampling.BICUBIC,
-        'lanczos': resampling.LANCZOS,
-    }
-    resample_filter = resample_map.get(str(resample or '').strip().lower(), resampling.LANCZOS)
-
-    def normalize_output_format(value: str, original: str | None) -> str:
-        v = str(value or '').strip().lower()
-        if v in {'jpg', 'jpeg'}:
-            return 'JPEG'
-        if v == 'png':
-            return 'PNG'
-        if v == 'webp':
-            return 'WEBP'
-        if v in {'auto', '', 'origin', 'original'}:
-            if original and str(original).upper() in {'JPEG', 'PNG', 'WEBP'}:
-                return str(original).upper()
-            return 'WEBP'
-        return 'WEBP'
-
-    def mimetype_for_format(fmt: str) -> str:
-        fmt = str(fmt or '').upper()
-        if fmt == 'PNG':
-            return 'image/png'
-        if fmt == 'WEBP':
-            return 'image/webp'
-        return 'image/jpeg'
-
-    def prepare_for_jpeg(image: Image.Image) -> Image.Image:
-        if image.mode == 'RGB' or image.mode == 'L':
-            return image
-        if image.mode in {'RGBA', 'LA'}:
-            background = Image.new('RGB', image.size, (255, 255, 255))
-            alpha = image.split()[-1]
-            background.paste(image, mask=alpha)
-            return background
-        if image.mode == 'P':
-            rgba = image.convert('RGBA')
-            background = Image.new('RGB', rgba.size, (255, 255, 255))
-            background.paste(rgba, mask=rgba.split()[-1])
-            return background
-        return image.convert('RGB')
-
-    try:
-        stream.seek(0)
-        with Image.open(stream) as img:
-            # JPEG 可以使用 draft 降低解码分辨率，避免超大图完整解码带来的卡顿。
-            try:
-                if getattr(img, 'format', None) == 'JPEG':
-                    img.draft('RGB', (max_side_px, max_side_px))
-            except Exception:
-                pass
-
-            # 修正可能存在的 EXIF 旋转信息，避免缩放后方向错误。
-            img = ImageOps.exif_transpose(img)
-
-            if max(img.width, img.height) <= max_side_px:
-                return None
-
-            fmt = normalize_output_format(output_format, getattr(img, 'format', None))
-            img.thumbnail((max_side_px, max_side_px), resample=resample_filter)
-
-            out = io.BytesIO()
-            save_kwargs = {}
-            if fmt == 'JPEG':
-                save_kwargs = {'quality': int(quality), 'optimize': bool(optimize)}
-            elif fmt == 'WEBP':
-                save_kwargs = {'quality': int(quality), 'method': int(webp_method)}
-            elif fmt == 'PNG':
-                save_kwargs = {'optimize': bool(optimize)}
-
-            image_to_save = img
-            if fmt == 'JPEG':
-                image_to_save = prepare_for_jpeg(img)
-
-            image_to_save.save(out, format=fmt, **save_kwargs)
-            return out.getvalue(), mimetype_for_format(fmt)
-    except Exception as exc:
-        logger.warning('渲染缩放页面失败: {} | 条目: {} | 错误: {}', file_path, getattr(entry, 'name', ''), exc)
-        return None
+    response = Response(
+        wrap_file(request.environ, body, buffer_size=chunk_size),
+        status=status,
+        mimetype=mimetype,
+        direct_passthrough=True,
+    )
+    response.headers['Content-Length'] = str(stop - start)
+    response.headers['Accept-Ranges'] = 'bytes'
+    if status == 206:
+        response.headers['Content-Range'] = f'bytes {start}-{stop - 1}/{length}'
+    return response
 
 
 def parse_int_list(raw_value):
@@ -353,6 +454,15 @@ def get_page_details_from_archive(file_path, page_num):
         return None, None
     return None, None
 
+@api.before_app_request
+def warm_recent_books_on_startup():
+    """进程收到的第一个请求触发一次启动预热（最近阅读的若干本书），之后直接返回。"""
+    try:
+        schedule_startup_warm()
+    except Exception as exc:
+        logger.warning('安排启动预热失败: {}', exc)
+
+
 @api.route('/files', methods=['GET'])
 def get_files():
     """
@@ -551,6 +661,8 @@ def rename_file_based_on_tags(file_obj):
     # 执行重命名
     if new_path != file_obj.file_path:
         try:
+            # Windows 上池内打开的句柄会阻止改名
+            close_archive_handles(file_obj.file_path)
             os.rename(file_obj.file_path, new_path)
             file_obj.file_path = new_path
             return True, None  # 成功
@@ -704,6 +816,19 @@ def handle_file_details(id):
             file_record.reading_status = 'in_progress'
         db.session.commit()
 
+    if requested_status is not None or requested_page is not None:
+        # 接近末尾时后台预热同目录下一本（页索引 + 前几页）
+        try:
+            schedule_next_book_warm(file_record)
+        except Exception as exc:
+            logger.warning('安排下一本预热失败: {} | 错误: {}', file_record.file_path, exc)
+        # 阅读进度更新即视为打开了这本书：按需生成缩略图包（GET 接口只读，不在其中提交任务）
+        if file_record.reading_status != 'unread':
+            try:
+                request_thumbnail_pack(file_record)
+            except Exception as exc:
+                logger.warning('按需提交缩略图任务失败: {} | 错误: {}', file_record.file_path, exc)
+
     result = file_to_dict(file_record)
     if db_task_id is not None:
         result['db_task_id'] = db_task_id
@@ -826,12 +951,177 @@ def get_file_page(id, page_num):
     if page_num < 0 or page_num >= file_record.total_pages:
         return jsonify({'error': '页码超出范围'}), 400
 
-    response = build_page_response(file_record.file_path, page_num)
+    params = resolve_request_render_params(file_record=file_record, page_num=page_num)
+    note_reader_params(params)
+    if params.grayscale and params.max_side_px > 0:
+        seed_page_tones(file_record)
+    response = build_page_response(file_record.file_path, page_num, params=params)
     if response:
+        add_render_vary(response, params)
+        # 后台预热后续页：前端随后的预加载请求直接命中渲染缓存（过载拒绝时不再安排）
+        if is_render_cache_enabled() and response.status_code != 503:
+            try:
+                schedule_page_prefetch(
+                    file_id=file_record.id,
+                    file_path=file_record.file_path,
+                    page_num=page_num,
+                    total_pages=int(file_record.total_pages or 0),
+                    params=params,
+                    cache=configure_render_cache_from_settings(),
+                )
+            except Exception as exc:
+                logger.warning('安排页面预热失败: {} | 页码: {} | 错误: {}', file_record.file_path, page_num, exc)
         return response
 
     return jsonify({'error': '从压缩包读取页面失败'}), 500
 
+# 批量页图接口单次最多返回的页数（双页展开 + 预加载队列足够）
+MAX_BATCH_PAGES = 8
+
+
+def parse_page_range(raw_value):
+    """解析 `10-13` 或 `10` 形式的页码闭区间，返回 (start, end)；格式错误时抛 ValueError。"""
+    text = str(raw_value or '').strip()
+    if not text:
+        raise ValueError('必须提供 range 参数，例如 range=10-13')
+    start_text, sep, end_text = text.partition('-')
+    try:
+        start = int(start_text.strip())
+        end = int(end_text.strip()) if sep else start
+    except ValueError:
+        raise ValueError(f'无效的页码区间："{text}"')
+    if start < 0 or end < start:
+        raise ValueError(f'无效的页码区间："{text}"')
+    return start, end
+
+
+def build_overload_response():
+    """渲染并发已满时的 503 响应（带 Retry-After，禁止缓存）。"""
+    retry_after_s = get_int_setting('reader.overload.retry_after_s', default=2, min_value=1, max_value=60)
+    response = jsonify({'error': '服务器繁忙，请稍后重试'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after_s)
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+def get_page_cache_control():
+    """页图响应的 Cache-Control（与单页接口一致）。"""
+    cache_enabled = get_bool_setting('ui.reader.image.cache.enabled', default=True)
+    cache_max_age_s = get_int_setting('ui.reader.image.cache.max_age_s', default=31536000, min_value=0, max_value=31536000)
+    cache_immutable = get_bool_setting('ui.reader.image.cache.immutable', default=True)
+    if cache_enabled and cache_max_age_s > 0:
+        return f'private, max-age={cache_max_age_s}{", immutable" if cache_immutable else ""}'
+    return 'no-store'
+
+
+@api.route('/files/<int:id>/pages', methods=['GET'])
+def get_file_pages_batch(id):
+    """
+    批量返回连续多页（multipart/mixed），用于双页展开与预加载，减少请求数。
+
+    - 查询参数：range=10-13（闭区间，页码从 0 开始），渲染参数与单页接口相同。
+    - 每个分段带 X-Page-Number 与 ETag（与单页接口的 ETag 相同）；读取失败的页以 JSON 错误分段返回。
+    """
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+
+    try:
+        start, end = parse_page_range(request.args.get('range'))
+    except ValueError as err:
+        return jsonify({'error': str(err)}), 400
+    total_pages = int(file_record.total_pages or 0)
+    if end >= total_pages:
+        return jsonify({'error': '页码超出范围'}), 400
+    if end - start + 1 > MAX_BATCH_PAGES:
+        return jsonify({'error': f'单次最多请求 {MAX_BATCH_PAGES} 页'}), 400
+
+    file_path = file_record.file_path
+    params = resolve_request_render_params(file_record=file_record, page_num=start)
+    configure_rar_extract_cache_from_settings(file_path)
+    if params.grayscale and params.max_side_px > 0:
+        seed_page_tones(file_record)
+    planned = plan_page_batch(file_path, list(range(start, end + 1)), params)
+    if not planned:
+        return jsonify({'error': '从压缩包读取页面失败'}), 500
+
+    cache_control = get_page_cache_control()
+    batch_digest = hashlib.sha1('|'.join(key for _, _, key in planned).encode('utf-8')).hexdigest()
+    etag_value = f'W/"{batch_digest}"'
+    if request.headers.get('If-None-Match') == etag_value:
+        response = Response(status=304)
+        response.headers['ETag'] = etag_value
+        response.headers['Cache-Control'] = cache_control
+        return add_render_vary(response, params)
+
+    render_cache = configure_render_cache_from_settings() if is_render_cache_enabled() else None
+    wait_s = 0.0
+    overloaded = False
+    if params.max_side_px > 0:
+        configure_render_pool_from_settings()
+        admission = configure_render_admission_from_settings()
+        wait_s = get_int_setting('reader.overload.wait_ms', default=800, min_value=0, max_value=30000) / 1000
+        if admission.saturated():
+            # 过载时部分页可能降级为原图：整批响应不可缓存
+            if get_str_setting('reader.overload.policy', default='original').strip().lower() == 'reject':
+                return build_overload_response()
+            overloaded = True
+    boundary = f'page-batch-{uuid.uuid4().hex}'
+    error_body = json.dumps({'error': '从压缩包读取页面失败'}, ensure_ascii=False).encode('utf-8')
+
+    def generate():
+        for part in iter_page_batch(
+            file_path,
+            planned,
+            params,
+            cache=render_cache,
+            warm_original=should_warm_original(file_path),
+            wait_s=wait_s,
+        ):
+            if part.data is not None:
+                body, content_type = part.data, part.mimetype
+            else:
+                body, content_type = error_body, 'application/json; charset=utf-8'
+            # 降级为原图的分段不带 ETag，避免客户端以缩放结果的 ETag 缓存原图
+            tag = 'X-Render-Degraded: original' if part.degraded else f'ETag: W/"{part.cache_key}"'
+            head = (
+                f'--{boundary}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'X-Page-Number: {part.page_num}\r\n'
+                f'{tag}\r\n\r\n'
+            )
+            yield head.encode('ascii') + body + b'\r\n'
+        yield f'--{boundary}--\r\n'.encode('ascii')
+
+    response = Response(
+        stream_with_context(generate()),
+        content_type=f'multipart/mixed; boundary={boundary}',
+        direct_passthrough=True,
+    )
+    if overloaded:
+        response.headers['Cache-Control'] = 'no-store'
+    else:
+        response.headers['ETag'] = etag_value
+        response.headers['Cache-Control'] = cache_control
+    add_render_vary(response, params)
+
+    if render_cache is not None:
+        try:
+            schedule_page_prefetch(
+                file_id=file_record.id,
+                file_path=file_path,
+                page_num=end,
+                total_pages=total_pages,
+                params=params,
+                cache=render_cache,
+            )
+        except Exception as exc:
+            logger.warning('安排页面预热失败: {} | 页码: {} | 错误: {}', file_path, end, exc)
+    return response
+
+
 @api.route('/files/<int:id>/pages/<int:page_num>/metadata', methods=['GET'])
 def get_file_page_details(id, page_num):
     """
@@ -859,26 +1149,392 @@ def get_file_page_details(id, page_num):
         return jsonify({'error': '从压缩包读取页面元数据失败'}), 500
 
 
+@api.route('/files/<int:id>/pages/geometry', methods=['GET'])
+def get_file_page_geometry(id):
+    """
+    返回整本每页的像素尺寸（[宽, 高]，已按 EXIF 方向校正），供前端在图片加载前预留布局。
+
+    尺寸由扫描后的后台任务写入；尚未生成或文件已变更时返回 status=pending，pages 全部为 null。
+    """
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+
+    sizes = load_page_geometry(file_record)
+    page_count = int(file_record.total_pages or 0)
+    if sizes is None:
+        return jsonify({
+            'file_id': file_record.id,
+            'page_count': page_count,
+            'status': 'pending',
+            'pages': [None] * page_count,
+        })
+
+    return jsonify({
+        'file_id': file_record.id,
+        'page_count': len(sizes),
+        'status': 'ready',
+        'pages': [list(size) if size else None for size in sizes],
+    })
+
+
+@api.route('/files/<int:id>/manifest', methods=['GET'])
+def get_file_manifest(id):
+    """
+    阅读会话清单：打开一本书所需的信息一次返回（页列表、带当前渲染参数的页图地址与 ETag、续读页、书签）。
+
+    - 渲染参数同单页接口（含 max_side_px=auto 与格式协商），清单中的页图地址已固定为解析后的参数。
+    - 页列表来自页索引与扫描后记录的页面尺寸，命中缓存时不读取压缩包；尺寸未就绪时 width/height 为 null。
+    - thumbnails 只报告缩略图包是否已生成（ready/pending），不提交生成任务（GET 无副作用）。
+    - 响应带 ETag（随阅读进度、书签变化），If-None-Match 命中时返回 304。
+    """
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+
+    resume_page = max(0, min(int(file_record.last_read_page or 0), max(0, int(file_record.total_pages or 0) - 1)))
+    params = resolve_request_render_params(file_record=file_record, page_num=resume_page)
+    sizes = load_page_geometry(file_record)
+    pages = build_manifest_pages(
+        file_record,
+        params,
+        sizes=sizes,
+        tile_min_side_px=get_int_setting('reader.tiles.min_side_px', default=4096, min_value=0, max_value=100000),
+    )
+    bookmarks = file_record.bookmarks.order_by(Bookmark.page_number.asc()).all()
+    thumbnails = resolve_thumbnail_pack(file_record)
+
+    body = json.dumps({
+        'file_id': file_record.id,
+        'display_name': os.path.basename(file_record.file_path or ''),
+        'file_size': file_record.file_size,
+        'page_count': len(pages),
+        'resume_page': resume_page,
+        'reading_status': file_record.reading_status,
+        'bookmarks': [bookmark_to_dict(bookmark) for bookmark in bookmarks],
+        'render_query': render_query(params),
+        'geometry': 'ready' if sizes is not None else 'pending',
+        'thumbnails': 'ready' if thumbnails is not None else 'pending',
+        'pages': pages,
+    }, ensure_ascii=False, separators=(',', ':'))
+
+    etag_value = f'W/"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+    if request.headers.get('If-None-Match') == etag_value:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.headers['ETag'] = etag_value
+    # 进度与书签随时变化：允许缓存但每次重新验证
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return add_render_vary(response, params)
+
+
+def resolve_tile_size():
+    return get_int_setting('reader.tiles.tile_size', default=1024, min_value=256, max_value=4096)
+
+
+def resolve_page_size(file_record, page_num, entry):
+    """页面像素尺寸：优先使用扫描后记录的页面尺寸，缺失时只读该页图片头。"""
+    sizes = load_page_geometry(file_record)
+    if sizes is not None and page_num < len(sizes) and sizes[page_num]:
+        return sizes[page_num]
+    return probe_entry_size(file_record.file_path, entry)
+
+
+@api.route('/files/<int:id>/pages/<int:page_num>/tiles', methods=['GET'])
+def get_file_page_tiles(id, page_num):
+    """
+    返回超大页面的瓦片描述：原图尺寸、瓦片尺寸与各级（0 级为原尺寸，每级宽高减半）的行列数。
+
+    recommended 表示该页最长边超过 reader.tiles.min_side_px，建议阅读器按视口只取可见瓦片。
+    """
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+    if page_num < 0 or page_num >= (file_record.total_pages or 0):
+        return jsonify({'error': '页码超出范围'}), 400
+
+    entry = get_entry_by_index(file_record.file_path, page_num)
+    if entry is None:
+        return jsonify({'error': '从压缩包读取页面失败'}), 500
+    size = resolve_page_size(file_record, page_num, entry)
+    if size is None:
+        return jsonify({'error': '读取页面尺寸失败'}), 500
+
+    width, height = size
+    tile_size = resolve_tile_size()
+    min_side_px = get_int_setting('reader.tiles.min_side_px', default=4096, min_value=0, max_value=100000)
+    return jsonify({
+        'file_id': file_record.id,
+        'page': page_num,
+        'width': width,
+        'height': height,
+        'tile_size': tile_size,
+        'recommended': max(width, height) >= min_side_px > 0,
+        'url_template': f'/api/v1/files/{file_record.id}/pages/{page_num}/tiles/{{level}}/{{x}}_{{y}}',
+        'levels': [
+            {'level': item.level, 'width': item.width, 'height': item.height, 'cols': item.cols, 'rows': item.rows}
+            for item in compute_tile_levels(width, height, tile_size)
+        ],
+    })
+
+
+@api.route('/files/<int:id>/pages/<int:page_num>/tiles/<int:level>/<int:x>_<int:y>', methods=['GET'])
+def get_file_page_tile(id, page_num, level, x, y):
+    """
+    返回超大页面的单块瓦片（编码参数同单页接口：format/quality/resample）。
+
+    某一级首次被请求时整页解码一次并生成该级全部瓦片写入渲染缓存，之后同级瓦片直接命中。
+    """
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+    if page_num < 0 or page_num >= (file_record.total_pages or 0):
+        return jsonify({'error': '页码超出范围'}), 400
+
+    file_path = file_record.file_path
+    entry = get_entry_by_index(file_path, page_num)
+    if entry is None:
+        return jsonify({'error': '从压缩包读取页面失败'}), 500
+
+    tile_size = resolve_tile_size()
+    size = resolve_page_size(file_record, page_num, entry)
+    if size is None:
+        return jsonify({'error': '读取页面尺寸失败'}), 500
+    levels = compute_tile_levels(size[0], size[1], tile_size)
+    if level < 0 or level >= len(levels) or x >= levels[level].cols or y >= levels[level].rows:
+        return jsonify({'error': '瓦片不存在'}), 404
+
+    params = resolve_request_render_params(negotiate_original=True)
+    base_key = tile_base_key(file_path, page_num, entry, params)
+    etag_value = f'W/"{tile_cache_key(base_key, tile_size, level, x, y)}"'
+    cache_control = get_page_cache_control()
+    if request.headers.get('If-None-Match') == etag_value:
+        response = Response(status=304)
+        response.headers['ETag'] = etag_value
+        response.headers['Cache-Control'] = cache_control
+        return add_render_vary(response)
+
+    configure_rar_extract_cache_from_settings(file_path)
+    configure_render_pool_from_settings()
+    configure_render_admission_from_settings()
+    if params.grayscale:
+        seed_page_tones(file_record)
+    render_cache = configure_render_cache_from_settings() if is_render_cache_enabled() else None
+    wait_ms = get_int_setting('reader.overload.wait_ms', default=800, min_value=0, max_value=30000)
+    try:
+        tile = render_page_tile(
+            file_path,
+            entry,
+            params,
+            base_key=base_key,
+            tile_size=tile_size,
+            level=level,
+            x=x,
+            y=y,
+            cache=render_cache,
+            wait_s=wait_ms / 1000,
+        )
+    except AdmissionRejected:
+        return build_overload_response()
+    if tile is None:
+        return jsonify({'error': '生成页面瓦片失败'}), 500
+
+    response = Response(tile.data, mimetype=tile.mimetype, direct_passthrough=True)
+    response.headers['Content-Length'] = str(len(tile.data))
+    response.headers['ETag'] = etag_value
+    response.headers['Cache-Control'] = cache_control
+    return add_render_vary(response)
+
+
+def resolve_thumbnail_pack(file_record):
+    """返回有效的 (包路径, 偏移表)；尚未生成时返回 None（只读，不提交任务）。"""
+    config = ThumbnailPathConfig(base_dir=current_app.config['THUMBNAIL_PACK_PATH'], shard_count=get_cover_cache_shard_count())
+    return load_thumbnail_index(file_record, config, get_thumbnail_settings())
+
+
+def request_thumbnail_pack(file_record):
+    """缩略图包缺失时按需提交生成任务（reader.thumbnails.lazy，短时间内同一本书只提交一次）；返回包是否已就绪。"""
+    if resolve_thumbnail_pack(file_record) is not None:
+        return True
+    if claim_thumbnail_request(file_record.id):
+        try:
+            build_thumbnail_pack_task(int(file_record.id))
+        except Exception as exc:
+            logger.warning('提交缩略图任务失败: {} | 错误: {}', file_record.file_path, exc)
+    return False
+
+
+@api.route('/files/<int:id>/thumbnails', methods=['GET'])
+def get_file_thumbnails(id):
+    """
+    返回整本页面缩略图的描述：缩略图包地址与每页在包内的 [偏移, 长度, 宽, 高]（生成失败的页为 null）。
+
+    缩略图包由后台任务生成；尚未生成时返回 status=pending（不提交任务，生成由 POST 或阅读进度更新触发）。
+    """
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+
+    found = resolve_thumbnail_pack(file_record)
+    if found is None:
+        return jsonify({'file_id': file_record.id, 'status': 'pending', 'thumbnails': []})
+
+    pack_path, index = found
+    version = int(os.stat(pack_path).st_mtime)
+    return jsonify({
+        'file_id': file_record.id,
+        'status': 'ready',
+        'max_side': index.max_side,
+        'pack_url': f'/api/v1/files/{file_record.id}/thumbnails/pack?v={version}',
+        'thumbnail_url': f'/api/v1/files/{file_record.id}/thumbnails/{{page}}?v={version}',
+        'thumbnails': [list(item) if item[1] > 0 else None for item in index.entries],
+    })
+
+
+@api.route('/files/<int:id>/thumbnails', methods=['POST'])
+def request_file_thumbnails(id):
+    """按需提交整本缩略图包的生成任务：已生成时返回 200（status=ready），否则返回 202（status=pending）。"""
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+
+    if request_thumbnail_pack(file_record):
+        return jsonify({'file_id': file_record.id, 'status': 'ready'})
+    return jsonify({'file_id': file_record.id, 'status': 'pending'}), 202
+
+
+@api.route('/files/<int:id>/thumbnails/pack', methods=['GET'])
+def get_file_thumbnail_pack(id):
+    """返回整本缩略图包（支持 Range，客户端可按描述中的偏移只读取需要的部分）。"""
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+    found = resolve_thumbnail_pack(file_record)
+    if found is None:
+        return jsonify({'error': '缩略图尚未生成'}), 404
+
+    response = send_file(found[0], mimetype='application/octet-stream', conditional=True)
+    # URL 带 v=包的生成时间，包重建后换地址
+    response.headers['Cache-Control'] = get_page_cache_control()
+    return response
+
+
+@api.route('/files/<int:id>/thumbnails/<int:page_num>', methods=['GET'])
+def get_file_thumbnail(id, page_num):
+    """返回单页缩略图（JPEG），直接输出缩略图包中的字节区间。"""
+    file_record = db.session.get(File, id)
+    if not file_record or file_record.is_missing:
+        return jsonify({'error': '文件不存在'}), 404
+    found = resolve_thumbnail_pack(file_record)
+    if found is None:
+        return jsonify({'error': '缩略图尚未生成'}), 404
+
+    pack_path, index = found
+    if page_num < 0 or page_num >= len(index.entries):
+        return jsonify({'error': '页码超出范围'}), 400
+    offset, length, _width, _height = index.entries[page_num]
+    if length <= 0:
+        return jsonify({'error': '该页缩略图生成失败'}), 404
+
+    # 缩略图包重建即换 mtime，同一 mtime 下的字节不变：使用强 ETag 以支持 If-Range
+    etag_value = f'"{hashlib.sha1(f"{pack_path}|{os.stat(pack_path).st_mtime_ns}|{page_num}".encode("utf-8")).hexdigest()}"'
+    cache_control = get_page_cache_control()
+    if request.headers.get('If-None-Match') == etag_value:
+        response = Response(status=304)
+    else:
+        response = build_stored_page_response(pack_path, (offset, length), 'image/jpeg', etag_value, 64 * 1024)
+        if response is None:
+            return jsonify({'error': '读取缩略图失败'}), 500
+    response.headers['ETag'] = etag_value
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
 @api.route('/files/<int:id>/cover', methods=['GET'])
 def get_file_cover(id):
-    """返回指定文件的封面图片（WebP）。"""
+    """
+    返回指定文件的封面图片（WebP）。
+
+    size=<宽度> 时返回不小于该宽度的最小封面缩略图（cover.sizes），首次请求时由主封面生成；
+    超过所有缩略宽度或缩略图生成失败时返回主封面。
+    """
     file_record = db.session.get(File, id)
     if not file_record or file_record.is_missing:
         return jsonify({'error': '文件不存在'}), 404
 
-    cover_base_dir = current_app.config['COVER_CACHE_PATH']
-    shard_count = get_cover_cache_shard_count()
-    cover_path = get_cover_path(CoverPathConfig(base_dir=cover_base_dir, shard_count=shard_count), file_record.id)
+    cover_store = get_cover_store()
+    located = cover_store.locate(file_record.id)
+    width = 0
+
+    size = request.args.get('size', type=int)
+    if located is not None and size is not None and size > 0:
+        width = select_cover_width(size, cover_variant_widths()[0]) or 0
+        if width:
+            variant = ensure_cover_variant(
+                cover_store,
+                file_record.id,
+                width,
+                quality=get_int_setting('cover.sizes.quality', default=75, min_value=1, max_value=100),
+                grayscale=get_bool_setting('scan.cover.grayscale', default=True),
+            )
+            if variant is not None:
+                located = variant
+            else:
+                width = 0
 
-    if not os.path.exists(cover_path):
+    if located is None:
         abort(404)
 
-    response = send_file(cover_path, mimetype='image/webp', conditional=True)
     # URL 已带 v=file_mtime，可视作不可变资源，允许强缓存
-    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    cache_control = 'public, max-age=31536000, immutable'
+    if located.whole_file:
+        response = send_file(located.path, mimetype='image/webp', conditional=True)
+        response.headers['Cache-Control'] = cache_control
+        return response
+
+    # 封面包：按字节区间输出（sendfile），ETag 取封面版本，压缩搬移不改变
+    etag_value = f'"cover-{file_record.id}-{width}-{located.version}"'
+    if request.headers.get('If-None-Match') == etag_value:
+        response = Response(status=304)
+    else:
+        response = build_stored_page_response(located.path, (located.offset, located.length), 'image/webp', etag_value, 64 * 1024)
+        if response is None:
+            # locate 之后压缩任务可能已把封面搬到当前包并删除旧包：重新定位一次（版本不变，ETag 仍然有效）
+            relocated = cover_store.locate(file_record.id, width)
+            if relocated is not None and relocated.path != located.path:
+                response = build_stored_page_response(relocated.path, (relocated.offset, relocated.length), 'image/webp', etag_value, 64 * 1024)
+        if response is None:
+            abort(404)
+    response.headers['ETag'] = etag_value
+    response.headers['Cache-Control'] = cache_control
     return response
 
 
+@api.route('/stats/reader', methods=['GET'])
+def get_reader_stats():
+    """返回阅读链路的运行时统计（渲染缓存命中率、压缩包句柄池、7z 解压缓存、RAR 整本解压缓存、后台预热、并发合并、渲染进程池、渲染并发上限、灰度判定记录、各输出格式编码体积与耗时、客户端吞吐估计、预览原始字节缓存、整书预热、缩略图包），仅反映当前进程。"""
+    return jsonify({
+        'render_cache': get_render_cache().stats(),
+        'archive_handles': get_archive_handle_pool().stats(),
+        'seven_zip': get_seven_zip_reader().stats(),
+        'rar_extracts': get_rar_extract_cache().stats(),
+        'prefetch': get_page_prefetcher().stats(),
+        'render_pool': get_render_pool().stats(),
+        'admission': get_render_admission().stats(),
+        'page_tones': get_page_tone_stats(),
+        'formats': get_encode_stats().stats(),
+        'preview_sources': get_preview_sources().stats(),
+        'book_warm': get_book_warmer().stats(),
+        'thumbnails': get_thumbnail_stats(),
+        'throughput': get_throughput_estimator().stats(),
+        'single_flight': {
+            'page_reads': get_entry_flights().stats(),
+            'renders': get_render_flights().stats(),
+        },
+    })
+
+
 @api.route('/stats/files', methods=['GET'])
 def get_file_library_stats():
     """
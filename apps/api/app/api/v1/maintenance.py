@@ -1,4 +1,5 @@
-from flask import jsonify, request
+from flask import current_app, jsonify, request
+from loguru import logger
 from . import api
 from sqlalchemy import func
 from ...models import File
@@ -11,7 +12,13 @@ from ...services.task_service import (
     mark_task_running,
     update_task_progress,
 )
-from ...tasks.maintenance import check_integrity_task
+from ...services.cover_store_service import get_cover_store
+from ...services.page_geometry_service import delete_page_geometries
+from ...services.page_index_service import delete_page_indexes
+from ...services.page_thumbnail_service import ThumbnailPathConfig, delete_thumbnail_packs, remove_thumbnail_pack_files
+from ...services.settings_service import get_cover_cache_shard_count
+from ...tasks.maintenance import check_integrity_task, compact_cover_packs_task
+from ...tasks.thumbnails import build_thumbnail_packs_task
 
 @api.route('/integrity-checks', methods=['POST'])
 def check_integrity():
@@ -44,6 +51,64 @@ def check_integrity():
         fail_task(task_record, error_message=f'提交完整性检查任务失败: {str(exc)}')
         return jsonify({'error': f'提交完整性检查任务失败: {str(exc)}'}), 500
 
+@api.route('/thumbnail-pack-builds', methods=['POST'])
+def build_thumbnail_packs():
+    """
+    启动页面缩略图批量生成任务：为缺少（或已过期）缩略图包的书生成，最近阅读的优先。
+    """
+    task_record = create_task_record(
+        name='生成页面缩略图',
+        task_type='thumbnails',
+        status='pending',
+        total_files=0,
+        processed_files=0,
+        progress=0.0,
+        current_file='准备中...',
+    )
+
+    try:
+        task = build_thumbnail_packs_task(task_db_id=task_record.id)
+        task_record.task_id = task.id
+        db.session.commit()
+        return jsonify({
+            'message': '已提交页面缩略图任务，请在任务管理器中查看进度',
+            'task_id': task.id,
+            'db_task_id': task_record.id
+        }), 202
+    except Exception as exc:
+        db.session.rollback()
+        fail_task(task_record, error_message=f'提交页面缩略图任务失败: {str(exc)}')
+        return jsonify({'error': f'提交页面缩略图任务失败: {str(exc)}'}), 500
+
+@api.route('/cover-pack-compactions', methods=['POST'])
+def compact_cover_packs():
+    """
+    启动封面包压缩任务（cover.store.backend=pack 时有效）：回收被重写封面留下的死数据。
+    """
+    task_record = create_task_record(
+        name='压缩封面包',
+        task_type='cover_compact',
+        status='pending',
+        total_files=0,
+        processed_files=0,
+        progress=0.0,
+        current_file='准备中...',
+    )
+
+    try:
+        task = compact_cover_packs_task(task_db_id=task_record.id)
+        task_record.task_id = task.id
+        db.session.commit()
+        return jsonify({
+            'message': '已提交封面包压缩任务，请在任务管理器中查看进度',
+            'task_id': task.id,
+            'db_task_id': task_record.id
+        }), 202
+    except Exception as exc:
+        db.session.rollback()
+        fail_task(task_record, error_message=f'提交封面包压缩任务失败: {str(exc)}')
+        return jsonify({'error': f'提交封面包压缩任务失败: {str(exc)}'}), 500
+
 @api.route('/reports/duplicate-files', methods=['GET'])
 def get_duplicate_files_report():
     """
@@ -100,9 +165,27 @@ def cleanup_missing():
         # Ensure we only try to delete files that are actually marked as missing
         query = File.query.filter(File.id.in_(ids_to_delete), File.is_missing == True)
 
+        deleted_ids = [file_id for (file_id,) in query.with_entities(File.id).all()]
+        delete_page_indexes(deleted_ids)
+        delete_page_geometries(deleted_ids)
+        delete_thumbnail_packs(deleted_ids)
         deleted_count = query.delete(synchronize_session=False)
         db.session.commit()
 
+        # 封面与缩略图包不在数据库事务内：记录删除提交后再删除文件（封面包中的字节计为死数据，由压缩任务回收），失败只记录日志
+        try:
+            get_cover_store().delete(deleted_ids)
+        except Exception as exc:
+            logger.warning('删除缺失文件的封面失败: {}', exc)
+        try:
+            thumbnail_config = ThumbnailPathConfig(
+                base_dir=current_app.config['THUMBNAIL_PACK_PATH'],
+                shard_count=get_cover_cache_shard_count(),
+            )
+            remove_thumbnail_pack_files(thumbnail_config, deleted_ids)
+        except Exception as exc:
+            logger.warning('删除缺失文件的缩略图包失败: {}', exc)
+
         update_task_progress(
             task_record,
             processed_files=int(deleted_count or 0),
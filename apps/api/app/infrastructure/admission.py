@@ -0,0 +1,108 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Generator
+
+# 请求优先级：前台阅读请求优先于后台预热等工作
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+
+
+class AdmissionRejected(Exception):
+    """重活（解压 + 渲染）并发已满，在限定时间内没有拿到执行名额。"""
+
+    def __init__(self, message: str, *, priority: str):
+        super().__init__(message)
+        self.priority = priority
+
+
+class AdmissionController:
+    """
+    重活并发上限与优先级控制（线程安全，进程内有效）。
+
+    - 同时执行的重活不超过 limit；前台请求最多等待 timeout_s，超时抛出 AdmissionRejected，由调用方降级。
+    - 后台工作不等待：只能使用 limit - interactive_reserve 个名额，且有前台请求在等待时一律让路。
+    - limit=0 表示不限制。
+    """
+
+    def __init__(self, *, limit: int = 0, interactive_reserve: int = 1):
+        self._limit = max(0, int(limit))
+        self._reserve = max(0, int(interactive_reserve))
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiting = 0
+        self._admitted = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._rejected = {INTERACTIVE: 0, BACKGROUND: 0}
+        self._max_wait_s = 0.0
+
+    def configure(self, *, limit: int, interactive_reserve: int) -> None:
+        with self._cond:
+            self._limit = max(0, int(limit))
+            self._reserve = max(0, int(interactive_reserve))
+            self._cond.notify_all()
+
+    def saturated(self) -> bool:
+        """当前是否已无空闲名额（用于批量请求在开始输出前决定缓存策略）。"""
+        with self._cond:
+            return self._limit > 0 and (self._active >= self._limit or self._waiting > 0)
+
+    @contextmanager
+    def slot(self, priority: str, timeout_s: float = 0.0) -> Generator[None, None, None]:
+        self.acquire(priority, timeout_s)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def acquire(self, priority: str, timeout_s: float = 0.0) -> None:
+        with self._cond:
+            if self._limit <= 0:
+                self._active += 1
+                self._admitted[priority] += 1
+                return
+
+            if priority == BACKGROUND:
+                if self._waiting > 0 or self._active >= max(1, self._limit - self._reserve):
+                    self._rejected[priority] += 1
+                    raise AdmissionRejected('后台任务让路给前台请求', priority=priority)
+                self._active += 1
+                self._admitted[priority] += 1
+                return
+
+            if self._active < self._limit:
+                self._active += 1
+                self._admitted[priority] += 1
+                return
+
+            started = time.monotonic()
+            deadline = started + max(0.0, timeout_s)
+            self._waiting += 1
+            try:
+                while self._active >= self._limit and self._limit > 0:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected[priority] += 1
+                        raise AdmissionRejected('渲染并发已满', priority=priority)
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting -= 1
+            self._max_wait_s = max(self._max_wait_s, time.monotonic() - started)
+            self._active += 1
+            self._admitted[priority] += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._active = max(0, self._active - 1)
+            self._cond.notify()
+
+    def stats(self) -> Dict[str, object]:
+        with self._cond:
+            return {
+                'limit': self._limit,
+                'interactive_reserve': self._reserve,
+                'active': self._active,
+                'waiting': self._waiting,
+                'admitted': dict(self._admitted),
+                'rejected': dict(self._rejected),
+                'max_wait_ms': round(self._max_wait_s * 1000, 2),
+            }
@@ -0,0 +1,226 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from loguru import logger
+
+# 句柄键：(路径, mtime, size)，文件变更后自然换键，旧句柄随空闲超时回收
+HandleKey = Tuple[str, int, int]
+
+
+@dataclass
+class _PooledHandle:
+    key: HandleKey
+    archive: Any
+    pooled: bool = True
+    # 打开时的代号：discard(path) 之后归还的旧句柄直接关闭，不再入池
+    generation: int = 0
+    idle_since: float = field(default_factory=time.monotonic)
+
+
+def _close_quietly(archive: Any) -> None:
+    try:
+        archive.close()
+    except Exception:
+        pass
+
+
+class ArchiveHandlePool:
+    """
+    已打开压缩包句柄的复用池（线程安全）。
+
+    - 租借模型：同一句柄同一时刻只被一个线程使用，用完归还（Zip/RAR/7z 句柄均非并发安全）。
+    - 容量受限：打开句柄总数不超过 max_handles，超出时按 LRU 淘汰空闲句柄；
+      全部被占用时临时打开一个不入池的句柄，归还即关闭。
+    - 空闲超时：后台清理线程仅在池内存在空闲句柄时运行，空池自动退出。
+    - 重命名/移动前调用 discard(path)：Windows 上打开中的句柄会阻止 os.rename。
+      池只存在于当前进程，其他进程（API / 任务进程）持有的句柄只能等空闲超时关闭。
+    """
+
+    def __init__(self, opener: Callable[[str], Any], *, max_handles: int = 32, idle_timeout_s: float = 120.0):
+        self._opener = opener
+        self._max_handles = max(1, int(max_handles))
+        self._idle_timeout_s = max(1.0, float(idle_timeout_s))
+        self._lock = threading.Lock()
+        # key -> 空闲句柄列表；OrderedDict 顺序即 LRU 顺序（末尾最近使用）
+        self._idle: 'OrderedDict[HandleKey, List[_PooledHandle]]' = OrderedDict()
+        self._open_count = 0
+        self._janitor: Optional[threading.Thread] = None
+        self._opens = 0
+        self._reuses = 0
+        self._generation = 0
+        # path -> 执行 discard 时的代号（只保留最近的若干条，足够覆盖仍在租借中的句柄）
+        self._discarded: 'OrderedDict[str, int]' = OrderedDict()
+
+    def configure(self, *, max_handles: Optional[int] = None, idle_timeout_s: Optional[float] = None) -> None:
+        """调整容量与空闲超时，超出部分在下次归还/清理时回收。"""
+        with self._lock:
+            if max_handles is not None:
+                self._max_handles = max(1, int(max_handles))
+            if idle_timeout_s is not None:
+                self._idle_timeout_s = max(1.0, float(idle_timeout_s))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            idle = sum(len(items) for items in self._idle.values())
+            return {
+                'open': self._open_count,
+                'idle': idle,
+                'max_handles': self._max_handles,
+                'opens': self._opens,
+                'reuses': self._reuses,
+            }
+
+    @contextmanager
+    def lease(self, file_path: str) -> Generator[Any, None, None]:
+        """租借指定文件的句柄；块内抛出异常时视为句柄损坏，直接关闭不归还。"""
+        stat = os.stat(file_path)
+        key: HandleKey = (file_path, int(stat.st_mtime), int(stat.st_size))
+        handle = self._acquire(key)
+        broken = False
+        try:
+            yield handle.archive
+        except GeneratorExit:
+            # 流式响应被提前关闭（客户端断开）不代表句柄损坏
+            raise
+        except BaseException:
+            broken = True
+            raise
+        finally:
+            self._release(handle, broken=broken)
+
+    def discard(self, file_path: str) -> None:
+        """关闭指定文件的空闲句柄；租借中的句柄在归还时关闭。"""
+        with self._lock:
+            self._generation += 1
+            self._discarded[file_path] = self._generation
+            self._discarded.move_to_end(file_path)
+            while len(self._discarded) > 256:
+                self._discarded.popitem(last=False)
+            handles: List[_PooledHandle] = []
+            for key in [k for k in self._idle if k[0] == file_path]:
+                handles.extend(self._idle.pop(key))
+            self._open_count -= len(handles)
+        for handle in handles:
+            _close_quietly(handle.archive)
+
+    def close_all(self) -> None:
+        with self._lock:
+            handles = [handle for items in self._idle.values() for handle in items]
+            self._idle.clear()
+            self._open_count -= len(handles)
+        for handle in handles:
+            _close_quietly(handle.archive)
+
+    def _acquire(self, key: HandleKey) -> _PooledHandle:
+        evicted: List[_PooledHandle] = []
+        with self._lock:
+            items = self._idle.get(key)
+            if items:
+                handle = items.pop()
+                if not items:
+                    del self._idle[key]
+                else:
+                    self._idle.move_to_end(key)
+                self._reuses += 1
+                return handle
+
+            pooled = True
+            if self._open_count >= self._max_handles:
+                victim = self._pop_lru_locked()
+                if victim is not None:
+                    evicted.append(victim)
+                else:
+                    pooled = False
+            if pooled:
+                self._open_count += 1
+            self._opens += 1
+            generation = self._generation
+
+        for victim in evicted:
+            _close_quietly(victim.archive)
+
+        try:
+            archive = self._opener(key[0])
+        except BaseException:
+            if pooled:
+                with self._lock:
+                    self._open_count -= 1
+            raise
+        return _PooledHandle(key=key, archive=archive, pooled=pooled, generation=generation)
+
+    def _release(self, handle: _PooledHandle, *, broken: bool) -> None:
+        if not broken and handle.pooled:
+            with self._lock:
+                broken = self._discarded.get(handle.key[0], -1) > handle.generation
+        if broken or not handle.pooled:
+            if handle.pooled:
+                with self._lock:
+                    self._open_count -= 1
+            _close_quietly(handle.archive)
+            return
+
+        evicted: List[_PooledHandle] = []
+        with self._lock:
+            handle.idle_since = time.monotonic()
+            self._idle.setdefault(handle.key, []).append(handle)
+            self._idle.move_to_end(handle.key)
+            while self._open_count > self._max_handles:
+                victim = self._pop_lru_locked()
+                if victim is None:
+                    break
+                evicted.append(victim)
+            self._ensure_janitor_locked()
+
+        for victim in evicted:
+            _close_quietly(victim.archive)
+
+    def _pop_lru_locked(self) -> Optional[_PooledHandle]:
+        for key in self._idle:
+            items = self._idle[key]
+            victim = items.pop(0)
+            if not items:
+                del self._idle[key]
+            self._open_count -= 1
+            return victim
+        return None
+
+    def _sweep_expired(self) -> bool:
+        """关闭超时空闲句柄，返回池内是否仍有空闲句柄。"""
+        now = time.monotonic()
+        expired: List[_PooledHandle] = []
+        with self._lock:
+            for key in list(self._idle.keys()):
+                items = self._idle[key]
+                keep = [item for item in items if now - item.idle_since < self._idle_timeout_s]
+                expired.extend(item for item in items if now - item.idle_since >= self._idle_timeout_s)
+                if keep:
+                    self._idle[key] = keep
+                else:
+                    del self._idle[key]
+            self._open_count -= len(expired)
+            has_idle = bool(self._idle)
+            if not has_idle:
+                self._janitor = None
+        for handle in expired:
+            _close_quietly(handle.archive)
+        return has_idle
+
+    def _ensure_janitor_locked(self) -> None:
+        if self._janitor is not None:
+            return
+        self._janitor = threading.Thread(target=self._janitor_loop, name='archive-pool-janitor', daemon=True)
+        self._janitor.start()
+
+    def _janitor_loop(self) -> None:
+        while True:
+            time.sleep(max(1.0, self._idle_timeout_s / 2))
+            try:
+                if not self._sweep_expired():
+                    return
+            except Exception as exc:
+                logger.warning('清理空闲压缩包句柄失败: {}', exc)
@@ -1,14 +1,21 @@
 import io
 import os
 import re
+import struct
 import zipfile
 import rarfile
 import py7zr
+from contextlib import closing
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import Generator, List, Optional, Tuple
+from typing import Any, Callable, Generator, List, Optional, Sequence, Tuple
 from loguru import logger
 
+from .archive_pool import ArchiveHandlePool
+from .rar_extract_cache import RarExtractCache, resolve_extracted_path
+from .seven_zip_reader import SevenZipPageReader
+from .single_flight import SingleFlight
+
 # 统一的压缩包与图片后缀清单，确保扫描与阅读行为一致
 SUPPORTED_ARCHIVE_EXTENSIONS = ('.zip', '.cbz', '.rar', '.cbr', '.7z', '.cb7')
 IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp')
@@ -19,6 +26,23 @@ class ArchiveEntry:
     """描述单个页面条目的轻量结构体。"""
     name: str
     size: Optional[int] = None
+    # 压缩后大小与条目头偏移（Zip/RAR 可用，7z 通常缺失）
+    compressed_size: Optional[int] = None
+    offset: Optional[int] = None
+    # 未压缩（STORED）且未加密的 Zip 条目：页面数据在压缩包文件内的绝对偏移，可直接按字节区间输出
+    data_offset: Optional[int] = None
+
+
+# 持久化索引加载器：(file_path, mtime, size) -> 条目序列；返回 None 表示未命中。
+# 由服务层注册（数据库页索引），基础设施层本身不依赖数据库。
+PersistedIndexLoader = Callable[[str, int, int], Optional[Sequence[ArchiveEntry]]]
+_persisted_index_loader: Optional[PersistedIndexLoader] = None
+
+
+def set_persisted_index_loader(loader: Optional[PersistedIndexLoader]) -> None:
+    """注册持久化索引加载器，传入 None 表示关闭。"""
+    global _persisted_index_loader
+    _persisted_index_loader = loader
 
 
 def natural_sort_key(value: str) -> List[object]:
@@ -30,24 +54,152 @@ def _is_image_file(name: str) -> bool:
     return any(name.lower().endswith(ext) for ext in IMAGE_EXTENSIONS)
 
 
+def _open_archive(file_path: str) -> Any:
+    """按后缀打开压缩包（供句柄池使用）。"""
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in ('.zip', '.cbz'):
+        return zipfile.ZipFile(file_path, 'r')
+    if ext in ('.rar', '.cbr'):
+        return rarfile.RarFile(file_path, 'r')
+    if ext in ('.7z', '.cb7'):
+        return py7zr.SevenZipFile(file_path, 'r')
+    raise ValueError(f'不支持的压缩格式: {ext}')
+
+
+# 句柄空闲超时：句柄池按进程隔离，其他进程在重命名前无法关闭本进程的句柄（Windows 上会阻止改名），
+# 只能等空闲句柄被清理线程关闭（最迟约 1.5 倍超时）
+ARCHIVE_HANDLE_IDLE_TIMEOUT_S = 30.0
+
+# 进程内共享的压缩包句柄池：连续翻页只付出一次打开/解析目录的开销（只用于阅读读页；扫描与列目录直接打开、用完即关）
+_handle_pool = ArchiveHandlePool(_open_archive, max_handles=32, idle_timeout_s=ARCHIVE_HANDLE_IDLE_TIMEOUT_S)
+
+# 7z 页读取器：固实归档顺序解压 + 字节预算页缓存
+_seven_zip_pages = SevenZipPageReader(_handle_pool, idle_timeout_s=ARCHIVE_HANDLE_IDLE_TIMEOUT_S)
+
+
+# RAR 整本解压缓存：默认关闭，由服务层按设置在阅读请求中启用（扫描/后台任务进程不会整本解压）
+_rar_extracts = RarExtractCache(_open_archive)
+
+
+# 并发读取同一页（预加载与翻页同时到达、多个标签页打开同一本书）只解压一次
+_entry_flights = SingleFlight(timeout_s=30.0)
+
+
+def get_archive_handle_pool() -> ArchiveHandlePool:
+    return _handle_pool
+
+
+def get_seven_zip_reader() -> SevenZipPageReader:
+    return _seven_zip_pages
+
+
+def get_entry_flights() -> SingleFlight:
+    return _entry_flights
+
+
+def get_rar_extract_cache() -> RarExtractCache:
+    return _rar_extracts
+
+
+def close_archive_handles(file_path: str) -> None:
+    """
+    关闭当前进程内指定压缩包的所有句柄（句柄池 + 7z 解压会话），在重命名/移动前调用。
+
+    Windows 上打开中的文件无法 os.rename；其他进程持有的句柄只能等其空闲超时关闭。
+    """
+    _seven_zip_pages.close_path(file_path)
+    _handle_pool.discard(file_path)
+
+
+def is_rar_archive(file_path: str) -> bool:
+    return os.path.splitext(file_path)[1].lower() in ('.rar', '.cbr')
+
+
+def _seven_zip_targets(file_path: str) -> List[str]:
+    return [item.name for item in get_archive_entries(file_path)]
+
+
+def _rar_extracted_dir(file_path: str, *, extract: bool) -> Optional[str]:
+    """
+    返回 RAR 的整本解压目录；未启用或不可用时返回 None。
+
+    extract=True 时尚未解压的书会提交后台整本解压，本次仍返回 None（调用方逐页解压）；
+    extract=False 只使用已解压的结果（例如读取图片头），不会为此整本解压。
+    """
+    if not _rar_extracts.enabled or not is_rar_archive(file_path):
+        return None
+    try:
+        mtime, size = _file_signature(file_path)
+        key = (file_path, mtime, size)
+        if not extract:
+            return _rar_extracts.lookup(key)
+        entries = get_archive_entries(file_path)
+        expected_bytes = sum(int(item.size or item.compressed_size or 0) for item in entries)
+        return _rar_extracts.ensure(key, [item.name for item in entries], expected_bytes)
+    except Exception as exc:
+        logger.warning('读取 RAR 解压缓存失败，回退为逐页解压: {} | 错误: {}', file_path, exc)
+        return None
+
+
+def _read_extracted_file(book_dir: str, entry: ArchiveEntry, max_bytes: int = -1) -> Optional[bytes]:
+    path = resolve_extracted_path(book_dir, entry.name)
+    if path is None:
+        return None
+    try:
+        with open(path, 'rb') as handle:
+            return handle.read(max_bytes)
+    except OSError:
+        # 被其他进程淘汰或条目缺失：回退为从压缩包读取
+        return None
+
+
+# Zip 本地文件头：签名(4) + 固定字段(26)，文件名长度与扩展字段长度位于第 26/28 字节
+_ZIP_LOCAL_HEADER = struct.Struct('<4s22xHH')
+_ZIP_LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+
+
+def _resolve_stored_data_offset(raw_file: Any, info: zipfile.ZipInfo) -> Optional[int]:
+    """
+    解析 STORED 条目的数据起始偏移（本地文件头之后）。
+
+    中央目录与本地文件头中的扩展字段长度可能不同，必须读取本地文件头才能得到准确偏移。
+    非 STORED、加密或头部异常的条目返回 None（回退为逐块解压输出）。
+    """
+    if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+        return None
+    if info.compress_size != info.file_size:
+        return None
+    try:
+        raw_file.seek(info.header_offset)
+        header = raw_file.read(_ZIP_LOCAL_HEADER.size)
+    except OSError:
+        return None
+    if len(header) != _ZIP_LOCAL_HEADER.size:
+        return None
+    signature, name_length, extra_length = _ZIP_LOCAL_HEADER.unpack(header)
+    if signature != _ZIP_LOCAL_HEADER_SIGNATURE:
+        return None
+    return info.header_offset + _ZIP_LOCAL_HEADER.size + name_length + extra_length
+
+
 def _file_signature(file_path: str) -> Tuple[int, int]:
     """使用文件大小与 mtime 作为缓存签名，文件变更会自动失效。"""
     stat = os.stat(file_path)
     return int(stat.st_mtime), int(stat.st_size)
 
 
-@lru_cache(maxsize=256)
-def _build_archive_index(file_path: str, mtime: int, size: int) -> Tuple[ArchiveEntry, ...]:
-    """
-    读取压缩包目录索引而非内容，返回排序后的页面列表。
-    利用 LRU 缓存避免重复读取目录，适合高频翻页场景。
-    """
+def list_archive_entries(file_path: str) -> List[ArchiveEntry]:
+    """直接读取压缩包目录（不经过任何缓存，也不经过句柄池：用完即关闭，扫描后不留打开的句柄），返回排序后的页面列表。"""
     ext = os.path.splitext(file_path)[1].lower()
     entries: List[ArchiveEntry] = []
 
     try:
+        if ext not in SUPPORTED_ARCHIVE_EXTENSIONS:
+            raise ValueError(f'不支持的压缩格式: {ext}')
+
         if ext in ('.zip', '.cbz'):
-            with zipfile.ZipFile(file_path, 'r') as archive:
+            # 单独打开一个原始文件对象读取本地文件头，避免移动 ZipFile 共享文件指针
+            with closing(_open_archive(file_path)) as archive, open(file_path, 'rb') as raw_file:
                 for info in archive.infolist():
                     if getattr(info, 'is_dir', lambda: False)():
                         continue
@@ -55,36 +207,81 @@ def _build_archive_index(file_path: str, mtime: int, size: int) -> Tuple[Archive
                         continue
                     if info.filename.startswith('__MACOSX'):
                         continue
-                    entries.append(ArchiveEntry(name=info.filename, size=getattr(info, 'file_size', None)))
+                    entries.append(
+                        ArchiveEntry(
+                            name=info.filename,
+                            size=getattr(info, 'file_size', None),
+                            compressed_size=getattr(info, 'compress_size', None),
+                            offset=getattr(info, 'header_offset', None),
+                            data_offset=_resolve_stored_data_offset(raw_file, info),
+                        )
+                    )
 
         elif ext in ('.rar', '.cbr'):
-            with rarfile.RarFile(file_path, 'r') as archive:
+            with closing(_open_archive(file_path)) as archive:
                 for info in archive.infolist():
                     if info.isdir():
                         continue
                     if not _is_image_file(info.filename):
                         continue
-                    entries.append(ArchiveEntry(name=info.filename, size=getattr(info, 'file_size', None)))
+                    entries.append(
+                        ArchiveEntry(
+                            name=info.filename,
+                            size=getattr(info, 'file_size', None),
+                            compressed_size=getattr(info, 'compress_size', None),
+                            offset=getattr(info, 'header_offset', None),
+                        )
+                    )
 
-        elif ext in ('.7z', '.cb7'):
-            with py7zr.SevenZipFile(file_path, 'r') as archive:
+        else:
+            with closing(_open_archive(file_path)) as archive:
                 for info in archive.list():
                     if getattr(info, 'is_directory', False):
                         continue
                     if not _is_image_file(info.filename):
                         continue
                     # py7zr 的条目信息中 uncompressed 为解压后大小，可能为 None
-                    entries.append(ArchiveEntry(name=info.filename, size=getattr(info, 'uncompressed', None)))
-        else:
-            raise ValueError(f'不支持的压缩格式: {ext}')
+                    entries.append(
+                        ArchiveEntry(
+                            name=info.filename,
+                            size=getattr(info, 'uncompressed', None),
+                            compressed_size=getattr(info, 'compressed', None),
+                        )
+                    )
 
         entries.sort(key=lambda item: natural_sort_key(item.name))
-        return tuple(entries)
+        return entries
     except Exception as exc:
         logger.exception('读取压缩包目录失败: {} | 错误: {}', file_path, exc)
         raise
 
 
+def _load_persisted_index(file_path: str, mtime: int, size: int) -> Optional[Tuple[ArchiveEntry, ...]]:
+    loader = _persisted_index_loader
+    if loader is None:
+        return None
+    try:
+        persisted = loader(file_path, mtime, size)
+    except Exception as exc:
+        logger.warning('读取持久化页索引失败，回退为读取压缩包目录: {} | 错误: {}', file_path, exc)
+        return None
+    if persisted is None:
+        return None
+    return tuple(persisted)
+
+
+@lru_cache(maxsize=256)
+def _build_archive_index(file_path: str, mtime: int, size: int) -> Tuple[ArchiveEntry, ...]:
+    """
+    返回排序后的页面列表：优先使用持久化页索引（签名一致才命中），否则读取压缩包目录。
+    利用 LRU 缓存避免重复读取，适合高频翻页场景。
+    """
+    persisted = _load_persisted_index(file_path, mtime, size)
+    if persisted is not None:
+        return persisted
+    return tuple(list_archive_entries(file_path))
+
+
 def get_archive_entries(file_path: str) -> List[ArchiveEntry]:
     """获取排序后的图片条目列表（使用缓存）。"""
     mtime, size = _file_signature(file_path)
@@ -113,26 +310,21 @@ def guess_mimetype(entry_name: str) -> str:
     return 'image/jpeg'
 
 
-def _read_entry_bytes(file_path: str, entry: ArchiveEntry) -> Optional[io.BytesIO]:
-    """按条目解压单页到内存，不触碰其他页面。"""
+def _decompress_entry(file_path: str, entry: ArchiveEntry) -> Optional[bytes]:
+    """按条目解压单页，不触碰其他页面（复用句柄池中的已打开句柄；RAR 优先读取整本解压缓存）。"""
     ext = os.path.splitext(file_path)[1].lower()
+    book_dir = _rar_extracted_dir(file_path, extract=True)
+    if book_dir is not None:
+        data = _read_extracted_file(book_dir, entry)
+        if data is not None:
+            return data
     try:
-        if ext in ('.zip', '.cbz'):
-            with zipfile.ZipFile(file_path, 'r') as archive:
-                return io.BytesIO(archive.read(entry.name))
-
-        if ext in ('.rar', '.cbr'):
-            with rarfile.RarFile(file_path, 'r') as archive:
-                return io.BytesIO(archive.read(entry.name))
+        if ext in ('.zip', '.cbz', '.rar', '.cbr'):
+            with _handle_pool.lease(file_path) as archive:
+                return archive.read(entry.name)
 
         if ext in ('.7z', '.cb7'):
-            with py7zr.SevenZipFile(file_path, 'r') as archive:
-                content_map = archive.read([entry.name])
-                data = content_map.get(entry.name)
-                if data is None:
-                    return None
-                # py7zr 返回的 BinaryIO 需要读出字节以免句柄在上下文关闭后失效
-                return io.BytesIO(data.read())
+            return _seven_zip_pages.read(file_path, entry.name, _seven_zip_targets(file_path))
 
     except Exception as exc:
         logger.warning('解压页面失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
@@ -140,6 +332,18 @@ def _read_entry_bytes(file_path: str, entry: ArchiveEntry) -> Optional[io.BytesI
     return None
 
 
+def _read_entry_bytes(file_path: str, entry: ArchiveEntry) -> Optional[io.BytesIO]:
+    """按条目解压单页到内存；同一页的并发读取合并为一次解压，各调用方得到独立的字节流。"""
+    try:
+        mtime, size = _file_signature(file_path)
+    except OSError:
+        mtime, size = 0, 0
+    data = _entry_flights.do((file_path, mtime, size, entry.name), lambda: _decompress_entry(file_path, entry))
+    if data is None:
+        return None
+    return io.BytesIO(data)
+
+
 @lru_cache(maxsize=1024)
 def _resolve_entry_size(file_path: str, mtime: int, file_size: int, entry_name: str, indexed_size: Optional[int]) -> Optional[int]:
     """
@@ -166,46 +370,176 @@ def get_entry_metadata(file_path: str, page_num: int) -> Optional[Tuple[str, Opt
     return entry.name, resolved_size
 
 
+def get_stored_entry_range(file_path: str, entry: ArchiveEntry) -> Optional[Tuple[int, int]]:
+    """
+    返回可直接按字节区间输出的页面位置 (绝对偏移, 长度)；不满足条件时返回 None。
+
+    仅 Zip STORED 条目可用，且偏移来自与当前文件签名一致的索引（文件变更后索引自动失效）。
+    """
+    if entry.data_offset is None or entry.size is None:
+        return None
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext not in ('.zip', '.cbz'):
+        return None
+    try:
+        archive_size = os.path.getsize(file_path)
+    except OSError:
+        return None
+    if entry.data_offset < 0 or entry.data_offset + entry.size > archive_size:
+        return None
+    return int(entry.data_offset), int(entry.size)
+
+
 def iter_entry_chunks(file_path: str, entry: ArchiveEntry, chunk_size: int = 512 * 1024) -> Generator[bytes, None, None]:
     """
-    流式读取单页内容，Zip/RAR 走逐块解压，7z 降级为内存块输出。
-    供 Flask Response 使用，避免一次性堆积内存。
+    流式读取单页内容：Zip/RAR 逐块解压，7z 边解压边输出（固实归档复用顺序解压会话）。
+    RAR 启用整本解压缓存时直接读取解压后的普通文件，不再为每页启动解压进程。
+    供 Flask Response 使用，避免一次性堆积内存；句柄在流结束（或客户端断开）后归还句柄池。
     """
     ext = os.path.splitext(file_path)[1].lower()
-    if ext in ('.zip', '.cbz'):
-        archive = zipfile.ZipFile(file_path, 'r')
-        file_obj = archive.open(entry.name, 'r')
-    elif ext in ('.rar', '.cbr'):
-        archive = rarfile.RarFile(file_path, 'r')
-        file_obj = archive.open(entry.name)
-    elif ext in ('.7z', '.cb7'):
-        archive = py7zr.SevenZipFile(file_path, 'r')
-        content_map = archive.read([entry.name])
-        file_obj = content_map.get(entry.name)
-        if file_obj is None:
-            archive.close()
-            return
-    else:
+    if ext not in SUPPORTED_ARCHIVE_EXTENSIONS:
         logger.error('不支持的压缩格式: {}', ext)
         return
 
+    if ext in ('.7z', '.cb7'):
+        try:
+            yield from _seven_zip_pages.iter_chunks(file_path, entry.name, _seven_zip_targets(file_path), chunk_size)
+        except Exception as exc:
+            logger.warning('流式读取页面失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
+        return
+
+    book_dir = _rar_extracted_dir(file_path, extract=True)
+    extracted_path = resolve_extracted_path(book_dir, entry.name) if book_dir is not None else None
+    if extracted_path is not None:
+        try:
+            handle = open(extracted_path, 'rb')
+        except OSError:
+            handle = None
+        if handle is not None:
+            with handle:
+                while True:
+                    chunk = handle.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            return
+
     try:
-        while True:
-            chunk = file_obj.read(chunk_size)
-            if not chunk:
-                break
-            yield chunk
+        with _handle_pool.lease(file_path) as archive:
+            if ext in ('.zip', '.cbz'):
+                file_obj = archive.open(entry.name, 'r')
+            else:
+                file_obj = archive.open(entry.name)
+
+            try:
+                while True:
+                    chunk = file_obj.read(chunk_size)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                try:
+                    file_obj.close()
+                except Exception:
+                    pass
     except Exception as exc:
         logger.warning('流式读取页面失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
-    finally:
-        try:
-            file_obj.close()
-        except Exception:
-            pass
-        try:
-            archive.close()
-        except Exception:
-            pass
+
+
+def iter_entries_bytes(file_path: str, entries: Sequence[ArchiveEntry]) -> Generator[Tuple[ArchiveEntry, Optional[bytes]], None, None]:
+    """
+    按给定顺序批量解压多个页面，逐个产出 (条目, 字节)；单页失败时字节为 None。
+
+    Zip/RAR 在同一次句柄租借内顺序解压（只打开一次压缩包，RAR 优先读取整本解压缓存）；
+    7z 走顺序解压会话，固实块只解码一遍。
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in ('.7z', '.cb7'):
+        targets = _seven_zip_targets(file_path)
+        for entry in entries:
+            try:
+                data = _seven_zip_pages.read(file_path, entry.name, targets)
+            except Exception as exc:
+                logger.warning('解压页面失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
+                data = None
+            yield entry, data
+        return
+
+    if ext not in SUPPORTED_ARCHIVE_EXTENSIONS:
+        for entry in entries:
+            yield entry, None
+        return
+
+    pending = list(entries)
+    book_dir = _rar_extracted_dir(file_path, extract=True)
+    if book_dir is not None:
+        while pending:
+            data = _read_extracted_file(book_dir, pending[0])
+            if data is None:
+                break
+            yield pending.pop(0), data
+        if not pending:
+            return
+
+    try:
+        with _handle_pool.lease(file_path) as archive:
+            while pending:
+                entry = pending[0]
+                try:
+                    data = archive.read(entry.name)
+                except KeyError as exc:
+                    logger.warning('解压页面失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
+                    data = None
+                pending.pop(0)
+                yield entry, data
+    except Exception as exc:
+        logger.warning('批量解压页面失败: {} | 错误: {}', file_path, exc)
+    for entry in pending:
+        yield entry, None
+
+
+def iter_entry_heads(
+    file_path: str,
+    entries: Sequence[ArchiveEntry],
+    max_bytes: int = 64 * 1024,
+) -> Generator[Tuple[ArchiveEntry, Optional[bytes]], None, None]:
+    """
+    批量读取多个页面的开头字节（用于解析图片头），逐个产出 (条目, 字节)；单页失败时为 None。
+
+    Zip/RAR 在同一次句柄租借内按需解压前 max_bytes 字节即停止；7z 无法只解压开头，退化为整页读取。
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext in ('.7z', '.cb7') or ext not in SUPPORTED_ARCHIVE_EXTENSIONS:
+        yield from iter_entries_bytes(file_path, entries)
+        return
+
+    pending = list(entries)
+    book_dir = _rar_extracted_dir(file_path, extract=False)
+    if book_dir is not None:
+        while pending:
+            data = _read_extracted_file(book_dir, pending[0], max_bytes)
+            if data is None:
+                break
+            yield pending.pop(0), data
+        if not pending:
+            return
+
+    try:
+        with _handle_pool.lease(file_path) as archive:
+            while pending:
+                entry = pending[0]
+                try:
+                    with archive.open(entry.name) as file_obj:
+                        data = file_obj.read(max_bytes)
+                except KeyError as exc:
+                    logger.warning('读取页面头失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
+                    data = None
+                pending.pop(0)
+                yield entry, data
+    except Exception as exc:
+        logger.warning('批量读取页面头失败: {} | 错误: {}', file_path, exc)
+    for entry in pending:
+        yield entry, None
 
 
 def read_entry_stream(file_path: str, entry: ArchiveEntry) -> Optional[io.BytesIO]:
@@ -0,0 +1,317 @@
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger
+
+# 说明：
+# - 封面打包存储：封面字节依次追加到 <base_dir>/<pack_id>.pack，索引 (file_id, 宽度) -> (包, 偏移, 长度, 版本)
+#   保存在同目录的 SQLite 文件中（WAL，多进程共享），几十万本书只占用少量文件。
+# - 写入在索引的写事务内追加（BEGIN IMMEDIATE 在线程/进程间串行化）；同一封面重写后旧字节成为死数据，
+#   中断的写入只会在包尾留下未被索引引用的字节，同样按死数据计。
+# - 压缩：死数据占比超过阈值的已封存包，把仍有效的条目搬到当前包后删除旧包。
+# - 读取方拿到 (包路径, 偏移, 长度) 后直接输出字节区间（sendfile / Range）。
+# - 不依赖应用上下文与数据库 Session，可在扫描线程池/进程池中使用。
+
+_INDEX_FILENAME = 'index.sqlite3'
+# 压缩时每个写事务搬移的条目数
+_COMPACT_BATCH = 200
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS packs ('
+    ' pack_id INTEGER PRIMARY KEY,'
+    ' size INTEGER NOT NULL DEFAULT 0,'
+    ' live_bytes INTEGER NOT NULL DEFAULT 0,'
+    ' sealed INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE IF NOT EXISTS entries ('
+    ' file_id INTEGER NOT NULL,'
+    ' width INTEGER NOT NULL,'
+    ' pack_id INTEGER NOT NULL,'
+    ' data_offset INTEGER NOT NULL,'
+    ' data_length INTEGER NOT NULL,'
+    ' version INTEGER NOT NULL,'
+    ' PRIMARY KEY (file_id, width)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS entries_pack ON entries (pack_id)',
+)
+
+
+@dataclass(frozen=True)
+class PackedCover:
+    path: str
+    offset: int
+    length: int
+    # 写入时间（纳秒），同一条目重写后严格变大；压缩搬移不改变
+    version: int
+
+
+class CoverPack:
+    """
+    追加写入的封面包 + SQLite 偏移索引（线程安全，可多进程共享同一目录）。
+
+    - 每个线程使用独立的索引连接；写入与压缩通过索引的写锁串行化。
+    - 当前包超过 max_pack_bytes 后封存，后续写入新包；只有已封存的包参与压缩。
+    """
+
+    def __init__(self, base_dir: str, *, max_pack_bytes: int = 256 * 1024 * 1024):
+        self._base_dir = base_dir
+        self._max_pack_bytes = max(1, int(max_pack_bytes))
+        self._local = threading.local()
+        # 建表与 WAL 设置每个实例只执行一次（WAL 模式持久保存在索引文件中），新线程的连接只需打开
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    @property
+    def base_dir(self) -> str:
+        return self._base_dir
+
+    def pack_path(self, pack_id: int) -> str:
+        return os.path.join(self._base_dir, f'{int(pack_id):08d}.pack')
+
+    def locate(self, file_id: int, width: int = 0) -> Optional[PackedCover]:
+        row = self._connect().execute(
+            'SELECT pack_id, data_offset, data_length, version FROM entries WHERE file_id = ? AND width = ?',
+            (int(file_id), int(width)),
+        ).fetchone()
+        if row is None:
+            return None
+        return PackedCover(path=self.pack_path(row[0]), offset=int(row[1]), length=int(row[2]), version=int(row[3]))
+
+    def read(self, file_id: int, width: int = 0) -> Optional[bytes]:
+        located = self.locate(file_id, width)
+        if located is None:
+            return None
+        try:
+            with open(located.path, 'rb') as handle:
+                handle.seek(located.offset)
+                data = handle.read(located.length)
+        except OSError:
+            return None
+        return data if len(data) == located.length else None
+
+    def existing(self, file_ids: Iterable[int], width: int = 0) -> Set[int]:
+        """返回 file_ids 中已有封面的 ID（按批查询索引，不逐个访问文件系统）。"""
+        ids = [int(file_id) for file_id in file_ids]
+        conn = self._connect()
+        found: Set[int] = set()
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            rows = conn.execute(
+                f'SELECT file_id FROM entries WHERE width = ? AND file_id IN ({placeholders})',
+                [int(width), *chunk],
+            ).fetchall()
+            found.update(int(row[0]) for row in rows)
+        return found
+
+    def put(self, file_id: int, width: int, data: bytes) -> PackedCover:
+        """追加写入一个封面并更新索引，返回新位置。"""
+        os.makedirs(self._base_dir, exist_ok=True)
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT version FROM entries WHERE file_id = ? AND width = ?',
+                (int(file_id), int(width)),
+            ).fetchone()
+            version = max(time.time_ns(), int(row[0]) + 1 if row else 0)
+            located = self._append_locked(conn, int(file_id), int(width), data, version)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return located
+
+    def delete(self, file_ids: Iterable[int]) -> int:
+        """删除 file_ids 的全部封面条目（主封面与各宽度缩略图），对应字节计为死数据，返回删除的条目数。"""
+        ids = [int(file_id) for file_id in file_ids]
+        if not ids:
+            return 0
+        conn = self._connect()
+        deleted = 0
+        for start in range(0, len(ids), 500):
+            chunk = ids[start : start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    f'SELECT pack_id, SUM(data_length) FROM entries WHERE file_id IN ({placeholders}) GROUP BY pack_id',
+                    chunk,
+                ).fetchall()
+                for pack_id, nbytes in rows:
+                    conn.execute('UPDATE packs SET live_bytes = live_bytes - ? WHERE pack_id = ?', (int(nbytes), pack_id))
+                deleted += conn.execute(f'DELETE FROM entries WHERE file_id IN ({placeholders})', chunk).rowcount
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        return deleted
+
+    def compact(self, *, min_dead_ratio: float) -> Dict[str, int]:
+        """
+        压缩死数据占比不低于 min_dead_ratio 的已封存包：有效条目搬到当前包（版本不变），随后删除旧包。
+
+        与写入/读取并发安全：搬移前确认条目仍指向旧位置；删除失败（例如文件仍被占用）时保留到下次压缩。
+        """
+        conn = self._connect()
+        candidates: List[Tuple[int, int]] = conn.execute(
+            'SELECT pack_id, size FROM packs WHERE sealed = 1 AND size > 0 AND size - live_bytes >= size * ?',
+            (max(0.0, float(min_dead_ratio)),),
+        ).fetchall()
+
+        moved = 0
+        removed = 0
+        reclaimed = 0
+        for pack_id, size in candidates:
+            moved += self._move_live_entries(conn, int(pack_id))
+            if self._remove_pack_if_empty(conn, int(pack_id)):
+                removed += 1
+                reclaimed += int(size)
+        return {'packs': len(candidates), 'moved': moved, 'removed': removed, 'reclaimed_bytes': reclaimed}
+
+    def stats(self) -> Dict[str, int]:
+        conn = self._connect()
+        packs, size, live = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(live_bytes), 0) FROM packs').fetchone()
+        entries = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return {'packs': int(packs), 'entries': int(entries), 'bytes': int(size), 'live_bytes': int(live)}
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # 自动提交模式，写事务显式 BEGIN IMMEDIATE
+            conn = sqlite3.connect(os.path.join(self._base_dir, _INDEX_FILENAME), timeout=30.0, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._ensure_schema(conn)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn.execute('PRAGMA journal_mode=WAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._schema_ready = True
+
+    def _active_pack_locked(self, conn: sqlite3.Connection, nbytes: int) -> int:
+        row = conn.execute('SELECT pack_id, size FROM packs WHERE sealed = 0 ORDER BY pack_id DESC LIMIT 1').fetchone()
+        if row is not None and (row[1] == 0 or row[1] + nbytes <= self._max_pack_bytes):
+            return int(row[0])
+        if row is not None:
+            conn.execute('UPDATE packs SET sealed = 1 WHERE pack_id = ?', (row[0],))
+        return int(conn.execute('INSERT INTO packs (size, live_bytes, sealed) VALUES (0, 0, 0)').lastrowid)
+
+    def _append_locked(self, conn: sqlite3.Connection, file_id: int, width: int, data: bytes, version: int) -> PackedCover:
+        pack_id = self._active_pack_locked(conn, len(data))
+        path = self.pack_path(pack_id)
+        with open(path, 'ab') as handle:
+            # 以实际文件长度为准：中断写入留下的尾部字节不会被覆盖引用
+            offset = handle.seek(0, os.SEEK_END)
+            handle.write(data)
+
+        previous = conn.execute(
+            'SELECT pack_id, data_length FROM entries WHERE file_id = ? AND width = ?',
+            (file_id, width),
+        ).fetchone()
+        if previous is not None:
+            conn.execute('UPDATE packs SET live_bytes = live_bytes - ? WHERE pack_id = ?', (previous[1], previous[0]))
+        conn.execute(
+            'INSERT OR REPLACE INTO entries (file_id, width, pack_id, data_offset, data_length, version) VALUES (?, ?, ?, ?, ?, ?)',
+            (file_id, width, pack_id, offset, len(data), version),
+        )
+        conn.execute(
+            'UPDATE packs SET size = ?, live_bytes = live_bytes + ? WHERE pack_id = ?',
+            (offset + len(data), len(data), pack_id),
+        )
+        return PackedCover(path=path, offset=offset, length=len(data), version=version)
+
+    def _move_live_entries(self, conn: sqlite3.Connection, pack_id: int) -> int:
+        rows = conn.execute(
+            'SELECT file_id, width, data_offset, data_length, version FROM entries WHERE pack_id = ?',
+            (pack_id,),
+        ).fetchall()
+        path = self.pack_path(pack_id)
+        try:
+            source = open(path, 'rb')
+        except OSError as exc:
+            # 包文件已丢失：条目无法读取，直接移除（扫描补全缺失封面时会重新生成）
+            logger.warning('封面包不可读，移除其索引条目: {} | 错误: {}', path, exc)
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM entries WHERE pack_id = ?', (pack_id,))
+                conn.execute('UPDATE packs SET live_bytes = 0 WHERE pack_id = ?', (pack_id,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            return 0
+
+        moved = 0
+        with source:
+            for start in range(0, len(rows), _COMPACT_BATCH):
+                batch = []
+                for file_id, width, offset, length, version in rows[start : start + _COMPACT_BATCH]:
+                    source.seek(offset)
+                    batch.append((file_id, width, offset, source.read(length), version))
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    for file_id, width, offset, data, version in batch:
+                        current = conn.execute(
+                            'SELECT pack_id, data_offset, data_length FROM entries WHERE file_id = ? AND width = ?',
+                            (file_id, width),
+                        ).fetchone()
+                        if current is None or (current[0], current[1]) != (pack_id, offset):
+                            # 读取后已被重写，旧字节不再需要
+                            continue
+                        if len(data) != current[2]:
+                            conn.execute('DELETE FROM entries WHERE file_id = ? AND width = ?', (file_id, width))
+                            conn.execute('UPDATE packs SET live_bytes = live_bytes - ? WHERE pack_id = ?', (current[2], pack_id))
+                            continue
+                        self._append_locked(conn, file_id, width, data, version)
+                        moved += 1
+                    conn.execute('COMMIT')
+                except BaseException:
+                    conn.execute('ROLLBACK')
+                    raise
+        return moved
+
+    def _remove_pack_if_empty(self, conn: sqlite3.Connection, pack_id: int) -> bool:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('SELECT 1 FROM entries WHERE pack_id = ? LIMIT 1', (pack_id,)).fetchone() is not None:
+                conn.execute('COMMIT')
+                return False
+            try:
+                os.remove(self.pack_path(pack_id))
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                logger.warning('删除封面包失败，留待下次压缩: {} | 错误: {}', self.pack_path(pack_id), exc)
+                conn.execute('COMMIT')
+                return False
+            conn.execute('DELETE FROM packs WHERE pack_id = ?', (pack_id,))
+            conn.execute('COMMIT')
+            return True
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+
+_packs: Dict[Tuple[str, int], CoverPack] = {}
+_packs_lock = threading.Lock()
+
+
+def get_cover_pack(base_dir: str, *, max_pack_bytes: int) -> CoverPack:
+    """同一目录在进程内共享一个 CoverPack（各线程的索引连接由它维护）。"""
+    key = (os.path.abspath(base_dir), int(max_pack_bytes))
+    with _packs_lock:
+        pack = _packs.get(key)
+        if pack is None:
+            pack = CoverPack(base_dir, max_pack_bytes=max_pack_bytes)
+            _packs[key] = pack
+        return pack
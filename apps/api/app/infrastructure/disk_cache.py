@@ -0,0 +1,204 @@
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from loguru import logger
+
+# 缓存键为十六进制摘要，扩展名用于记录内容类型（读取时无需额外元数据文件）
+_ALLOWED_SUFFIXES = ('.webp', '.avif', '.jpg', '.png', '.bin')
+
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class DiskByteCache:
+    """
+    容量受限的磁盘字节缓存（线程安全）。
+
+    - 目录结构：<base_dir>/<key><suffix>，写入采用临时文件 + 原子替换。
+    - 不负责创建目录：base_dir 由应用启动时创建（GET 请求中写缓存不产生新目录），目录缺失时写入直接跳过。
+    - 淘汰策略：总大小超出预算时按最近访问时间（mtime，命中时刷新）淘汰；超过 max_age_s 未访问的条目读取时视为过期。
+    - 多 Worker 进程共享同一目录：读取总是直接查文件；容量统计为进程内近似值，定期重新扫描目录校准。
+    """
+
+    def __init__(self, base_dir: str, *, budget_bytes: int, max_age_s: int, rescan_interval_s: float = 600.0):
+        self._base_dir = base_dir
+        self._budget = max(0, int(budget_bytes))
+        self._max_age_s = max(0, int(max_age_s))
+        self._rescan_interval_s = rescan_interval_s
+        self._lock = threading.Lock()
+        # key -> (suffix, size)；顺序即 LRU 顺序（末尾最近使用）
+        self._index: 'OrderedDict[str, Tuple[str, int]]' = OrderedDict()
+        self._used = 0
+        self._scanned_at: Optional[float] = None
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    @property
+    def base_dir(self) -> str:
+        return self._base_dir
+
+    def configure(self, *, base_dir: Optional[str] = None, budget_bytes: Optional[int] = None, max_age_s: Optional[int] = None) -> None:
+        with self._lock:
+            if base_dir is not None and base_dir != self._base_dir:
+                self._base_dir = base_dir
+                self._index.clear()
+                self._used = 0
+                self._scanned_at = None
+            if budget_bytes is not None:
+                self._budget = max(0, int(budget_bytes))
+            if max_age_s is not None:
+                self._max_age_s = max(0, int(max_age_s))
+
+    def _path_for(self, key: str, suffix: str) -> str:
+        return os.path.join(self._base_dir, f'{key}{suffix}')
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        """读取缓存，返回 (data, suffix)；未命中或已过期返回 None。"""
+        if self._budget <= 0:
+            return None
+        self._ensure_scanned()
+        for suffix in _ALLOWED_SUFFIXES:
+            path = self._path_for(key, suffix)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if self._max_age_s > 0 and time.time() - stat.st_mtime > self._max_age_s:
+                self._remove(key, path)
+                break
+            try:
+                with open(path, 'rb') as handle:
+                    data = handle.read()
+                # 刷新 mtime 作为“最近访问时间”，供 LRU 淘汰与过期判断
+                os.utime(path, None)
+            except OSError:
+                continue
+            with self._lock:
+                self._hits += 1
+                if key not in self._index:
+                    self._index[key] = (suffix, len(data))
+                    self._used += len(data)
+                self._index.move_to_end(key)
+            return data, suffix
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def put(self, key: str, data: bytes, suffix: str) -> bool:
+        if suffix not in _ALLOWED_SUFFIXES:
+            suffix = '.bin'
+        size = len(data)
+        if self._budget <= 0 or size > self._budget // 4:
+            return False
+        self._ensure_scanned()
+
+        path = self._path_for(key, suffix)
+        if not os.path.isdir(self._base_dir):
+            return False
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=self._base_dir)
+            with os.fdopen(fd, 'wb') as handle:
+                handle.write(data)
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except OSError as exc:
+            logger.warning('写入磁盘缓存失败: {} | 错误: {}', path, exc)
+            return False
+        finally:
+            if tmp_path:
+                _remove_quietly(tmp_path)
+
+        victims = []
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._used -= previous[1]
+            self._index[key] = (suffix, size)
+            self._used += size
+            while self._index and self._used > self._budget:
+                victim_key, (victim_suffix, victim_size) = self._index.popitem(last=False)
+                self._used -= victim_size
+                self._evictions += 1
+                victims.append(self._path_for(victim_key, victim_suffix))
+        for victim in victims:
+            _remove_quietly(victim)
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            items = list(self._index.items())
+            self._index.clear()
+            self._used = 0
+        for key, (suffix, _) in items:
+            _remove_quietly(self._path_for(key, suffix))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'items': len(self._index),
+                'used_bytes': self._used,
+                'budget_bytes': self._budget,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
+
+    def _remove(self, key: str, path: str) -> None:
+        with self._lock:
+            previous = self._index.pop(key, None)
+            if previous is not None:
+                self._used -= previous[1]
+        _remove_quietly(path)
+
+    def _ensure_scanned(self) -> None:
+        """首次使用及每隔 rescan_interval_s 扫描目录，重建容量统计（包含其他进程写入的条目）。"""
+        now = time.monotonic()
+        with self._lock:
+            if self._scanned_at is not None and now - self._scanned_at < self._rescan_interval_s:
+                return
+            self._scanned_at = now
+            base_dir = self._base_dir
+
+        found = []
+        try:
+            with os.scandir(base_dir) as items:
+                for item in items:
+                    key, suffix = os.path.splitext(item.name)
+                    if suffix not in _ALLOWED_SUFFIXES or key.startswith('.'):
+                        continue
+                    try:
+                        stat = item.stat()
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, key, suffix, stat.st_size))
+        except FileNotFoundError:
+            pass
+        except OSError as exc:
+            logger.warning('扫描磁盘缓存失败: {} | 错误: {}', base_dir, exc)
+            return
+
+        found.sort()
+        victims = []
+        with self._lock:
+            self._index.clear()
+            self._used = 0
+            for _, key, suffix, size in found:
+                self._index[key] = (suffix, size)
+                self._used += size
+            while self._index and self._used > self._budget:
+                victim_key, (victim_suffix, victim_size) = self._index.popitem(last=False)
+                self._used -= victim_size
+                self._evictions += 1
+                victims.append(self._path_for(victim_key, victim_suffix))
+        for victim in victims:
+            _remove_quietly(victim)
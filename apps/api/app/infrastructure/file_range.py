@@ -0,0 +1,44 @@
+from typing import Optional
+
+
+class FileRange:
+    """
+    文件内某个字节区间的只读视图，作为 WSGI 响应体使用。
+
+    - fileno() 返回已定位到区间起点的原始文件描述符：gunicorn 等服务器会据此配合
+      Content-Length 直接 os.sendfile，页面数据不经过 Python。
+    - read() 严格限制在区间内，不支持 sendfile 的服务器逐块读取时也不会越界。
+    """
+
+    def __init__(self, file_path: str, offset: int, length: int):
+        self._file = open(file_path, 'rb', buffering=0)
+        try:
+            self._file.seek(offset)
+        except BaseException:
+            self._file.close()
+            raise
+        self._remaining = max(0, int(length))
+
+    def fileno(self) -> int:
+        return self._file.fileno()
+
+    def read(self, size: Optional[int] = -1) -> bytes:
+        if self._remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def open_file_range(file_path: str, offset: int, length: int) -> Optional[FileRange]:
+    """打开字节区间视图，文件不可读时返回 None。"""
+    try:
+        return FileRange(file_path, offset, length)
+    except OSError:
+        return None
+
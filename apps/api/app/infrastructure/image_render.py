@@ -0,0 +1,291 @@
+import io
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from PIL import Image, ImageChops, ImageOps, features
+
+# 说明：
+# - 纯函数：输入页面字节与渲染参数，输出编码后的字节；不依赖应用上下文与数据库。
+# - 可在请求线程内直接调用，也可提交到渲染进程池（参数与返回值均可 pickle）。
+
+# 渲染结果：(data, mimetype, is_gray)；data 为空表示原图已不超过目标尺寸，无需缩放；
+# is_gray 为本次灰度判定结果（未做判定时为 None），供调用方按页记录
+RenderOutput = Tuple[bytes, str, Optional[bool]]
+
+# 分级瓦片结果：([(x, y, data), ...], mimetype, is_gray)
+TileLevelOutput = Tuple[List[Tuple[int, int, bytes]], str, Optional[bool]]
+
+# 页面缩略图结果：(data, 宽, 高, 原图显示尺寸, is_gray)
+ThumbnailOutput = Tuple[bytes, int, int, Tuple[int, int], bool]
+
+# AVIF 编码速度（0 最慢最小 ~ 10 最快）：按需渲染取偏快的档位
+_AVIF_SPEED = 8
+
+_EXIF_ORIENTATION_TAG = 0x0112
+# 需要交换宽高的 EXIF Orientation 取值（旋转 90°/270°）
+_TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+_RESAMPLING = getattr(Image, 'Resampling', Image)
+# 灰度判定：缩小到 128px 以内后统计“彩色像素”（通道间最大差值超过阈值）占比
+_GRAY_SAMPLE_PX = 128
+_GRAY_CHROMA_THRESHOLD = 24
+_GRAY_MAX_COLOR_RATIO = 0.002
+
+# 缩小解码：非 JPEG 先按整数倍 reduce，保留不少于目标 2 倍的余量再用指定滤镜精确缩放
+_REDUCING_GAP = 2.0
+
+_RESAMPLE_FILTERS = {
+    'nearest': _RESAMPLING.NEAREST,
+    'bilinear': _RESAMPLING.BILINEAR,
+    'bicubic': _RESAMPLING.BICUBIC,
+    'lanczos': _RESAMPLING.LANCZOS,
+}
+
+
+def is_avif_supported() -> bool:
+    """当前 Pillow 是否带 AVIF 编码支持。"""
+    try:
+        return bool(features.check('avif'))
+    except Exception:
+        return False
+
+
+def normalize_output_format(value: str, original: Optional[str]) -> str:
+    v = str(value or '').strip().lower()
+    if v == 'avif':
+        return 'AVIF' if is_avif_supported() else 'WEBP'
+    if v in {'jpg', 'jpeg'}:
+        return 'JPEG'
+    if v == 'png':
+        return 'PNG'
+    if v == 'webp':
+        return 'WEBP'
+    if v in {'auto', '', 'origin', 'original'}:
+        if original and str(original).upper() in {'JPEG', 'PNG', 'WEBP'}:
+            return str(original).upper()
+        return 'WEBP'
+    return 'WEBP'
+
+
+def mimetype_for_format(fmt: str) -> str:
+    fmt = str(fmt or '').upper()
+    if fmt == 'PNG':
+        return 'image/png'
+    if fmt == 'WEBP':
+        return 'image/webp'
+    if fmt == 'AVIF':
+        return 'image/avif'
+    return 'image/jpeg'
+
+
+def prepare_for_jpeg(image: Image.Image) -> Image.Image:
+    if image.mode == 'RGB' or image.mode == 'L':
+        return image
+    if image.mode in {'RGBA', 'LA'}:
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        alpha = image.split()[-1]
+        background.paste(image, mask=alpha)
+        return background
+    if image.mode == 'P':
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[-1])
+        return background
+    return image.convert('RGB')
+
+
+def is_effectively_gray(image: Image.Image) -> bool:
+    """
+    判断图片是否实际为灰度（黑白扫描常以 RGB JPEG 保存，通道间只有轻微的压缩噪声）。
+
+    在缩小后的样本上计算每个像素 R/G/B 两两差值的最大值，超过阈值的像素占比极低即视为灰度。
+    带透明通道的图片不做判定（返回 False），保持原有的透明处理。
+    """
+    if image.mode in ('1', 'L', 'I', 'I;16', 'F'):
+        return True
+    if image.mode not in ('RGB', 'P', 'CMYK', 'YCbCr'):
+        return False
+    if image.mode == 'P' and 'transparency' in image.info:
+        return False
+
+    sample = image.copy()
+    sample.thumbnail((_GRAY_SAMPLE_PX, _GRAY_SAMPLE_PX), resample=_RESAMPLING.NEAREST if image.mode == 'P' else _RESAMPLING.BOX)
+    if sample.mode != 'RGB':
+        sample = sample.convert('RGB')
+    red, green, blue = sample.split()
+    chroma = ImageChops.lighter(
+        ImageChops.lighter(ImageChops.difference(red, green), ImageChops.difference(green, blue)),
+        ImageChops.difference(red, blue),
+    )
+    histogram = chroma.histogram()
+    colored = sum(histogram[_GRAY_CHROMA_THRESHOLD:])
+    return colored <= sum(histogram) * _GRAY_MAX_COLOR_RATIO
+
+
+def _save_kwargs(fmt: str, *, quality: int, optimize: bool, webp_method: int) -> Dict[str, object]:
+    if fmt == 'JPEG':
+        return {'quality': int(quality), 'optimize': bool(optimize)}
+    if fmt == 'WEBP':
+        return {'quality': int(quality), 'method': int(webp_method)}
+    if fmt == 'PNG':
+        return {'optimize': bool(optimize)}
+    if fmt == 'AVIF':
+        return {'quality': int(quality), 'speed': _AVIF_SPEED}
+    return {}
+
+
+def _prepare_for_save(image: Image.Image, fmt: str, *, grayscale: bool, gray_hint: Optional[bool]) -> Tuple[Image.Image, Optional[bool]]:
+    """按输出格式准备待编码图像；灰度页转为单通道，返回 (图像, 灰度判定)。"""
+    is_gray = None
+    image_to_save = image
+    if grayscale:
+        is_gray = gray_hint if gray_hint is not None else is_effectively_gray(image)
+        if is_gray and image.mode != 'L':
+            image_to_save = image.convert('L')
+    if fmt == 'JPEG':
+        image_to_save = prepare_for_jpeg(image_to_save)
+    return image_to_save, is_gray
+
+
+def displayed_size(img: Image.Image) -> Tuple[int, int]:
+    """只读图片头得到显示方向的 (宽, 高)：EXIF 方向为 5–8（旋转 90°）时交换宽高，不解码像素。"""
+    width, height = img.size
+    try:
+        orientation = img.getexif().get(_EXIF_ORIENTATION_TAG)
+    except Exception:
+        orientation = None
+    if orientation in _TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+
+def fit_within(size: Tuple[int, int], max_width: int, max_height: int) -> Tuple[int, int]:
+    """保持长宽比缩小到不超过 max_width × max_height（不放大）。"""
+    width, height = size
+    ratio = min(max_width / max(1, width), max_height / max(1, height), 1.0)
+    return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+
+def decode_scaled(img: Image.Image, size: Tuple[int, int], *, resample: int) -> Image.Image:
+    """
+    按显示方向的目标尺寸缩小解码（shrink-on-load），返回已修正 EXIF 方向、尺寸恰为 size 的图像。
+
+    - JPEG 用 draft 按 1/2~1/8 比例直接解码到不小于目标的尺寸，不必先解出全尺寸像素。
+    - 其余格式（PNG/WebP 等）只能完整解码，随后先按整数倍 reduce（盒式平均，远快于 LANCZOS）再精确缩放。
+    """
+    width, height = displayed_size(img)
+    target_width, target_height = size
+    if getattr(img, 'format', None) == 'JPEG' and (target_width < width or target_height < height):
+        # draft 使用存储方向的尺寸
+        stored = (target_width, target_height) if img.size == (width, height) else (target_height, target_width)
+        try:
+            img.draft('RGB', stored)
+        except Exception:
+            pass
+
+    img = ImageOps.exif_transpose(img)
+    if img.size != (target_width, target_height):
+        img = img.resize((target_width, target_height), resample=resample, reducing_gap=_REDUCING_GAP)
+    return img
+
+
+def render_image_bytes(
+    data: bytes,
+    *,
+    max_side_px: int,
+    output_format: str,
+    quality: int,
+    resample: str,
+    optimize: bool,
+    webp_method: int,
+    grayscale: bool = False,
+    gray_hint: Optional[bool] = None,
+) -> RenderOutput:
+    """
+    将页面图片缩放到最长边不超过 max_side_px 并重新编码。
+
+    - grayscale：实际为灰度的页面按单通道（L）编码；gray_hint 为已记录的判定结果，传入时不再重复检测。
+    - 原图已不超过目标尺寸时返回 (b'', '', None)；解码/编码失败时抛出异常，由调用方回退。
+    """
+    resample_filter = _RESAMPLE_FILTERS.get(str(resample or '').strip().lower(), _RESAMPLING.LANCZOS)
+
+    with Image.open(io.BytesIO(data)) as img:
+        # 尺寸只看图片头：不需要缩放时不解码像素
+        size = displayed_size(img)
+        if max(size) <= max_side_px:
+            return b'', '', None
+
+        fmt = normalize_output_format(output_format, getattr(img, 'format', None))
+        img = decode_scaled(img, fit_within(size, max_side_px, max_side_px), resample=resample_filter)
+
+        # 灰度页按单通道编码：JPEG/PNG 只写一个通道；WebP 内部仍为 YUV，但色度平面变为常量，体积同样下降
+        image_to_save, is_gray = _prepare_for_save(img, fmt, grayscale=grayscale, gray_hint=gray_hint)
+        out = io.BytesIO()
+        image_to_save.save(out, format=fmt, **_save_kwargs(fmt, quality=quality, optimize=optimize, webp_method=webp_method))
+        return out.getvalue(), mimetype_for_format(fmt), is_gray
+
+
+def render_tile_level(
+    data: bytes,
+    *,
+    level: int,
+    tile_size: int,
+    output_format: str,
+    quality: int,
+    resample: str,
+    optimize: bool,
+    webp_method: int,
+    grayscale: bool = False,
+    gray_hint: Optional[bool] = None,
+) -> TileLevelOutput:
+    """
+    把页面缩放到第 level 级（0 级为原尺寸，每级宽高减半并向上取整），切成 tile_size 见方的瓦片并逐块编码。
+
+    level>0 时缩小解码（见 decode_scaled），超大页面不必先解码出全尺寸像素。
+    """
+    resample_filter = _RESAMPLE_FILTERS.get(str(resample or '').strip().lower(), _RESAMPLING.LANCZOS)
+    scale = 1 << max(0, int(level))
+    tile_size = max(1, int(tile_size))
+
+    with Image.open(io.BytesIO(data)) as img:
+        source_format = getattr(img, 'format', None)
+        display_width, display_height = displayed_size(img)
+        width = max(1, -(-display_width // scale))
+        height = max(1, -(-display_height // scale))
+        img = decode_scaled(img, (width, height), resample=resample_filter)
+
+        fmt = normalize_output_format(output_format, source_format)
+        image_to_save, is_gray = _prepare_for_save(img, fmt, grayscale=grayscale, gray_hint=gray_hint)
+        save_kwargs = _save_kwargs(fmt, quality=quality, optimize=optimize, webp_method=webp_method)
+
+        tiles: List[Tuple[int, int, bytes]] = []
+        for y in range(-(-height // tile_size)):
+            for x in range(-(-width // tile_size)):
+                box = (x * tile_size, y * tile_size, min(width, (x + 1) * tile_size), min(height, (y + 1) * tile_size))
+                out = io.BytesIO()
+                image_to_save.crop(box).save(out, format=fmt, **save_kwargs)
+                tiles.append((x, y, out.getvalue()))
+        return tiles, mimetype_for_format(fmt), is_gray
+
+
+def render_thumbnail(data: bytes, *, max_side: int, quality: int) -> ThumbnailOutput:
+    """
+    生成页面缩略图（JPEG，灰度页为单通道），同时给出原图显示尺寸与灰度判定（供持久化后作为渲染的 gray_hint）。
+
+    缩小解码（见 decode_scaled），缩略图的成本远低于完整解码；原图不超过 max_side 时只重新编码。
+    """
+    max_side = max(1, int(max_side))
+    with Image.open(io.BytesIO(data)) as img:
+        source_size = displayed_size(img)
+        img = decode_scaled(img, fit_within(source_size, max_side, max_side), resample=_RESAMPLING.BILINEAR)
+        image_to_save, is_gray = _prepare_for_save(img, 'JPEG', grayscale=True, gray_hint=None)
+        out = io.BytesIO()
+        image_to_save.save(out, format='JPEG', quality=int(quality))
+        return out.getvalue(), image_to_save.width, image_to_save.height, source_size, bool(is_gray)
+
+
+def timed_render(task: Callable[..., object], data: bytes, params: Dict[str, object]) -> Tuple[object, float]:
+    """渲染进程池的入口：返回 task 的结果与本进程内的执行耗时（秒），用于区分排队与渲染时间。"""
+    started = time.perf_counter()
+    output = task(data, **params)
+    return output, time.perf_counter() - started
@@ -0,0 +1,82 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Sized
+
+
+class ByteBudgetLRU:
+    """
+    按字节预算淘汰的 LRU 缓存（线程安全），值为 bytes 或支持 len() 的对象（按长度计入预算）。
+
+    - 单个值超过预算的一半时不缓存，避免一次写入冲掉全部热数据。
+    - budget_bytes=0 表示关闭缓存。
+    """
+
+    def __init__(self, budget_bytes: int):
+        self._budget = max(0, int(budget_bytes))
+        self._lock = threading.Lock()
+        self._items: 'OrderedDict[Hashable, Sized]' = OrderedDict()
+        self._used = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def configure(self, budget_bytes: int) -> None:
+        with self._lock:
+            self._budget = max(0, int(budget_bytes))
+            self._evict_locked()
+
+    def get(self, key: Hashable) -> Optional[Sized]:
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self._misses += 1
+                return None
+            self._items.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def peek(self, key: Hashable) -> bool:
+        """只判断是否存在，不影响 LRU 顺序与命中统计。"""
+        with self._lock:
+            return key in self._items
+
+    def put(self, key: Hashable, value: Sized) -> bool:
+        size = len(value)
+        with self._lock:
+            if self._budget <= 0 or size > self._budget // 2:
+                return False
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._used -= len(previous)
+            self._items[key] = value
+            self._used += size
+            self._evict_locked()
+            return True
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self._used -= len(previous)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._used = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'items': len(self._items),
+                'used_bytes': self._used,
+                'budget_bytes': self._budget,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+            }
+
+    def _evict_locked(self) -> None:
+        while self._items and self._used > self._budget:
+            _, value = self._items.popitem(last=False)
+            self._used -= len(value)
+            self._evictions += 1
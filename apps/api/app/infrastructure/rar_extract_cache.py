@@ -0,0 +1,348 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+import rarfile
+from loguru import logger
+
+from .single_flight import SingleFlight
+
+# 书籍键：(路径, mtime, size)，与句柄池保持一致
+BookKey = Tuple[str, int, int]
+
+# 解压失败（加密、损坏、缺少解压工具等）后在此时间内不再重试，阅读回退为逐页解压
+_FAILURE_RETRY_S = 300.0
+_EXTRACT_TIMEOUT_S = 600.0
+
+
+def _remove_tree_quietly(path: str) -> None:
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+    return total
+
+
+def _tool_extract_cmdline(archive_path: str, dest_dir: str) -> Optional[List[str]]:
+    """按 rarfile 选中的外部工具构造“整本解压到目录”的命令行；没有可用工具时返回 None。"""
+    try:
+        setup = rarfile.tool_setup()
+    except rarfile.RarCannotExec:
+        return None
+    tool_key = setup.setup['open_cmd'][0]
+    tool = getattr(rarfile, tool_key, None)
+    if not tool:
+        return None
+    if tool_key == 'UNRAR_TOOL':
+        return [tool, 'x', '-y', '-inul', '-p-', '--', archive_path, dest_dir + os.sep]
+    if tool_key == 'UNAR_TOOL':
+        return [tool, '-q', '-f', '-D', '-p', '', '-o', dest_dir, archive_path]
+    if tool_key in ('SEVENZIP_TOOL', 'SEVENZIP2_TOOL'):
+        return [tool, 'x', '-y', '-bb0', '-p', f'-o{dest_dir}', '--', archive_path]
+    if tool_key == 'BSDTAR_TOOL':
+        return [tool, '-x', '-f', archive_path, '-C', dest_dir]
+    return None
+
+
+def extract_rar_book(archive: Any, archive_path: str, dest_dir: str, names: Sequence[str]) -> None:
+    """
+    把整本 RAR 解压到 dest_dir。
+
+    优先用一次外部工具进程解压整本（固实归档只顺序解码一遍）；没有可用工具时
+    在同一个已打开句柄上逐条读取（仅未压缩条目可脱离外部工具读取）。
+    """
+    if archive.needs_password():
+        raise ValueError('加密的 RAR 不支持整本解压缓存')
+
+    cmdline = _tool_extract_cmdline(archive_path, dest_dir)
+    if cmdline is not None:
+        completed = subprocess.run(
+            cmdline,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=_EXTRACT_TIMEOUT_S,
+            check=False,
+        )
+        if completed.returncode != 0:
+            message = completed.stderr.decode('utf-8', errors='replace').strip()[:200]
+            raise RuntimeError(f'解压工具返回 {completed.returncode}: {message}')
+        return
+
+    for name in names:
+        target = resolve_extracted_path(dest_dir, name)
+        if target is None:
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with archive.open(name) as src, open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+
+def resolve_extracted_path(book_dir: str, entry_name: str) -> Optional[str]:
+    """条目名 -> 解压目录中的文件路径；拒绝越出 book_dir 的条目名。"""
+    parts = [part for part in entry_name.replace('\\', '/').split('/') if part not in ('', '.')]
+    if not parts or '..' in parts:
+        return None
+    return os.path.join(book_dir, *parts)
+
+
+class RarExtractCache:
+    """
+    RAR 整本解压缓存（线程安全）。
+
+    - rarfile 每次读取压缩条目都要启动一次外部解压进程并重新扫描归档；阅读时改为整本解压一次，
+      之后的页面读取直接读普通文件。
+    - 目录结构：<base_dir>/<书籍键摘要>/<条目路径>；先解压到临时目录，完成后原子改名，读者不会看到半本。
+    - 解压在后台线程中进行（同一时刻只解压一本），触发解压的请求及解压完成前的请求照常逐页解压，
+      不会因整本解压而卡住首页；只有解压完成（原子改名）后才从解压目录读取。
+    - 同一本书同时只有一个解压过程（single-flight），重复请求不会重复提交。
+    - 按书淘汰：总大小超出预算时删除最久未读的书（目录 mtime 作为最近访问时间，供多进程重新扫描时排序）。
+    - budget_bytes=0 表示关闭。
+    """
+
+    def __init__(
+        self,
+        open_archive: Callable[[str], Any],
+        *,
+        base_dir: Optional[str] = None,
+        budget_bytes: int = 0,
+        rescan_interval_s: float = 600.0,
+    ):
+        self._open_archive = open_archive
+        self._base_dir = base_dir
+        self._budget = max(0, int(budget_bytes))
+        self._rescan_interval_s = rescan_interval_s
+        self._lock = threading.Lock()
+        # 目录名 -> 解压后大小；顺序即 LRU 顺序（末尾最近使用）
+        self._books: 'OrderedDict[str, int]' = OrderedDict()
+        self._used = 0
+        self._scanned_at: Optional[float] = None
+        self._flights = SingleFlight(timeout_s=_EXTRACT_TIMEOUT_S)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # 已提交后台解压、尚未结束的书（目录名）
+        self._queued: Set[str] = set()
+        self._failed: Dict[str, float] = {}
+        self._hits = 0
+        self._extractions = 0
+        self._failures = 0
+        self._evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._budget > 0 and bool(self._base_dir)
+
+    def configure(self, *, base_dir: str, budget_bytes: int) -> None:
+        victims: List[str] = []
+        with self._lock:
+            if base_dir != self._base_dir:
+                self._base_dir = base_dir
+                self._books.clear()
+                self._used = 0
+                self._scanned_at = None
+            self._budget = max(0, int(budget_bytes))
+            # 关闭（预算为 0）时保留已解压的书，重新开启后仍可直接使用
+            if self._budget > 0:
+                victims = self._evict_locked(keep=None)
+        for victim in victims:
+            _remove_tree_quietly(victim)
+
+    @staticmethod
+    def _dir_name(key: BookKey) -> str:
+        return hashlib.sha1(f'{key[0]}|{key[1]}|{key[2]}'.encode('utf-8')).hexdigest()
+
+    def lookup(self, key: BookKey) -> Optional[str]:
+        """返回已解压完成的书籍目录，不触发解压。"""
+        if not self.enabled:
+            return None
+        base_dir = self._base_dir
+        name = self._dir_name(key)
+        book_dir = os.path.join(base_dir, name)
+        if not os.path.isdir(book_dir):
+            return None
+        self._touch(name, book_dir)
+        return book_dir
+
+    def ensure(self, key: BookKey, names: Sequence[str], expected_bytes: int) -> Optional[str]:
+        """
+        返回已解压完成的书籍目录；尚未解压时提交后台整本解压并立即返回 None。
+
+        返回 None（缓存关闭、整本超出预算一半、解压中或解压失败）时调用方本次逐页解压。
+        """
+        if not self.enabled:
+            return None
+        self._ensure_scanned()
+        book_dir = self.lookup(key)
+        if book_dir is not None:
+            with self._lock:
+                self._hits += 1
+            return book_dir
+
+        name = self._dir_name(key)
+        with self._lock:
+            failed_at = self._failed.get(name)
+            if failed_at is not None and time.monotonic() - failed_at < _FAILURE_RETRY_S:
+                return None
+            if expected_bytes > self._budget // 2:
+                return None
+            if name in self._queued:
+                return None
+            self._queued.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rar-extract')
+            executor = self._executor
+        executor.submit(self._extract_in_background, key, name, list(names))
+        return None
+
+    def _extract_in_background(self, key: BookKey, name: str, names: List[str]) -> None:
+        try:
+            # 上一次解压可能刚好在查询之后完成（含其他进程）：执行前再确认一次
+            self._flights.do(name, lambda: self.lookup(key) or self._extract(key, name, names))
+        except Exception as exc:
+            logger.warning('RAR 后台解压失败: {} | 错误: {}', key[0], exc)
+        finally:
+            with self._lock:
+                self._queued.discard(name)
+
+    def stats(self) -> Dict[str, int]:
+        flights = self._flights.stats()
+        with self._lock:
+            return {
+                'books': len(self._books),
+                'used_bytes': self._used,
+                'budget_bytes': self._budget,
+                'inflight': flights['inflight'],
+                'queued': len(self._queued),
+                'hits': self._hits,
+                'extractions': self._extractions,
+                'waits': flights['shared'],
+                'failures': self._failures,
+                'evictions': self._evictions,
+            }
+
+    def _extract(self, key: BookKey, name: str, names: Sequence[str]) -> Optional[str]:
+        base_dir = self._base_dir
+        if not base_dir or not os.path.isdir(base_dir):
+            return None
+        book_dir = os.path.join(base_dir, name)
+        started = time.monotonic()
+        tmp_dir = None
+        try:
+            tmp_dir = tempfile.mkdtemp(prefix=f'.tmp-{name[:12]}-', dir=base_dir)
+            archive = self._open_archive(key[0])
+            try:
+                extract_rar_book(archive, key[0], tmp_dir, names)
+            finally:
+                archive.close()
+            size = _directory_size(tmp_dir)
+            try:
+                os.replace(tmp_dir, book_dir)
+                tmp_dir = None
+            except OSError:
+                # 其他进程已抢先完成同一本书
+                if not os.path.isdir(book_dir):
+                    raise
+        except Exception as exc:
+            logger.warning('RAR 整本解压失败，回退为逐页解压: {} | 错误: {}', key[0], exc)
+            with self._lock:
+                self._failed[name] = time.monotonic()
+                self._failures += 1
+            return None
+        finally:
+            if tmp_dir:
+                _remove_tree_quietly(tmp_dir)
+
+        logger.info('RAR 整本解压完成: {} | {:.1f} MB | {:.2f}s', key[0], size / 1024 / 1024, time.monotonic() - started)
+        with self._lock:
+            self._failed.pop(name, None)
+            self._extractions += 1
+            previous = self._books.pop(name, None)
+            if previous is not None:
+                self._used -= previous
+            self._books[name] = size
+            self._used += size
+            victims = self._evict_locked(keep=name)
+        for victim in victims:
+            _remove_tree_quietly(victim)
+        return book_dir
+
+    def _touch(self, name: str, book_dir: str) -> None:
+        with self._lock:
+            if name in self._books:
+                self._books.move_to_end(name)
+        try:
+            os.utime(book_dir, None)
+        except OSError:
+            pass
+
+    def _evict_locked(self, *, keep: Optional[str]) -> List[str]:
+        victims: List[str] = []
+        if not self._base_dir:
+            return victims
+        for victim in list(self._books.keys()):
+            if self._used <= self._budget:
+                break
+            if victim == keep:
+                continue
+            self._used -= self._books.pop(victim)
+            self._evictions += 1
+            victims.append(os.path.join(self._base_dir, victim))
+        return victims
+
+    def _ensure_scanned(self) -> None:
+        """首次使用及每隔 rescan_interval_s 扫描目录，重建容量统计（包含其他进程解压的书），并清理残留临时目录。"""
+        now = time.monotonic()
+        with self._lock:
+            if self._scanned_at is not None and now - self._scanned_at < self._rescan_interval_s:
+                return
+            self._scanned_at = now
+            base_dir = self._base_dir
+        if not base_dir:
+            return
+
+        found = []
+        stale_tmp = []
+        try:
+            with os.scandir(base_dir) as items:
+                for item in items:
+                    if not item.is_dir():
+                        continue
+                    try:
+                        mtime = item.stat().st_mtime
+                    except OSError:
+                        continue
+                    if item.name.startswith('.'):
+                        # 解压中断留下的临时目录（超过解压超时仍存在即视为残留）
+                        if time.time() - mtime > _EXTRACT_TIMEOUT_S:
+                            stale_tmp.append(item.path)
+                        continue
+                    found.append((mtime, item.name, _directory_size(item.path)))
+        except FileNotFoundError:
+            return
+        except OSError as exc:
+            logger.warning('扫描 RAR 解压缓存失败: {} | 错误: {}', base_dir, exc)
+            return
+
+        found.sort()
+        with self._lock:
+            self._books.clear()
+            self._used = 0
+            for _, name, size in found:
+                self._books[name] = size
+                self._used += size
+            victims = self._evict_locked(keep=None)
+        for victim in victims + stale_tmp:
+            _remove_tree_quietly(victim)
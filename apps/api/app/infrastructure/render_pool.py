@@ -0,0 +1,203 @@
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Deque, Dict, Optional, Tuple
+
+from loguru import logger
+
+from .image_render import render_image_bytes, timed_render
+
+
+class RenderPoolFull(Exception):
+    """渲染进程池排队已满。"""
+
+
+class RenderProcessPool:
+    """
+    页面渲染进程池（线程安全）。
+
+    - Pillow 解码/缩放/编码放到独立进程执行，请求线程只交出页面字节与渲染参数、取回编码结果，
+      不再与其他请求（包括普通 JSON 接口）争抢 GIL。
+    - 有界排队：同时在途（执行中 + 排队）的任务数不超过 workers + queue_depth，超出时抛出 RenderPoolFull，
+      由调用方决定回退方式。
+    - 子进程使用 forkserver/spawn 启动，不继承父进程中的线程与锁；工作进程意外退出时下次提交自动重建。
+    - workers=0 表示关闭。
+    """
+
+    def __init__(self, *, workers: int = 0, queue_depth: int = 16, timeout_s: float = 30.0, sample_size: int = 256):
+        self._workers = max(0, int(workers))
+        self._queue_depth = max(0, int(queue_depth))
+        self._timeout_s = timeout_s
+        self._lock = threading.Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_workers = 0
+        self._inflight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._wait_samples: Deque[float] = deque(maxlen=sample_size)
+        self._render_samples: Deque[float] = deque(maxlen=sample_size)
+
+    @property
+    def enabled(self) -> bool:
+        return self._workers > 0
+
+    def configure(self, *, workers: int, queue_depth: int) -> None:
+        stale = None
+        with self._lock:
+            self._workers = max(0, int(workers))
+            self._queue_depth = max(0, int(queue_depth))
+            if self._executor is not None and self._executor_workers != self._workers:
+                # 进程数变化：旧池处理完在途任务后退出，新任务提交到重建的池
+                stale, self._executor = self._executor, None
+        if stale is not None:
+            stale.shutdown(wait=False, cancel_futures=False)
+
+    def render(
+        self,
+        data: bytes,
+        params: Dict[str, object],
+        *,
+        task: Callable[..., object] = render_image_bytes,
+    ) -> Tuple[object, float]:
+        """
+        在渲染进程中执行 task(data, **params)（默认 render_image_bytes），返回 (task 的结果, 渲染进程内耗时秒数)。
+        task 必须是模块级函数（可 pickle）。
+
+        排队已满抛出 RenderPoolFull；等待超时抛出 TimeoutError（任务结束前仍计入在途数）；
+        渲染异常与进程池异常（BrokenProcessPool，下次提交时重建）原样抛出。
+        """
+        with self._lock:
+            if self._workers <= 0:
+                raise RenderPoolFull('渲染进程池未启用')
+            if self._inflight >= self._workers + self._queue_depth:
+                self._rejected += 1
+                raise RenderPoolFull('渲染进程池排队已满')
+            executor = self._ensure_executor_locked()
+            self._inflight += 1
+            self._submitted += 1
+
+        started = time.perf_counter()
+        try:
+            future = executor.submit(timed_render, task, data, params)
+        except BaseException as exc:
+            self._finish_task(ok=False)
+            if isinstance(exc, BrokenProcessPool):
+                self._discard_broken(executor)
+            raise
+        # 在途计数在任务真正结束时才扣减：等待超时的任务仍占用工作进程，不能提前放出名额
+        future.add_done_callback(lambda done: self._finish_task(ok=not done.cancelled() and done.exception() is None))
+        try:
+            output, render_s = future.result(timeout=self._timeout_s)
+        except FutureTimeoutError:
+            future.cancel()
+            with self._lock:
+                self._timeouts += 1
+            raise TimeoutError('渲染进程池等待超时')
+        except BrokenProcessPool:
+            self._discard_broken(executor)
+            raise
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._render_samples.append(render_s)
+            self._wait_samples.append(max(0.0, elapsed - render_s))
+        return output, render_s
+
+    def _finish_task(self, *, ok: bool) -> None:
+        with self._lock:
+            self._inflight -= 1
+            if ok:
+                self._completed += 1
+            else:
+                self._failed += 1
+
+    def _discard_broken(self, executor: ProcessPoolExecutor) -> None:
+        logger.warning('渲染进程池异常退出，将在下次提交时重建')
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                'workers': self._workers,
+                'queue_depth': self._queue_depth,
+                'inflight': self._inflight,
+                'submitted': self._submitted,
+                'completed': self._completed,
+                'failed': self._failed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'queue_wait_ms': _summarize_ms(self._wait_samples),
+                'render_ms': _summarize_ms(self._render_samples),
+            }
+
+    def _ensure_executor_locked(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._executor = ProcessPoolExecutor(max_workers=self._workers, mp_context=context)
+            self._executor_workers = self._workers
+        return self._executor
+
+
+class FormatEncodeStats:
+    """按输出格式统计编码次数、输入/输出字节与编码耗时（线程安全），用于比较各格式的体积与代价。"""
+
+    def __init__(self, *, sample_size: int = 256):
+        self._sample_size = sample_size
+        self._lock = threading.Lock()
+        self._formats: Dict[str, Dict[str, object]] = {}
+
+    def record(self, mimetype: str, *, input_bytes: int, output_bytes: int, encode_s: float) -> None:
+        name = str(mimetype or '').rpartition('/')[2] or 'unknown'
+        with self._lock:
+            item = self._formats.get(name)
+            if item is None:
+                item = {'count': 0, 'input_bytes': 0, 'output_bytes': 0, 'samples': deque(maxlen=self._sample_size)}
+                self._formats[name] = item
+            item['count'] += 1
+            item['input_bytes'] += int(input_bytes)
+            item['output_bytes'] += int(output_bytes)
+            item['samples'].append(encode_s)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            result = {}
+            for name, item in self._formats.items():
+                count = item['count']
+                result[name] = {
+                    'count': count,
+                    'input_bytes': item['input_bytes'],
+                    'output_bytes': item['output_bytes'],
+                    'avg_output_bytes': round(item['output_bytes'] / count) if count else 0,
+                    'output_ratio': round(item['output_bytes'] / item['input_bytes'], 4) if item['input_bytes'] else 0.0,
+                    'encode_ms': _summarize_ms(item['samples']),
+                }
+            return result
+
+
+def _summarize_ms(samples: Deque[float]) -> Dict[str, float]:
+    """最近若干次耗时的平均值 / p95 / 最大值（毫秒）。"""
+    if not samples:
+        return {'avg': 0.0, 'p95': 0.0, 'max': 0.0}
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        'avg': round(sum(ordered) / len(ordered) * 1000, 2),
+        'p95': round(p95 * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2),
+    }
@@ -0,0 +1,432 @@
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Generator, Iterable, List, Optional, Tuple
+
+import py7zr
+from loguru import logger
+
+from .archive_pool import ArchiveHandlePool
+from .memory_cache import ByteBudgetLRU
+
+try:  # py7zr >= 1.0 移除了 read()，改为 extract(factory=...) 写入自定义缓冲
+    from py7zr.io import Py7zIO, WriterFactory
+except ImportError:  # 旧版 py7zr
+    Py7zIO = object
+    WriterFactory = object
+
+# 书籍键：(路径, mtime, size)，与句柄池保持一致
+BookKey = Tuple[str, int, int]
+
+
+class _MemoryWriter(Py7zIO):
+    """py7zr 解压输出的内存缓冲。"""
+
+    def __init__(self):
+        self._buffer = io.BytesIO()
+
+    def write(self, s):
+        return self._buffer.write(s)
+
+    def read(self, size=None):
+        return self._buffer.read(size)
+
+    def seek(self, offset, whence=0):
+        return self._buffer.seek(offset, whence)
+
+    def flush(self):
+        return None
+
+    def size(self):
+        return self._buffer.getbuffer().nbytes
+
+    def getvalue(self) -> bytes:
+        return self._buffer.getvalue()
+
+
+class _MemoryWriterFactory(WriterFactory):
+    def __init__(self):
+        self.products: Dict[str, _MemoryWriter] = {}
+
+    def create(self, filename: str):
+        product = _MemoryWriter()
+        self.products[filename] = product
+        return product
+
+
+def read_7z_members(archive: Any, names: Iterable[str]) -> Dict[str, bytes]:
+    """从（可能被复用的）7z 句柄中解压指定条目，兼容新旧两代 py7zr API。"""
+    targets = list(names)
+    archive.reset()
+    if hasattr(archive, 'read'):
+        content_map = archive.read(targets)
+        return {name: data.read() for name, data in content_map.items()}
+
+    factory = _MemoryWriterFactory()
+    archive.extract(targets=targets, factory=factory)
+    return {name: product.getvalue() for name, product in factory.products.items()}
+
+
+class _DecodeAborted(Exception):
+    """会话被关闭（空闲超时/被淘汰/跳页重建）时用于中断 py7zr 解压线程。"""
+
+
+@dataclass
+class _Member:
+    """单个条目的解压进度（chunks 在解压线程中持续追加）。"""
+
+    name: str
+    chunks: List[bytes] = field(default_factory=list)
+    done: bool = False
+    failed: bool = False
+
+
+class _SessionWriter(Py7zIO):
+    """把 py7zr 写出的数据转交给解压会话，供等待方流式读取。"""
+
+    def __init__(self, session: '_DecodeSession', member: _Member):
+        self._session = session
+        self._member = member
+        self._size = 0
+
+    def write(self, s):
+        self._session.append(self._member, bytes(s))
+        self._size += len(s)
+        return len(s)
+
+    def read(self, size=None):
+        return b''
+
+    def seek(self, offset, whence=0):
+        return 0
+
+    def flush(self):
+        return None
+
+    def size(self):
+        return self._size
+
+    def close(self):
+        self._session.finish_member(self._member)
+
+
+class _SessionWriterFactory(WriterFactory):
+    def __init__(self, session: '_DecodeSession'):
+        self._session = session
+
+    def create(self, filename: str):
+        return _SessionWriter(self._session, self._session.open_member(filename))
+
+
+class _DecodeSession:
+    """
+    单本 7z 的顺序解压会话。
+
+    - 后台线程按归档顺序一次性解压固实块，每完成一页写入字节预算缓存。
+    - 解压领先“已请求的最大页”超过 read_ahead 页时，在 py7zr 请求下一个输出缓冲处阻塞，
+      从而保留解码器状态：后续顺序翻页 O(1) 续读，而不是每页都从固实块开头解压。
+    - 空闲超过 idle_timeout_s 或被关闭时中断解压线程并释放句柄。
+    """
+
+    def __init__(
+        self,
+        key: BookKey,
+        targets: List[str],
+        order: Dict[str, int],
+        cache: ByteBudgetLRU,
+        *,
+        read_ahead: int,
+        idle_timeout_s: float,
+    ):
+        self.key = key
+        self._targets = targets
+        self._target_set = set(targets)
+        self._order = order
+        self._cache = cache
+        self._read_ahead = max(0, int(read_ahead))
+        self._idle_timeout_s = max(1.0, float(idle_timeout_s))
+        self._cond = threading.Condition()
+        self._members: Dict[str, _Member] = {}
+        self._demand = -1
+        self._started_index = -1
+        self._closed = False
+        self.finished = False
+        self._last_activity = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='7z-decode', daemon=True)
+        self._thread.start()
+
+    # ---- 解压线程侧 ----
+
+    def _run(self) -> None:
+        completed = False
+        try:
+            with py7zr.SevenZipFile(self.key[0], 'r') as archive:
+                archive.extract(targets=self._targets, factory=_SessionWriterFactory(self))
+            completed = True
+        except _DecodeAborted:
+            pass
+        except Exception as exc:
+            logger.warning('7z 顺序解压失败: {} | 错误: {}', self.key[0], exc)
+        finally:
+            pending = []
+            with self._cond:
+                self.finished = True
+                for member in self._members.values():
+                    if not member.done:
+                        pending.append(member)
+            # 旧版 py7zr 不会回调输出缓冲的 close()：解压正常结束即视为全部完成
+            for member in pending:
+                if completed:
+                    self.finish_member(member)
+                else:
+                    with self._cond:
+                        member.failed = True
+                        member.done = True
+            with self._cond:
+                self._cond.notify_all()
+
+    def open_member(self, name: str) -> _Member:
+        index = self._order.get(name, -1)
+        with self._cond:
+            while not self._closed and index > self._demand + self._read_ahead:
+                self._cond.wait(timeout=self._idle_timeout_s)
+                if time.monotonic() - self._last_activity >= self._idle_timeout_s:
+                    self._closed = True
+            if self._closed:
+                raise _DecodeAborted()
+            member = _Member(name=name)
+            self._members[name] = member
+            self._started_index = max(self._started_index, index)
+            self._prune_locked()
+            self._cond.notify_all()
+            return member
+
+    def append(self, member: _Member, data: bytes) -> None:
+        with self._cond:
+            if self._closed:
+                raise _DecodeAborted()
+            member.chunks.append(data)
+            self._cond.notify_all()
+
+    def finish_member(self, member: _Member) -> None:
+        with self._cond:
+            if member.done:
+                return
+            member.done = True
+            data = b''.join(member.chunks)
+            self._cond.notify_all()
+        self._cache.put((self.key, member.name), data)
+
+    def _prune_locked(self) -> None:
+        # 只保留最近的已完成条目（其余已进入缓存或被淘汰），避免整本常驻内存
+        floor = self._demand - 1
+        for name in list(self._members.keys()):
+            member = self._members[name]
+            if member.done and self._order.get(name, -1) < floor:
+                del self._members[name]
+
+    # ---- 请求线程侧 ----
+
+    def can_serve(self, name: str) -> bool:
+        with self._cond:
+            if self._closed or name not in self._target_set:
+                return False
+            if name in self._members:
+                return True
+            return not self.finished and self._order.get(name, -1) > self._started_index
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def join(self, timeout_s: float) -> None:
+        """等待解压线程退出（其独立打开的归档句柄随之关闭）。"""
+        self._thread.join(timeout=timeout_s)
+
+    def wait_started(self, name: str, timeout_s: float) -> Optional[_Member]:
+        """登记需求并等待条目开始解压；失败/超时返回 None。"""
+        index = self._order.get(name, -1)
+        deadline = time.monotonic() + timeout_s
+        with self._cond:
+            self._last_activity = time.monotonic()
+            self._demand = max(self._demand, index)
+            self._cond.notify_all()
+            while name not in self._members and not self.finished and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(timeout=remaining)
+            return self._members.get(name)
+
+    def iter_member(self, member: _Member, timeout_s: float) -> Generator[bytes, None, None]:
+        sent = 0
+        while True:
+            with self._cond:
+                while sent >= len(member.chunks) and not member.done:
+                    self._last_activity = time.monotonic()
+                    if not self._cond.wait(timeout=timeout_s):
+                        raise TimeoutError('等待 7z 解压超时')
+                pending = member.chunks[sent:]
+                sent += len(pending)
+                finished = member.done
+                failed = member.failed
+            for chunk in pending:
+                yield chunk
+            if finished and sent >= len(member.chunks):
+                if failed:
+                    raise IOError('7z 条目解压失败')
+                return
+
+
+@dataclass(frozen=True)
+class _BookInfo:
+    solid: bool
+    order: Dict[str, int]
+
+
+class SevenZipPageReader:
+    """
+    7z 页读取器：
+    - 固实归档：顺序解压会话 + 字节预算页缓存，整本阅读从 O(N²) 降到 O(N)。
+    - 非固实归档：read 按条目直接解压（句柄池复用）；流式输出使用从请求页开始的会话（同样进入会话池）。
+    - 流式输出：边解压边输出，不再先把整页缓冲到内存。
+    """
+
+    def __init__(
+        self,
+        pool: ArchiveHandlePool,
+        *,
+        cache_budget_bytes: int = 128 * 1024 * 1024,
+        read_ahead: int = 6,
+        max_sessions: int = 4,
+        idle_timeout_s: float = 60.0,
+        wait_timeout_s: float = 60.0,
+    ):
+        self._pool = pool
+        self._cache = ByteBudgetLRU(cache_budget_bytes)
+        self._read_ahead = read_ahead
+        self._max_sessions = max(1, int(max_sessions))
+        self._idle_timeout_s = idle_timeout_s
+        self._wait_timeout_s = wait_timeout_s
+        self._lock = threading.Lock()
+        self._sessions: 'OrderedDict[BookKey, _DecodeSession]' = OrderedDict()
+        self._book_infos: 'OrderedDict[BookKey, _BookInfo]' = OrderedDict()
+
+    def configure(self, *, cache_budget_bytes: Optional[int] = None, read_ahead: Optional[int] = None) -> None:
+        if cache_budget_bytes is not None:
+            self._cache.configure(cache_budget_bytes)
+        if read_ahead is not None:
+            self._read_ahead = max(0, int(read_ahead))
+
+    def stats(self) -> Dict[str, int]:
+        result = dict(self._cache.stats())
+        with self._lock:
+            result['sessions'] = len(self._sessions)
+        return result
+
+    def close_path(self, file_path: str, *, timeout_s: float = 5.0) -> None:
+        """关闭指定文件的解压会话（各自独立打开归档），重命名/移动前调用；池内句柄由 ArchiveHandlePool.discard 关闭。"""
+        with self._lock:
+            victims = [self._sessions.pop(key) for key in [k for k in self._sessions if k[0] == file_path]]
+            for key in [k for k in self._book_infos if k[0] == file_path]:
+                del self._book_infos[key]
+        for victim in victims:
+            victim.close()
+        for victim in victims:
+            victim.join(timeout_s)
+
+    def read(self, file_path: str, name: str, targets: List[str]) -> Optional[bytes]:
+        key = self._book_key(file_path)
+        cached = self._cache.get((key, name))
+        if cached is not None:
+            return cached
+
+        info = self._book_info(key, targets)
+        if not info.solid:
+            with self._pool.lease(file_path) as archive:
+                data = read_7z_members(archive, [name]).get(name)
+            if data is not None:
+                self._cache.put((key, name), data)
+            return data
+
+        chunks = list(self._iter_from_session(key, name, targets, info))
+        return b''.join(chunks)
+
+    def iter_chunks(self, file_path: str, name: str, targets: List[str], chunk_size: int) -> Generator[bytes, None, None]:
+        key = self._book_key(file_path)
+        cached = self._cache.get((key, name))
+        if cached is not None:
+            for start in range(0, len(cached), chunk_size):
+                yield cached[start:start + chunk_size]
+            return
+
+        info = self._book_info(key, targets)
+        if not info.solid:
+            # 非固实：会话只覆盖请求页及其后续条目（各条目独立解压，无需从开头解起），
+            # 同样进入会话池复用，顺序翻页时后续页已由预读写入缓存
+            start = info.order.get(name, -1)
+            targets = [target for target in targets if info.order.get(target, -1) >= start]
+        yield from self._iter_from_session(key, name, targets, info)
+
+    def _iter_from_session(self, key: BookKey, name: str, targets: List[str], info: _BookInfo) -> Generator[bytes, None, None]:
+        session = self._get_session(key, name, targets, info)
+        member = session.wait_started(name, self._wait_timeout_s)
+        if member is None:
+            raise IOError('7z 条目解压失败')
+        yield from session.iter_member(member, self._wait_timeout_s)
+
+    def _get_session(self, key: BookKey, name: str, targets: List[str], info: _BookInfo) -> _DecodeSession:
+        stale: List[_DecodeSession] = []
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None and session.can_serve(name):
+                self._sessions.move_to_end(key)
+                return session
+            if session is not None:
+                # 跳页到已解压位置之前（且缓存已淘汰）：只能从固实块开头重新解压
+                stale.append(self._sessions.pop(key))
+            session = _DecodeSession(
+                key,
+                targets,
+                info.order,
+                self._cache,
+                read_ahead=self._read_ahead,
+                idle_timeout_s=self._idle_timeout_s,
+            )
+            self._sessions[key] = session
+            while len(self._sessions) > self._max_sessions:
+                _, victim = self._sessions.popitem(last=False)
+                stale.append(victim)
+            for existing_key in [k for k, s in self._sessions.items() if s.finished and k != key]:
+                stale.append(self._sessions.pop(existing_key))
+        for victim in stale:
+            victim.close()
+        return session
+
+    def _book_info(self, key: BookKey, targets: List[str]) -> _BookInfo:
+        with self._lock:
+            info = self._book_infos.get(key)
+            if info is not None:
+                self._book_infos.move_to_end(key)
+                return info
+
+        target_set = set(targets)
+        with self._pool.lease(key[0]) as archive:
+            solid = bool(getattr(archive.archiveinfo(), 'solid', False))
+            names = [n for n in archive.getnames() if n in target_set]
+        info = _BookInfo(solid=solid, order={n: i for i, n in enumerate(names)})
+
+        with self._lock:
+            self._book_infos[key] = info
+            while len(self._book_infos) > 256:
+                self._book_infos.popitem(last=False)
+        return info
+
+    @staticmethod
+    def _book_key(file_path: str) -> BookKey:
+        stat = os.stat(file_path)
+        return file_path, int(stat.st_mtime), int(stat.st_size)
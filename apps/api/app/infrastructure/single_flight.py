@@ -0,0 +1,81 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, TypeVar
+
+T = TypeVar('T')
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'followers')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    按键合并并发的相同计算（线程安全）。
+
+    - 同一键同时只执行一次：第一个调用者执行，并发到达的调用者等待并共享同一结果；
+      执行抛出的异常同样传递给所有等待者。
+    - 等待超过 timeout_s 的调用者不再等待，改为自行执行一次（避免被卡住的执行拖住所有请求）。
+    - 只合并“同时进行”的调用，不缓存结果：执行结束后同一键的新调用会重新执行，结果复用交给各级缓存。
+    """
+
+    def __init__(self, *, timeout_s: float = 30.0):
+        self._timeout_s = timeout_s
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._leaders = 0
+        self._shared = 0
+        self._timeouts = 0
+        self._errors = 0
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+                self._leaders += 1
+                leader = True
+            else:
+                call.followers += 1
+                leader = False
+
+        if not leader:
+            if not call.done.wait(self._timeout_s):
+                with self._lock:
+                    self._timeouts += 1
+                return fn()
+            with self._lock:
+                self._shared += 1
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as exc:
+            call.error = exc
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'inflight': len(self._calls),
+                'leaders': self._leaders,
+                'shared': self._shared,
+                'timeouts': self._timeouts,
+                'errors': self._errors,
+            }
@@ -0,0 +1,31 @@
+import os
+import sys
+
+from loguru import logger
+
+
+def lower_thread_priority(nice: int) -> None:
+    """
+    降低当前线程的 CPU 调度优先级（Linux 上 nice 值按线程生效），让阅读请求优先获得 CPU。
+
+    仅在 Linux 上生效：其他平台的 setpriority(PRIO_PROCESS, 0) 作用于整个进程，会连带降低 Web 线程；
+    失败时保持默认优先级。
+    """
+    if nice <= 0 or not sys.platform.startswith('linux'):
+        return
+    try:
+        current = os.getpriority(os.PRIO_PROCESS, 0)
+        os.setpriority(os.PRIO_PROCESS, 0, min(19, current + nice))
+    except OSError as exc:
+        logger.debug('降低线程优先级失败: {}', exc)
+
+
+def lower_process_priority(nice: int) -> None:
+    """降低当前进程的 CPU 调度优先级（用于封面进程池等独立子进程，所有支持 os.setpriority 的平台均生效）。"""
+    if nice <= 0 or not hasattr(os, 'setpriority'):
+        return
+    try:
+        current = os.getpriority(os.PRIO_PROCESS, 0)
+        os.setpriority(os.PRIO_PROCESS, 0, min(19, current + nice))
+    except OSError as exc:
+        logger.debug('降低进程优先级失败: {}', exc)
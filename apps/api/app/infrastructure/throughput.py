@@ -0,0 +1,55 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+
+class ThroughputEstimator:
+    """
+    按客户端维护的下行吞吐估计（线程安全，客户端数量有界）。
+
+    - 每个较大的下载样本记录 (字节数, 耗时)，以指数加权平均（EWMA）平滑，单位字节/秒。
+    - 过小的响应主要受往返延迟影响，不参与估计；超过 max_age_s 未更新的估计视为过期。
+    """
+
+    def __init__(self, *, alpha: float = 0.3, max_clients: int = 1024, min_bytes: int = 64 * 1024, max_age_s: float = 600.0):
+        self._alpha = alpha
+        self._max_clients = max(1, int(max_clients))
+        self._min_bytes = max(1, int(min_bytes))
+        self._max_age_s = max_age_s
+        self._lock = threading.Lock()
+        # client -> (字节/秒, 更新时间)；顺序即 LRU 顺序
+        self._clients: 'OrderedDict[Hashable, Tuple[float, float]]' = OrderedDict()
+        self._samples = 0
+
+    def record(self, client: Hashable, nbytes: int, elapsed_s: float) -> None:
+        if nbytes < self._min_bytes or elapsed_s <= 0:
+            return
+        sample = nbytes / elapsed_s
+        now = time.monotonic()
+        with self._lock:
+            previous = self._clients.pop(client, None)
+            if previous is None or now - previous[1] > self._max_age_s:
+                value = sample
+            else:
+                value = previous[0] + self._alpha * (sample - previous[0])
+            self._clients[client] = (value, now)
+            self._samples += 1
+            while len(self._clients) > self._max_clients:
+                self._clients.popitem(last=False)
+
+    def estimate(self, client: Hashable) -> Optional[float]:
+        """返回客户端的吞吐估计（字节/秒）；没有样本或已过期时返回 None。"""
+        with self._lock:
+            item = self._clients.get(client)
+            if item is None:
+                return None
+            if time.monotonic() - item[1] > self._max_age_s:
+                del self._clients[client]
+                return None
+            self._clients.move_to_end(client)
+            return item[0]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'clients': len(self._clients), 'samples': self._samples}
@@ -0,0 +1,80 @@
+import os
+import struct
+import tempfile
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+# 说明：
+# - 每本书的页面缩略图打包为一个文件：固定头 + 偏移表 + 依次拼接的 JPEG 数据。
+# - 偏移表给出每页缩略图在文件中的 (偏移, 长度, 宽, 高)，单张缩略图可以直接按字节区间读取（sendfile / Range），
+#   整个包也可以一次下载后由客户端按偏移切分。
+# - 头部记录源文件的 size/mtime 与缩略图边长，任一不一致即视为过期。
+
+MAGIC = b'MULMTHB1'
+# magic, 源文件大小, 源文件 mtime, 缩略图最长边, 页数
+_HEADER = struct.Struct('<8sQQHI')
+# 偏移, 长度, 宽, 高；长度为 0 表示该页生成失败
+_ENTRY = struct.Struct('<QIHH')
+
+# (data, 宽, 高)；None 表示该页生成失败
+Thumbnail = Optional[Tuple[bytes, int, int]]
+
+
+@dataclass(frozen=True)
+class ThumbnailPackIndex:
+    source_size: int
+    source_mtime: int
+    max_side: int
+    # 每页 (偏移, 长度, 宽, 高)
+    entries: Tuple[Tuple[int, int, int, int], ...]
+
+
+def write_thumbnail_pack(path: str, *, source_size: int, source_mtime: int, max_side: int, thumbnails: Sequence[Thumbnail]) -> int:
+    """写入缩略图包（先写同目录临时文件再原子替换），返回文件大小。"""
+    offset = _HEADER.size + _ENTRY.size * len(thumbnails)
+    table: List[bytes] = []
+    for thumbnail in thumbnails:
+        if thumbnail is None:
+            table.append(_ENTRY.pack(0, 0, 0, 0))
+            continue
+        data, width, height = thumbnail
+        table.append(_ENTRY.pack(offset, len(data), min(int(width), 0xFFFF), min(int(height), 0xFFFF)))
+        offset += len(data)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.thumbs-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as handle:
+            handle.write(_HEADER.pack(MAGIC, int(source_size), int(source_mtime), int(max_side), len(thumbnails)))
+            handle.write(b''.join(table))
+            for thumbnail in thumbnails:
+                if thumbnail is not None:
+                    handle.write(thumbnail[0])
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return offset
+
+
+def read_thumbnail_pack_index(path: str) -> Optional[ThumbnailPackIndex]:
+    """读取缩略图包的头部与偏移表；文件不存在或格式不符时返回 None。"""
+    try:
+        with open(path, 'rb') as handle:
+            header = handle.read(_HEADER.size)
+            if len(header) != _HEADER.size:
+                return None
+            magic, source_size, source_mtime, max_side, count = _HEADER.unpack(header)
+            if magic != MAGIC:
+                return None
+            raw_table = handle.read(_ENTRY.size * count)
+    except OSError:
+        return None
+    if len(raw_table) != _ENTRY.size * count:
+        return None
+    entries = tuple(_ENTRY.unpack_from(raw_table, index * _ENTRY.size) for index in range(count))
+    return ThumbnailPackIndex(source_size=source_size, source_mtime=source_mtime, max_side=max_side, entries=entries)
@@ -27,6 +27,39 @@ class File(db.Model):
     tags = db.relationship('Tag', secondary='file_tag_map', back_populates='files')
     bookmarks = db.relationship('Bookmark', backref='file', lazy='dynamic')
     like_item = db.relationship('Like', backref='file', uselist=False)
+    page_index = db.relationship('FilePageIndex', backref='file', uselist=False)
+    page_geometry = db.relationship('FilePageGeometry', backref='file', uselist=False)
+    thumbnail_pack = db.relationship('FileThumbnailPack', backref='file', uselist=False)
+
+class FilePageIndex(db.Model):
+    """压缩包页索引（扫描时写入），按 size/mtime 签名判断是否仍然有效。"""
+    __tablename__ = 'file_page_indexes'
+    file_id = db.Column(db.Integer, db.ForeignKey('files.id'), primary_key=True)
+    file_size = db.Column(db.Integer, nullable=False)
+    file_mtime = db.Column(db.Integer, nullable=False)
+    page_count = db.Column(db.Integer, nullable=False, default=0)
+    entries = db.Column(db.Text, nullable=False)  # JSON 数组：[{name,size,compressed_size,offset}, ...]
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class FilePageGeometry(db.Model):
+    """页面像素尺寸（后台任务读取图片头写入），按 size/mtime 签名判断是否仍然有效。"""
+    __tablename__ = 'file_page_geometries'
+    file_id = db.Column(db.Integer, db.ForeignKey('files.id'), primary_key=True)
+    file_size = db.Column(db.Integer, nullable=False)
+    file_mtime = db.Column(db.Integer, nullable=False)
+    page_count = db.Column(db.Integer, nullable=False, default=0)
+    sizes = db.Column(db.Text, nullable=False)  # JSON 数组：[[width,height] 或 null, ...]，顺序与页索引一致
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
+
+class FileThumbnailPack(db.Model):
+    """已生成的页面缩略图包（生成任务写入），按 size/mtime 签名与缩略图边长判断是否仍然有效。"""
+    __tablename__ = 'file_thumbnail_packs'
+    file_id = db.Column(db.Integer, db.ForeignKey('files.id'), primary_key=True)
+    file_size = db.Column(db.Integer, nullable=False)
+    file_mtime = db.Column(db.Integer, nullable=False)
+    max_side = db.Column(db.Integer, nullable=False)
+    page_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
 class Tag(db.Model):
     __tablename__ = 'tags'
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from dataclasses import dataclass
+from typing import List, Mapping, Optional, Sequence, Tuple
+
+from ..infrastructure.throughput import ThroughputEstimator
+from .settings_service import get_int_setting, get_str_setting
+
+
+# 说明：
+# - 自动分辨率：按客户端提示（视口宽度 × DPR）算出“看起来仍然清晰”所需的最长边，再按实测下行吞吐
+#   限制单页传输时间，最后吸附到 ui.reader.image.max_side_presets，保证渲染缓存键数量有界。
+# - 客户端提示需要页面通过 Accept-CH 申请（见 apps/web/index.html）；没有提示也没有吞吐样本时不做调整。
+# - 吞吐样本由阅读器上报（Resource Timing 的 transferSize 与响应体下载耗时）。服务端测得的“发送耗时”只是写入
+#   socket 缓冲区或反向代理（nginx 默认缓冲整个响应）的时间，部署在缓冲型代理之后会严重高估带宽，因此不采用。
+
+# 缩放后漫画页（WebP/JPEG）的平均编码体积经验值（字节/像素），用于把传输预算换算为像素
+_BYTES_PER_PIXEL = 0.25
+# 页面尺寸未知时按常见漫画单页的长宽比估算
+_DEFAULT_PAGE_SIZE = (1000, 1450)
+# 这些请求头会影响自动选择的结果，需要写入 Vary
+CLIENT_HINT_HEADERS = ('Sec-CH-Viewport-Width', 'Viewport-Width', 'Sec-CH-DPR', 'DPR', 'Downlink', 'Save-Data')
+
+_throughput = ThroughputEstimator()
+# 单次上报最多处理的样本数
+MAX_REPORTED_SAMPLES = 50
+
+
+def get_throughput_estimator() -> ThroughputEstimator:
+    return _throughput
+
+
+@dataclass(frozen=True)
+class ClientHints:
+    viewport_width: Optional[float]
+    dpr: float
+    downlink_bps: Optional[float]
+    save_data: bool
+
+
+def _parse_float(raw_value) -> Optional[float]:
+    try:
+        value = float(str(raw_value).strip())
+    except (TypeError, ValueError):
+        return None
+    if not math.isfinite(value) or value <= 0:
+        return None
+    return value
+
+
+def parse_client_hints(headers: Mapping[str, str]) -> ClientHints:
+    """解析客户端提示（同时接受 Sec-CH-* 与旧的无前缀写法）。"""
+    viewport_width = _parse_float(headers.get('Sec-CH-Viewport-Width') or headers.get('Viewport-Width'))
+    dpr = _parse_float(headers.get('Sec-CH-DPR') or headers.get('DPR')) or 1.0
+    downlink_mbps = _parse_float(headers.get('Downlink'))
+    return ClientHints(
+        viewport_width=viewport_width,
+        dpr=min(dpr, 4.0),
+        downlink_bps=downlink_mbps * 1_000_000 / 8 if downlink_mbps else None,
+        save_data=str(headers.get('Save-Data') or '').strip().lower() == 'on',
+    )
+
+
+def client_key(remote_addr: str, user_agent: str) -> str:
+    """吞吐估计的客户端键：地址 + UA 摘要（同一出口后的多台设备分开估计）。"""
+    digest = hashlib.sha1(str(user_agent or '').encode('utf-8')).hexdigest()[:12]
+    return f'{remote_addr}|{digest}'
+
+
+def record_reported_samples(client: str, samples: Sequence[object]) -> int:
+    """
+    记录阅读器上报的页图下载样本（[{bytes, ms}, ...]），返回采纳的样本数。
+
+    格式不符、非正数或非有限值的样本直接忽略；过小的响应由估计器自行丢弃。
+    """
+    accepted = 0
+    for item in list(samples)[:MAX_REPORTED_SAMPLES]:
+        if not isinstance(item, Mapping):
+            continue
+        nbytes = _parse_float(item.get('bytes'))
+        elapsed_ms = _parse_float(item.get('ms'))
+        if nbytes is None or elapsed_ms is None:
+            continue
+        _throughput.record(client, int(nbytes), elapsed_ms / 1000)
+        accepted += 1
+    return accepted
+
+
+def get_size_presets() -> List[int]:
+    try:
+        raw = json.loads(get_str_setting('ui.reader.image.max_side_presets', default='[]'))
+    except (TypeError, ValueError):
+        raw = []
+    return sorted({int(value) for value in raw if isinstance(value, int) and value > 0})
+
+
+def choose_max_side_px(
+    hints: ClientHints,
+    *,
+    page_size: Optional[Tuple[int, int]],
+    throughput_bps: Optional[float],
+    presets: List[int],
+    target_ms: int,
+) -> Optional[int]:
+    """
+    选出最小但仍清晰的预设（0 表示原图）；既没有视口提示也没有吞吐估计时返回 None。
+
+    - 清晰度：页面按宽度铺满视口时需要的最长边 = 视口宽 × DPR × 最长边/宽，取不小于它的最小预设，超过所有预设时用原图。
+    - 带宽：单页传输时间不超过 target_ms，超出时取不超过预算的最大预设（至少为最小预设）。
+    - Save-Data: on 时再降一档。
+    """
+    if not presets:
+        return None
+    bps = throughput_bps or hints.downlink_bps
+    if hints.viewport_width is None and bps is None:
+        return None
+
+    width, height = page_size or _DEFAULT_PAGE_SIZE
+    long_side = max(width, height)
+    short_side = max(1, min(width, height))
+
+    target = 0
+    if hints.viewport_width is not None:
+        need = math.ceil(hints.viewport_width * hints.dpr * long_side / max(1, width))
+        target = next((preset for preset in presets if preset >= need), 0)
+
+    if bps is not None:
+        budget_pixels = bps * max(1, target_ms) / 1000 / _BYTES_PER_PIXEL
+        cap = math.sqrt(budget_pixels * long_side / short_side)
+        if target == 0 or target > cap:
+            fitting = [preset for preset in presets if preset <= cap]
+            target = fitting[-1] if fitting else presets[0]
+
+    if hints.save_data and target:
+        lower = [preset for preset in presets if preset < target]
+        if lower:
+            target = lower[-1]
+    return target
+
+
+def resolve_auto_max_side_px(
+    headers: Mapping[str, str],
+    *,
+    client: str,
+    page_size: Optional[Tuple[int, int]],
+) -> Optional[int]:
+    """按设置与当前请求计算自动分辨率（需要应用上下文）；无法判断时返回 None。"""
+    target_ms = get_int_setting('reader.auto_size.target_ms', default=1500, min_value=100, max_value=30000)
+    return choose_max_side_px(
+        parse_client_hints(headers),
+        page_size=page_size,
+        throughput_bps=_throughput.estimate(client),
+        presets=get_size_presets(),
+        target_ms=target_ms,
+    )
+
+
+def get_auto_size_mode() -> str:
+    """off：不使用；explicit：仅 max_side_px=auto 的请求；cap：同时限制所有页图请求的分辨率上限。"""
+    mode = get_str_setting('reader.auto_size.mode', default='explicit').strip().lower()
+    return mode if mode in {'off', 'explicit', 'cap'} else 'explicit'
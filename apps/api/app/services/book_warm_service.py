@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from loguru import logger
+
+from .. import db
+from ..infrastructure.admission import AdmissionRejected
+from ..infrastructure.archive_reader import get_archive_entries, get_entry_by_index, natural_sort_key
+from ..infrastructure.thread_priority import lower_thread_priority
+from ..models.manga import File
+from .page_prefetch_service import should_warm_original, warm_page
+from .page_render_service import PageRenderParams, page_cache_key, resolve_page_render_params
+from .render_cache_service import configure_render_cache_from_settings, get_render_cache, is_render_cache_enabled
+from .settings_service import get_bool_setting, get_int_setting
+
+
+# 说明：
+# - 预测性预热：读者接近一本书末尾时，预先建立同目录下一本（按路径自然排序）的页索引并渲染前几页；
+#   服务启动后的第一个请求触发最近阅读的若干本书的预热（从续读页开始）。
+# - 预热在单个低优先级后台线程执行，渲染以后台优先级申请名额，前台请求等待时立即让路（放弃该书剩余页，不重试）。
+# - 渲染参数取最近一次页图请求的参数（前端按设置拼接查询参数）；尚无页图请求时使用设置中的默认值。
+
+# 最近预热过的书在该时间内不重复安排
+_REWARM_INTERVAL_S = 600.0
+
+
+@dataclass(frozen=True)
+class _BookWarmJob:
+    file_id: int
+    file_path: str
+    start_page: int
+    pages: int
+    params: PageRenderParams
+
+
+class BookWarmer:
+    """有界队列 + 单个低优先级后台线程的整书预热器（线程安全）。"""
+
+    def __init__(self, *, max_pending: int = 16, max_recent: int = 256):
+        self._max_pending = max(1, int(max_pending))
+        self._max_recent = max(1, int(max_recent))
+        self._cond = threading.Condition()
+        self._pending: 'OrderedDict[int, _BookWarmJob]' = OrderedDict()
+        # file_id -> 最近一次安排的时间
+        self._recent: 'OrderedDict[int, float]' = OrderedDict()
+        # 正在阅读的书 file_id -> 最近一次为它查找下一本的时间
+        self._sources: 'OrderedDict[int, float]' = OrderedDict()
+        self._thread: Optional[threading.Thread] = None
+        self._app: Any = None
+        self._nice = 10
+        self._scheduled = 0
+        self._books = 0
+        self._pages = 0
+        self._deferred = 0
+        self._failed = 0
+
+    def configure(self, *, app: Any, nice: int) -> None:
+        with self._cond:
+            self._app = app
+            self._nice = max(0, int(nice))
+
+    def schedule(self, job: _BookWarmJob) -> bool:
+        """安排一本书的预热；最近已安排过或已在队列中时返回 False。"""
+        now = time.monotonic()
+        with self._cond:
+            last = self._recent.get(job.file_id)
+            if job.file_id in self._pending or (last is not None and now - last < _REWARM_INTERVAL_S):
+                return False
+            self._recent[job.file_id] = now
+            self._recent.move_to_end(job.file_id)
+            while len(self._recent) > self._max_recent:
+                self._recent.popitem(last=False)
+            self._pending[job.file_id] = job
+            while len(self._pending) > self._max_pending:
+                self._pending.popitem(last=False)
+            self._scheduled += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._worker_loop, name='book-warm', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+            return True
+
+    def claim_source(self, file_id: int) -> bool:
+        """同一本书接近末尾时会连续上报进度：最近已为它查找过下一本时返回 False，调用方跳过查询。"""
+        now = time.monotonic()
+        with self._cond:
+            last = self._sources.get(int(file_id))
+            if last is not None and now - last < _REWARM_INTERVAL_S:
+                return False
+            self._sources[int(file_id)] = now
+            self._sources.move_to_end(int(file_id))
+            while len(self._sources) > self._max_recent:
+                self._sources.popitem(last=False)
+            return True
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'pending': len(self._pending),
+                'scheduled': self._scheduled,
+                'books': self._books,
+                'pages': self._pages,
+                'deferred': self._deferred,
+                'failed': self._failed,
+            }
+
+    def _worker_loop(self) -> None:
+        with self._cond:
+            nice = self._nice
+        lower_thread_priority(nice)
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                _, job = self._pending.popitem(last=False)
+                app = self._app
+            try:
+                if app is not None:
+                    # 应用上下文只用于读取扫描时持久化的页索引（只读）
+                    with app.app_context():
+                        self._run_job(job)
+                else:
+                    self._run_job(job)
+            except Exception as exc:
+                with self._cond:
+                    self._failed += 1
+                logger.warning('预热书籍失败: {} | 错误: {}', job.file_path, exc)
+
+    def _run_job(self, job: _BookWarmJob) -> None:
+        entries = get_archive_entries(job.file_path)
+        warmed = 0
+        deferred = False
+        if job.params.max_side_px > 0 or should_warm_original(job.file_path):
+            cache = get_render_cache()
+            for page_num in range(job.start_page, min(job.start_page + job.pages, len(entries))):
+                entry = get_entry_by_index(job.file_path, page_num)
+                if entry is None:
+                    break
+                key = page_cache_key(job.file_path, page_num, entry, job.params)
+                if cache.contains(key):
+                    continue
+                try:
+                    if warm_page(job.file_path, page_num, job.params, cache_key=key, cache=cache):
+                        warmed += 1
+                except AdmissionRejected:
+                    deferred = True
+                    break
+        with self._cond:
+            self._books += 1
+            self._pages += warmed
+            if deferred:
+                self._deferred += 1
+
+
+_warmer = BookWarmer()
+_last_params: Optional[PageRenderParams] = None
+_startup_lock = threading.Lock()
+_startup_done = False
+
+
+def get_book_warmer() -> BookWarmer:
+    return _warmer
+
+
+def note_reader_params(params: PageRenderParams) -> None:
+    """记录最近一次页图请求的渲染参数（预览图除外），预热按同一参数渲染才能命中。"""
+    global _last_params
+    if not params.preview:
+        _last_params = params
+
+
+def _escape_like(value: str) -> str:
+    return value.replace('/', '//').replace('%', '/%').replace('_', '/_')
+
+
+def find_next_book(file_record: File) -> Optional[File]:
+    """同目录下按路径自然排序的下一本（不含子目录与缺失文件）。"""
+    file_path = str(file_record.file_path or '')
+    folder = os.path.dirname(file_path)
+    if not folder:
+        return None
+    prefix = _escape_like(folder.rstrip(os.sep) + os.sep)
+    # 子目录中的书在 SQL 中排除，避免大目录树下把整棵子树读进内存；
+    # SQLite 的 LIKE 对 ASCII 不区分大小写，仍按 dirname 精确比对一次
+    siblings = [
+        record
+        for record in File.query.filter(
+            File.file_path.like(prefix + '%', escape='/'),
+            File.file_path.not_like(prefix + '%' + _escape_like(os.sep) + '%', escape='/'),
+            File.is_missing.is_(False),
+        ).all()
+        if os.path.dirname(record.file_path) == folder
+    ]
+    siblings.sort(key=lambda record: natural_sort_key(os.path.basename(record.file_path)))
+    for index, record in enumerate(siblings):
+        if record.id == file_record.id:
+            return siblings[index + 1] if index + 1 < len(siblings) else None
+    return None
+
+
+def _configure_warmer() -> Optional[int]:
+    """按设置配置预热器并返回每本预热页数；预热关闭时返回 None（需要应用上下文）。"""
+    if not get_bool_setting('reader.warm.enabled', default=True):
+        return None
+    _warmer.configure(
+        app=current_app._get_current_object(),
+        nice=get_int_setting('reader.warm.nice', default=10, min_value=0, max_value=19),
+    )
+    if not is_render_cache_enabled():
+        # 渲染缓存关闭时只预建页索引
+        return 0
+    configure_render_cache_from_settings()
+    return get_int_setting('reader.warm.pages', default=4, min_value=0, max_value=16)
+
+
+def _make_job(file_record: File, pages: int, *, start_page: int = 0) -> _BookWarmJob:
+    params = _last_params if _last_params is not None else resolve_page_render_params({})
+    return _BookWarmJob(
+        file_id=int(file_record.id),
+        file_path=str(file_record.file_path),
+        start_page=max(0, int(start_page)),
+        pages=pages,
+        params=params,
+    )
+
+
+def schedule_next_book_warm(file_record: File) -> Optional[File]:
+    """
+    阅读进度接近末尾（剩余不超过 reader.warm.trigger_pages 页）时安排预热下一本，返回被安排的书。
+
+    需要应用上下文；同一本书在重新预热间隔内只做一次只读查询，预热本身在后台线程执行。
+    """
+    total_pages = int(file_record.total_pages or 0)
+    if total_pages <= 0:
+        return None
+    trigger_pages = get_int_setting('reader.warm.trigger_pages', default=3, min_value=0, max_value=100)
+    if int(file_record.last_read_page or 0) < total_pages - 1 - trigger_pages:
+        return None
+    pages = _configure_warmer()
+    if pages is None:
+        return None
+    if not _warmer.claim_source(int(file_record.id)):
+        return None
+    next_book = find_next_book(file_record)
+    if next_book is None:
+        return None
+    if _warmer.schedule(_make_job(next_book, pages)):
+        logger.debug('安排预热下一本: {} -> {}', os.path.basename(file_record.file_path), os.path.basename(next_book.file_path))
+    return next_book
+
+
+def schedule_startup_warm() -> int:
+    """进程内只执行一次：从续读页开始安排最近阅读的 reader.warm.startup_books 本书的预热，返回安排的本数（需要应用上下文）。"""
+    global _startup_done
+    if _startup_done:
+        return 0
+    with _startup_lock:
+        if _startup_done:
+            return 0
+        _startup_done = True
+
+    pages = _configure_warmer()
+    if pages is None:
+        return 0
+    limit = get_int_setting('reader.warm.startup_books', default=5, min_value=0, max_value=50)
+    if limit <= 0:
+        return 0
+    books: List[File] = (
+        db.session.query(File)
+        .filter(File.is_missing.is_(False), File.last_read_date.isnot(None))
+        .order_by(File.last_read_date.desc())
+        .limit(limit)
+        .all()
+    )
+    # 从续读页开始预热：打开书时首先请求的就是这一页
+    scheduled = sum(1 for record in books if _warmer.schedule(_make_job(record, pages, start_page=record.last_read_page or 0)))
+    if scheduled:
+        logger.info('启动预热：已安排最近阅读的 {} 本书', scheduled)
+    return scheduled
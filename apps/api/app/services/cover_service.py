@@ -1,32 +1,69 @@
+import io
 import os
-import tempfile
-from dataclasses import dataclass
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from PIL import Image
 from loguru import logger
 
 from ..infrastructure.archive_reader import ArchiveEntry, get_archive_entries, read_entry_stream
+from ..infrastructure.image_render import decode_scaled, displayed_size, fit_within, is_effectively_gray
+from ..infrastructure.single_flight import SingleFlight
+from .cover_store_service import CoverLocation, CoverStore
 
 
 DEFAULT_COVER_FILENAMES = ['cover', '000', '0000', '封面']
 
+# 同一封面的并发生成（扫描线程池中的重复任务、手动重建与扫描撞车）只执行一次
+_cover_flights = SingleFlight(timeout_s=120.0)
 
-@dataclass(frozen=True)
-class CoverPathConfig:
-    """封面缓存路径配置。"""
+# 单个封面最多编码次数：起始质量 1 次 + 二分查找
+_MAX_COVER_ENCODES = 5
 
-    base_dir: str
-    shard_count: int
 
+def select_cover_width(requested: int, widths: List[int]) -> Optional[int]:
+    """返回不小于 requested 的最小缩略宽度（widths 升序）；都不够宽时返回 None，表示使用主封面。"""
+    return next((width for width in widths if width >= requested), None)
 
-def get_cover_path(config: CoverPathConfig, file_id: int) -> str:
-    """根据文件 ID 计算封面路径（支持分片目录）。"""
-    shard_count = max(1, int(config.shard_count))
-    shard_index = int(file_id) % shard_count
-    shard_width = max(2, len(hex(shard_count - 1)) - 2)
-    shard = f'{shard_index:0{shard_width}x}'
-    return os.path.join(config.base_dir, shard, f'{int(file_id)}.webp')
+
+def ensure_cover_variant(store: CoverStore, file_id: int, width: int, *, quality: int, grayscale: bool = True) -> Optional[CoverLocation]:
+    """
+    返回宽度为 width 的封面缩略图位置，缺失或早于主封面（主封面已重建）时由主封面生成，不读取压缩包。
+
+    - 主封面不宽于 width 时直接返回主封面位置；主封面不存在或生成失败时返回 None
+    - 同一缩略图的并发请求只生成一次
+    """
+    cover = store.locate(file_id)
+    if cover is None:
+        return None
+    variant = store.locate(file_id, width)
+    if variant is not None and variant.version >= cover.version:
+        return variant
+    return _cover_flights.do(
+        (store, int(file_id), int(width), cover.version),
+        lambda: _generate_cover_variant(store, file_id, width=width, quality=quality, grayscale=grayscale),
+    )
+
+
+def _generate_cover_variant(store: CoverStore, file_id: int, *, width: int, quality: int, grayscale: bool) -> Optional[CoverLocation]:
+    try:
+        source = store.read(file_id)
+        if source is None:
+            return None
+        with Image.open(io.BytesIO(source)) as img:
+            if img.width <= width:
+                return store.locate(file_id)
+            img = decode_scaled(img, fit_within(img.size, width, img.height), resample=Image.Resampling.LANCZOS)
+            if grayscale and is_effectively_gray(img):
+                if img.mode != 'L':
+                    img = img.convert('L')
+            elif img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGB')
+            data = _encode_webp(img, quality)
+        store.write(file_id, data, width)
+        return store.locate(file_id, width)
+    except Exception as exc:
+        logger.warning('生成封面缩略图失败: {} (宽 {}) | 错误: {}', file_id, width, exc)
+        return None
 
 
 def _select_cover_entry(entries: List[ArchiveEntry], preferred_names: List[str]) -> Optional[ArchiveEntry]:
@@ -45,7 +82,7 @@ def generate_cover(
     *,
     file_id: int,
     file_path: str,
-    config: CoverPathConfig,
+    store: CoverStore,
     max_width: int,
     target_kb: int,
     quality_start: int,
@@ -53,17 +90,98 @@ def generate_cover(
     quality_step: int,
     preferred_names: Optional[List[str]] = None,
     force: bool = False,
+    grayscale: bool = True,
 ) -> bool:
     """
     生成并落盘封面（WebP）：
     - 仅解压 1 个候选页面
-    - 原子写入，避免并发/中断导致封面损坏
+    - grayscale：实际为灰度的封面按单通道编码
+    - 写入封面存储（文件存储原子替换，封面包追加写入），避免并发/中断导致封面损坏
+    - 同一封面的并发调用合并为一次生成
+    """
+    return _cover_flights.do(
+        (store, int(file_id), bool(force)),
+        lambda: _generate_cover_file(
+            store,
+            int(file_id),
+            file_path=file_path,
+            max_width=max_width,
+            target_kb=target_kb,
+            quality_start=quality_start,
+            quality_min=quality_min,
+            quality_step=quality_step,
+            preferred_names=preferred_names,
+            force=force,
+            grayscale=grayscale,
+        ),
+    )
+
+
+def _encode_webp(img: Image.Image, quality: int) -> bytes:
+    out = io.BytesIO()
+    img.save(out, 'webp', quality=int(quality), optimize=True)
+    return out.getvalue()
+
+
+def encode_webp_within_budget(
+    img: Image.Image,
+    *,
+    target_bytes: int,
+    quality_start: int,
+    quality_min: int,
+    quality_step: int,
+) -> Tuple[bytes, int]:
     """
-    cover_path = get_cover_path(config, file_id)
-    cover_dir = os.path.dirname(cover_path)
-    os.makedirs(cover_dir, exist_ok=True)
+    在内存中编码 WebP，返回 (数据, 质量)：取不超过 target_bytes 的最高质量。
 
-    if not force and os.path.exists(cover_path):
+    - 先按起始质量编码一次，多数封面到此为止；
+    - 超出时在 [quality_min, quality_start) 内二分查找，步长不小于 quality_step，总编码次数不超过 _MAX_COVER_ENCODES；
+    - 最低质量仍超出时使用最低质量的结果。
+    """
+    high = int(quality_start)
+    low = min(int(quality_min), high)
+    step = max(1, int(quality_step))
+
+    data = _encode_webp(img, high)
+    if len(data) <= target_bytes or high <= low:
+        return data, high
+
+    best: Optional[Tuple[bytes, int]] = None
+    smallest = (data, high)
+    # 不变量：high 质量已知超出预算；best 为已知满足预算的最高质量
+    encodes = 1
+    while high - low > step and encodes < _MAX_COVER_ENCODES - 1:
+        quality = (low + high) // 2
+        candidate = _encode_webp(img, quality)
+        encodes += 1
+        if len(candidate) <= target_bytes:
+            best = (candidate, quality)
+            low = quality
+        else:
+            smallest = (candidate, quality)
+            high = quality
+    if best is not None:
+        return best
+    if smallest[1] != low:
+        smallest = (_encode_webp(img, low), low)
+    return smallest
+
+
+def _generate_cover_file(
+    store: CoverStore,
+    file_id: int,
+    *,
+    file_path: str,
+    max_width: int,
+    target_kb: int,
+    quality_start: int,
+    quality_min: int,
+    quality_step: int,
+    preferred_names: Optional[List[str]],
+    force: bool,
+    grayscale: bool,
+) -> bool:
+    if not force and store.exists(file_id):
         return True
 
     preferred_names = preferred_names or DEFAULT_COVER_FILENAMES
@@ -79,40 +197,26 @@ def generate_cover(
             return False
 
         with Image.open(stream) as img:
+            # 按封面宽度缩小解码：大页面不必先解出全尺寸像素
             max_width = max(64, int(max_width))
-            if img.width > max_width:
-                ratio = max_width / img.width
-                new_height = max(1, int(img.height * ratio))
-                img = img.resize((max_width, new_height), Image.Resampling.LANCZOS)
-
-            # 统一转换，避免部分图片模式导致保存异常
-            if img.mode not in ('RGB', 'RGBA'):
+            size = displayed_size(img)
+            img = decode_scaled(img, fit_within(size, max_width, size[1]), resample=Image.Resampling.LANCZOS)
+
+            # 统一转换，避免部分图片模式导致保存异常；灰度封面转为单通道，去掉色度噪声
+            if grayscale and is_effectively_gray(img):
+                if img.mode != 'L':
+                    img = img.convert('L')
+            elif img.mode not in ('RGB', 'RGBA'):
                 img = img.convert('RGB')
 
-            quality = int(quality_start)
-            quality_min = int(quality_min)
-            quality_step = max(1, int(quality_step))
-            target_kb = max(1, int(target_kb))
-
-            tmp_fd, tmp_path = tempfile.mkstemp(prefix='cover_', suffix='.webp', dir=cover_dir)
-            os.close(tmp_fd)
-
-            try:
-                while True:
-                    img.save(tmp_path, 'webp', quality=quality, optimize=True)
-                    file_size_kb = os.path.getsize(tmp_path) / 1024
-                    if file_size_kb <= target_kb or quality <= quality_min:
-                        break
-                    quality = max(quality_min, quality - quality_step)
-
-                os.replace(tmp_path, cover_path)
-            finally:
-                try:
-                    if os.path.exists(tmp_path):
-                        os.remove(tmp_path)
-                except OSError:
-                    pass
-
+            data, _ = encode_webp_within_budget(
+                img,
+                target_bytes=max(1, int(target_kb)) * 1024,
+                quality_start=quality_start,
+                quality_min=quality_min,
+                quality_step=quality_step,
+            )
+        store.write(file_id, data)
         return True
 
     except Exception as exc:
@@ -0,0 +1,198 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from flask import current_app
+
+from ..infrastructure.cover_pack import get_cover_pack
+from .settings_service import get_cover_cache_shard_count, get_int_setting, get_str_setting
+
+
+# 说明：
+# - 封面存储接口：主封面 width=0，缩略图以宽度区分；扫描、封面接口与缩略图生成只通过接口读写。
+# - files：每个封面一个文件（<shard>/<file_id>.webp，缩略图为 <file_id>.w<宽度>.webp），可直接 send_file。
+# - pack：追加写入的封面包 + SQLite 偏移索引（见 infrastructure/cover_pack），封面按字节区间输出；
+#   适合几十万本书的书库（inode、备份与扫描时的存在性检查都大幅减少）。
+# - 存储对象只包含路径等配置，可 pickle：扫描进程池把它传给工作进程，各进程自行打开索引。
+# - 切换后端不会迁移已有封面：开启 scan.cover.regenerate_missing 重新扫描即可在新后端补全。
+
+
+@dataclass(frozen=True)
+class CoverPathConfig:
+    """封面缓存路径配置。"""
+
+    base_dir: str
+    shard_count: int
+
+
+@dataclass(frozen=True)
+class CoverLocation:
+    path: str
+    offset: int
+    length: int
+    # 封面版本（纳秒）：封面重写后变大，缩略图早于主封面即视为过期
+    version: int
+    # True 表示整个文件就是封面（可直接 send_file），否则需按字节区间输出
+    whole_file: bool
+
+
+def get_cover_path(config: CoverPathConfig, file_id: int, width: int = 0) -> str:
+    """根据文件 ID 计算封面路径（支持分片目录）；缩略图与主封面位于同一分片目录，文件名带宽度。"""
+    shard_count = max(1, int(config.shard_count))
+    shard_index = int(file_id) % shard_count
+    shard_width = max(2, len(hex(shard_count - 1)) - 2)
+    shard = f'{shard_index:0{shard_width}x}'
+    suffix = f'.w{int(width)}' if width else ''
+    return os.path.join(config.base_dir, shard, f'{int(file_id)}{suffix}.webp')
+
+
+def write_bytes_atomic(path: str, data: bytes) -> None:
+    """先写同目录临时文件再原子替换，避免并发/中断导致文件损坏。"""
+    directory = os.path.dirname(path)
+    tmp_fd, tmp_path = tempfile.mkstemp(prefix='cover_', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(tmp_fd, 'wb') as handle:
+            handle.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        try:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+class CoverStore(ABC):
+    """封面存储接口（实现需线程安全且可 pickle）。"""
+
+    backend = ''
+
+    @abstractmethod
+    def locate(self, file_id: int, width: int = 0) -> Optional[CoverLocation]:
+        ...
+
+    @abstractmethod
+    def read(self, file_id: int, width: int = 0) -> Optional[bytes]:
+        ...
+
+    @abstractmethod
+    def write(self, file_id: int, data: bytes, width: int = 0) -> None:
+        ...
+
+    @abstractmethod
+    def existing(self, file_ids: Iterable[int], width: int = 0) -> Set[int]:
+        """返回 file_ids 中已有封面的 ID。"""
+
+    @abstractmethod
+    def delete(self, file_ids: Iterable[int]) -> int:
+        """删除 file_ids 的主封面与全部缩略图，返回删除的封面数。"""
+
+    def exists(self, file_id: int, width: int = 0) -> bool:
+        return self.locate(file_id, width) is not None
+
+
+@dataclass(frozen=True)
+class FileCoverStore(CoverStore):
+    """每个封面一个文件（分片目录）。"""
+
+    config: CoverPathConfig
+    backend = 'files'
+
+    def locate(self, file_id: int, width: int = 0) -> Optional[CoverLocation]:
+        path = get_cover_path(self.config, file_id, width)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return CoverLocation(path=path, offset=0, length=int(stat.st_size), version=int(stat.st_mtime_ns), whole_file=True)
+
+    def read(self, file_id: int, width: int = 0) -> Optional[bytes]:
+        try:
+            with open(get_cover_path(self.config, file_id, width), 'rb') as handle:
+                return handle.read()
+        except OSError:
+            return None
+
+    def write(self, file_id: int, data: bytes, width: int = 0) -> None:
+        path = get_cover_path(self.config, file_id, width)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_bytes_atomic(path, data)
+
+    def existing(self, file_ids: Iterable[int], width: int = 0) -> Set[int]:
+        return {int(file_id) for file_id in file_ids if os.path.exists(get_cover_path(self.config, file_id, width))}
+
+    def delete(self, file_ids: Iterable[int]) -> int:
+        # 缩略图宽度可能随设置变化，按分片目录列出一次再匹配文件名
+        by_shard: Dict[str, List[int]] = defaultdict(list)
+        for file_id in file_ids:
+            by_shard[os.path.dirname(get_cover_path(self.config, file_id))].append(int(file_id))
+        deleted = 0
+        for directory, ids in by_shard.items():
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            stems = {str(file_id) for file_id in ids}
+            for name in names:
+                if not name.endswith('.webp') or name[: -len('.webp')].split('.', 1)[0] not in stems:
+                    continue
+                try:
+                    os.remove(os.path.join(directory, name))
+                    deleted += 1
+                except FileNotFoundError:
+                    pass
+        return deleted
+
+
+@dataclass(frozen=True)
+class PackCoverStore(CoverStore):
+    """封面包 + 偏移索引。"""
+
+    base_dir: str
+    max_pack_bytes: int
+    backend = 'pack'
+
+    def _pack(self):
+        return get_cover_pack(self.base_dir, max_pack_bytes=self.max_pack_bytes)
+
+    def locate(self, file_id: int, width: int = 0) -> Optional[CoverLocation]:
+        packed = self._pack().locate(file_id, width)
+        if packed is None:
+            return None
+        return CoverLocation(path=packed.path, offset=packed.offset, length=packed.length, version=packed.version, whole_file=False)
+
+    def read(self, file_id: int, width: int = 0) -> Optional[bytes]:
+        return self._pack().read(file_id, width)
+
+    def write(self, file_id: int, data: bytes, width: int = 0) -> None:
+        self._pack().put(file_id, width, data)
+
+    def existing(self, file_ids: Iterable[int], width: int = 0) -> Set[int]:
+        return self._pack().existing(file_ids, width)
+
+    def delete(self, file_ids: Iterable[int]) -> int:
+        return self._pack().delete(file_ids)
+
+    def compact(self, *, min_dead_ratio: float) -> Dict[str, int]:
+        return self._pack().compact(min_dead_ratio=min_dead_ratio)
+
+    def stats(self) -> Dict[str, int]:
+        return self._pack().stats()
+
+
+def get_cover_store_backend() -> str:
+    backend = get_str_setting('cover.store.backend', default='files').strip().lower()
+    return backend if backend in {'files', 'pack'} else 'files'
+
+
+def get_cover_store() -> CoverStore:
+    """按 cover.store.backend 返回封面存储（需要应用上下文）。"""
+    if get_cover_store_backend() == 'pack':
+        max_pack_mb = get_int_setting('cover.store.pack_max_mb', default=256, min_value=16, max_value=4096)
+        return PackCoverStore(base_dir=current_app.config['COVER_PACK_PATH'], max_pack_bytes=max_pack_mb * 1024 * 1024)
+    return FileCoverStore(
+        config=CoverPathConfig(base_dir=current_app.config['COVER_CACHE_PATH'], shard_count=get_cover_cache_shard_count()),
+    )
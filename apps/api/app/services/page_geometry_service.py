@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import io
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence, Tuple
+
+from PIL import Image
+from loguru import logger
+
+from .. import db
+from ..infrastructure.archive_reader import ArchiveEntry, get_archive_entries, iter_entry_heads, read_entry_stream
+from ..infrastructure.image_render import displayed_size
+from ..models.manga import File, FilePageGeometry
+from .page_render_service import record_page_tones
+
+
+# 说明：
+# - 页面尺寸只读取图片头（Pillow 惰性打开），不做完整解码；Zip/RAR 每页只解压开头若干 KB。
+# - 尺寸为浏览器实际显示的方向：EXIF 方向为 5–8（旋转 90°）时交换宽高。
+# - 结果按 (file_id, file_size, file_mtime) 判定有效性，文件变更后需由后台任务重新生成。
+# - 页面缩略图任务整页缩小解码时顺带得到灰度判定，写入同一行（sizes 数组元素的第三项）；
+#   阅读进程按书读取一次，作为渲染的 gray_hint，重启后也不必重新检测。
+
+PageSize = Optional[Tuple[int, int]]
+# 灰度判定：True/False，None 表示尚未判定
+PageTone = Optional[bool]
+
+# 已装入进程内灰度记录的书：(file_id, size, mtime) -> 上次查询时间；未查到判定时隔一段时间再查
+_TONE_RECHECK_S = 300.0
+_MAX_SEEDED_BOOKS = 1024
+_seeded_tones: 'OrderedDict[Tuple[int, int, int], Optional[float]]' = OrderedDict()
+_seeded_tones_lock = threading.Lock()
+
+
+def _parse_image_size(data: bytes) -> PageSize:
+    with Image.open(io.BytesIO(data)) as img:
+        width, height = displayed_size(img)
+    if width <= 0 or height <= 0:
+        return None
+    return int(width), int(height)
+
+
+def probe_page_sizes(file_path: str) -> List[PageSize]:
+    """
+    读取整本所有页面的像素尺寸（不依赖应用上下文，可在线程池中执行）。
+
+    图片头不在开头字节内（例如超大 EXIF/ICC 段）时，单独整页读取一次再解析；仍失败的页记为 None。
+    """
+    entries = get_archive_entries(file_path)
+    sizes: List[PageSize] = []
+    for entry, head in iter_entry_heads(file_path, entries):
+        size: PageSize = None
+        if head:
+            try:
+                size = _parse_image_size(head)
+            except Exception:
+                size = None
+        if size is None:
+            stream = read_entry_stream(file_path, entry)
+            if stream is not None:
+                try:
+                    size = _parse_image_size(stream.getvalue())
+                except Exception as exc:
+                    logger.warning('读取页面尺寸失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
+        sizes.append(size)
+    return sizes
+
+
+def probe_entry_size(file_path: str, entry: ArchiveEntry) -> PageSize:
+    """读取单页的像素尺寸（优先只读图片头，失败时整页读取一次）。"""
+    for _, head in iter_entry_heads(file_path, [entry]):
+        if head:
+            try:
+                size = _parse_image_size(head)
+            except Exception:
+                size = None
+            if size is not None:
+                return size
+    stream = read_entry_stream(file_path, entry)
+    if stream is None:
+        return None
+    try:
+        return _parse_image_size(stream.getvalue())
+    except Exception as exc:
+        logger.warning('读取页面尺寸失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
+        return None
+
+
+def serialize_sizes(sizes: Sequence[PageSize], tones: Optional[Sequence[PageTone]] = None) -> str:
+    """序列化为 [[width,height] 或 [width,height,gray] 或 null, ...]，gray 为 0/1，未判定时省略。"""
+    items = []
+    for index, size in enumerate(sizes):
+        if not size:
+            items.append(None)
+            continue
+        item = [int(size[0]), int(size[1])]
+        tone = tones[index] if tones is not None and index < len(tones) else None
+        if tone is not None:
+            item.append(1 if tone else 0)
+        items.append(item)
+    return json.dumps(items, separators=(',', ':'))
+
+
+def _load_sizes_payload(raw: Optional[str]) -> Optional[list]:
+    if not raw:
+        return None
+    try:
+        payload = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    return payload if isinstance(payload, list) else None
+
+
+def deserialize_sizes(raw: Optional[str]) -> Optional[List[PageSize]]:
+    payload = _load_sizes_payload(raw)
+    if payload is None:
+        return None
+    sizes: List[PageSize] = []
+    for item in payload:
+        if isinstance(item, list) and len(item) in (2, 3):
+            sizes.append((int(item[0]), int(item[1])))
+        else:
+            sizes.append(None)
+    return sizes
+
+
+def deserialize_tones(raw: Optional[str]) -> Optional[List[PageTone]]:
+    payload = _load_sizes_payload(raw)
+    if payload is None:
+        return None
+    return [bool(item[2]) if isinstance(item, list) and len(item) == 3 else None for item in payload]
+
+
+def save_page_geometry(
+    file_id: int,
+    *,
+    file_size: int,
+    file_mtime: int,
+    sizes: Sequence[PageSize],
+    tones: Optional[Sequence[PageTone]] = None,
+) -> None:
+    """写入/覆盖页面尺寸与灰度判定（不提交事务，由调用方统一 commit）。"""
+    record = db.session.get(FilePageGeometry, int(file_id))
+    if record is None:
+        record = FilePageGeometry(file_id=int(file_id))
+        db.session.add(record)
+    record.file_size = int(file_size)
+    record.file_mtime = int(file_mtime)
+    record.page_count = len(sizes)
+    record.sizes = serialize_sizes(sizes, tones)
+
+
+def save_page_tones(file_id: int, *, file_size: int, file_mtime: int, sizes: Sequence[PageSize], tones: Sequence[PageTone]) -> None:
+    """
+    把缩略图任务得到的灰度判定写入页面尺寸行（不提交事务）。
+
+    已有同签名、同页数的行时保留其中的尺寸（只补缺失页）；否则连同缩略图任务读到的尺寸一起写入。
+    """
+    record = db.session.get(FilePageGeometry, int(file_id))
+    merged = list(sizes)
+    if record is not None and int(record.file_size) == int(file_size) and int(record.file_mtime) == int(file_mtime):
+        existing = deserialize_sizes(record.sizes)
+        if existing is not None and len(existing) == len(sizes):
+            merged = [old or new for old, new in zip(existing, sizes)]
+    save_page_geometry(file_id, file_size=file_size, file_mtime=file_mtime, sizes=merged, tones=tones)
+
+
+def seed_page_tones(file_record: File) -> None:
+    """
+    把持久化的灰度判定装入渲染用的进程内记录（需要应用上下文）。
+
+    同一本书每个进程只读一次数据库；尚无判定（缩略图任务未运行）时每隔 _TONE_RECHECK_S 再查一次。
+    """
+    key = (int(file_record.id), int(file_record.file_size or 0), int(file_record.file_mtime or 0))
+    now = time.monotonic()
+    with _seeded_tones_lock:
+        if key in _seeded_tones:
+            checked_at = _seeded_tones[key]
+            _seeded_tones.move_to_end(key)
+            if checked_at is None or now - checked_at < _TONE_RECHECK_S:
+                return
+        _seeded_tones[key] = now
+        while len(_seeded_tones) > _MAX_SEEDED_BOOKS:
+            _seeded_tones.popitem(last=False)
+
+    record = db.session.get(FilePageGeometry, key[0])
+    if record is None or int(record.file_size) != key[1] or int(record.file_mtime) != key[2]:
+        return
+    tones = deserialize_tones(record.sizes)
+    if not tones or all(tone is None for tone in tones):
+        return
+    try:
+        entries = get_archive_entries(file_record.file_path)
+    except Exception:
+        return
+    if len(entries) != len(tones):
+        return
+    record_page_tones(file_record.file_path, entries, tones)
+    with _seeded_tones_lock:
+        if key in _seeded_tones:
+            _seeded_tones[key] = None
+
+
+def load_page_geometry(file_record: File) -> Optional[List[PageSize]]:
+    """读取签名与文件记录一致的页面尺寸；缺失或已过期返回 None。"""
+    record = db.session.get(FilePageGeometry, int(file_record.id))
+    if record is None:
+        return None
+    if int(record.file_size) != int(file_record.file_size or 0) or int(record.file_mtime) != int(file_record.file_mtime or 0):
+        return None
+    return deserialize_sizes(record.sizes)
+
+
+def find_files_without_geometry(library_path_id: Optional[int] = None) -> List[File]:
+    """返回缺少有效页面尺寸的文件（不含缺失文件）。"""
+    query = (
+        db.session.query(File)
+        .outerjoin(FilePageGeometry, FilePageGeometry.file_id == File.id)
+        .filter(File.is_missing.is_(False))
+        .filter(
+            db.or_(
+                FilePageGeometry.file_id.is_(None),
+                FilePageGeometry.file_size != File.file_size,
+                FilePageGeometry.file_mtime != File.file_mtime,
+            )
+        )
+    )
+    if library_path_id is not None:
+        query = query.filter(File.library_path_id == int(library_path_id))
+    return query.order_by(File.id.asc()).all()
+
+
+def delete_page_geometries(file_ids: Sequence[int]) -> int:
+    """删除指定文件的页面尺寸（不提交事务）。"""
+    if not file_ids:
+        return 0
+    return FilePageGeometry.query.filter(FilePageGeometry.file_id.in_(list(file_ids))).delete(synchronize_session=False)
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import json
+from typing import List, Optional, Sequence
+
+from flask import has_app_context
+
+from .. import db
+from ..infrastructure.archive_reader import ArchiveEntry, set_persisted_index_loader
+from ..models.manga import File, FilePageIndex
+
+
+# 说明：
+# - 页索引在扫描阶段写入数据库，阅读时直接读表，避免进程重启/多 Worker 场景下重复读取压缩包目录。
+# - 索引以 (file_id, file_size, file_mtime) 判定有效性，文件变更后自动失效并回退为读取目录。
+
+
+def serialize_entries(entries: Sequence[ArchiveEntry]) -> str:
+    """将页面条目序列化为紧凑 JSON。"""
+    payload = []
+    for entry in entries:
+        item = {'name': entry.name, 'size': entry.size}
+        if entry.compressed_size is not None:
+            item['compressed_size'] = entry.compressed_size
+        if entry.offset is not None:
+            item['offset'] = entry.offset
+        if entry.data_offset is not None:
+            item['data_offset'] = entry.data_offset
+        payload.append(item)
+    return json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+
+
+def deserialize_entries(raw: Optional[str]) -> Optional[List[ArchiveEntry]]:
+    """解析 JSON 页索引；格式异常时返回 None（调用方回退为读取目录）。"""
+    if not raw:
+        return None
+    try:
+        payload = json.loads(raw)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(payload, list):
+        return None
+
+    entries: List[ArchiveEntry] = []
+    for item in payload:
+        if not isinstance(item, dict) or not item.get('name'):
+            return None
+        entries.append(
+            ArchiveEntry(
+                name=str(item['name']),
+                size=item.get('size'),
+                compressed_size=item.get('compressed_size'),
+                offset=item.get('offset'),
+                data_offset=item.get('data_offset'),
+            )
+        )
+    return entries
+
+
+def save_page_index(file_id: int, *, file_size: int, file_mtime: int, entries: Sequence[ArchiveEntry]) -> None:
+    """写入/覆盖页索引（不提交事务，由调用方统一 commit）。"""
+    record = db.session.get(FilePageIndex, int(file_id))
+    if record is None:
+        record = FilePageIndex(file_id=int(file_id))
+        db.session.add(record)
+    record.file_size = int(file_size)
+    record.file_mtime = int(file_mtime)
+    record.page_count = len(entries)
+    record.entries = serialize_entries(entries)
+
+
+def load_page_index_by_path(file_path: str, file_mtime: int, file_size: int) -> Optional[List[ArchiveEntry]]:
+    """按文件路径读取签名一致的页索引；未命中返回 None。"""
+    raw = (
+        db.session.query(FilePageIndex.entries)
+        .join(File, File.id == FilePageIndex.file_id)
+        .filter(
+            File.file_path == file_path,
+            FilePageIndex.file_size == int(file_size),
+            FilePageIndex.file_mtime == int(file_mtime),
+        )
+        .scalar()
+    )
+    return deserialize_entries(raw)
+
+
+def delete_page_indexes(file_ids: Sequence[int]) -> int:
+    """删除指定文件的页索引（不提交事务）。"""
+    if not file_ids:
+        return 0
+    return FilePageIndex.query.filter(FilePageIndex.file_id.in_(list(file_ids))).delete(synchronize_session=False)
+
+
+def _persisted_index_loader(file_path: str, file_mtime: int, file_size: int) -> Optional[List[ArchiveEntry]]:
+    # 线程池中的纯 I/O 调用没有应用上下文，直接视为未命中。
+    # 查询异常由归档读取层兜底（记录日志并回退为读取目录）。
+    if not has_app_context():
+        return None
+    return load_page_index_by_path(file_path, file_mtime, file_size)
+
+
+def install_page_index_loader() -> None:
+    """让归档读取层优先使用数据库中的页索引。"""
+    set_persisted_index_loader(_persisted_index_loader)
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from loguru import logger
+
+from ..infrastructure.archive_reader import get_entry_by_index, guess_mimetype, read_entry_stream
+from ..infrastructure.admission import BACKGROUND, AdmissionRejected
+from .page_render_service import PageRenderParams, get_render_admission, page_cache_key, render_page_cached
+from .render_cache_service import RenderCache, RenderedImage, get_render_cache
+from .settings_service import get_int_setting
+
+
+# 说明：
+# - 页图请求到达时，后台预热同一渲染参数下的后续若干页（解压 + 渲染 + 写入渲染缓存），
+#   前端的预加载请求随后直接命中缓存。
+# - 读者跳页/换书时，窗口之外尚未执行的预热任务会被丢弃；执行中的任务不打断（单页成本有限）。
+# - 原图模式下只预热 RAR/7z（解压代价高），结果仅写入内存层；Zip 原图由零拷贝/流式输出直接处理。
+
+_ORIGINAL_WARM_EXTENSIONS = ('.rar', '.cbr', '.7z', '.cb7')
+
+
+def should_warm_original(file_path: str) -> bool:
+    """原图模式下是否值得预热（仅解压代价高的格式）。"""
+    return os.path.splitext(file_path)[1].lower() in _ORIGINAL_WARM_EXTENSIONS
+
+
+@dataclass(frozen=True)
+class _PrefetchJob:
+    file_id: int
+    file_path: str
+    page_num: int
+    params: PageRenderParams
+    cache_key: str
+    generation: int
+
+
+@dataclass
+class _ReaderCursor:
+    page_num: int
+    ahead: int
+    generation: int
+
+
+class PagePrefetcher:
+    """有界工作线程池上的页面预热器（线程安全，工作线程不需要应用上下文）。"""
+
+    def __init__(self, *, workers: int = 2, max_pending: int = 64, max_cursors: int = 64):
+        self._workers = max(1, int(workers))
+        self._max_pending = max(1, int(max_pending))
+        self._max_cursors = max(1, int(max_cursors))
+        self._cond = threading.Condition()
+        # cache_key -> job；顺序即执行顺序
+        self._pending: 'OrderedDict[str, _PrefetchJob]' = OrderedDict()
+        self._running: set = set()
+        # file_id -> 最近一次请求的阅读位置；按最近使用排序，超出上限时淘汰最旧的书
+        self._cursors: 'OrderedDict[int, _ReaderCursor]' = OrderedDict()
+        self._threads: List[threading.Thread] = []
+        self._scheduled = 0
+        self._completed = 0
+        self._cancelled = 0
+        self._failed = 0
+        # 渲染并发已满时让路给前台请求而放弃的任务（下次翻页会重新安排）
+        self._deferred = 0
+
+    def configure(self, *, workers: int) -> None:
+        with self._cond:
+            self._workers = max(1, int(workers))
+
+    def schedule(
+        self,
+        *,
+        file_id: int,
+        file_path: str,
+        page_num: int,
+        total_pages: int,
+        params: PageRenderParams,
+        ahead: int,
+        cache: RenderCache,
+    ) -> int:
+        """登记阅读位置并安排预热 page_num+1..page_num+ahead，返回新增任务数。"""
+        if ahead <= 0:
+            return 0
+        if params.max_side_px <= 0 and not should_warm_original(file_path):
+            return 0
+
+        with self._cond:
+            cursor = self._cursors.pop(file_id, None)
+            generation = cursor.generation + 1 if cursor is not None else 1
+            self._cursors[file_id] = _ReaderCursor(page_num=page_num, ahead=ahead, generation=generation)
+            while len(self._cursors) > self._max_cursors:
+                self._cursors.popitem(last=False)
+            self._drop_stale_locked()
+
+        candidates: List[_PrefetchJob] = []
+        last_page = min(total_pages - 1, page_num + ahead)
+        for target in range(page_num + 1, last_page + 1):
+            entry = get_entry_by_index(file_path, target)
+            if entry is None:
+                break
+            key = page_cache_key(file_path, target, entry, params)
+            if cache.contains(key):
+                continue
+            candidates.append(
+                _PrefetchJob(
+                    file_id=file_id,
+                    file_path=file_path,
+                    page_num=target,
+                    params=params,
+                    cache_key=key,
+                    generation=generation,
+                )
+            )
+
+        added = 0
+        with self._cond:
+            for job in candidates:
+                if job.cache_key in self._running:
+                    continue
+                existing = self._pending.pop(job.cache_key, None)
+                # 同一页已在队列中时刷新为最新一代任务，避免被当作过期任务丢弃
+                self._pending[job.cache_key] = job
+                if existing is None:
+                    added += 1
+            while len(self._pending) > self._max_pending:
+                self._pending.popitem(last=False)
+                self._cancelled += 1
+            self._scheduled += added
+            if self._pending:
+                self._ensure_workers_locked()
+                self._cond.notify_all()
+        return added
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                'workers': self._workers,
+                'pending': len(self._pending),
+                'running': len(self._running),
+                'scheduled': self._scheduled,
+                'completed': self._completed,
+                'cancelled': self._cancelled,
+                'failed': self._failed,
+                'deferred': self._deferred,
+            }
+
+    def _is_current_locked(self, job: _PrefetchJob) -> bool:
+        cursor = self._cursors.get(job.file_id)
+        if cursor is None:
+            return False
+        if job.generation == cursor.generation:
+            return True
+        # 旧一代任务只要仍落在当前窗口内就保留（顺序翻页时窗口大部分重叠）
+        return cursor.page_num < job.page_num <= cursor.page_num + cursor.ahead
+
+    def _drop_stale_locked(self) -> None:
+        for key in [key for key, job in self._pending.items() if not self._is_current_locked(job)]:
+            del self._pending[key]
+            self._cancelled += 1
+
+    def _ensure_workers_locked(self) -> None:
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self._workers:
+            thread = threading.Thread(target=self._worker_loop, name=f'page-prefetch-{len(self._threads)}', daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def _next_job(self) -> Optional[_PrefetchJob]:
+        with self._cond:
+            while True:
+                if len(self._threads) > self._workers and threading.current_thread() in self._threads:
+                    # 缩容：多余的工作线程退出
+                    self._threads.remove(threading.current_thread())
+                    return None
+                while self._pending:
+                    _, job = self._pending.popitem(last=False)
+                    if not self._is_current_locked(job):
+                        self._cancelled += 1
+                        continue
+                    self._running.add(job.cache_key)
+                    return job
+                self._cond.wait()
+
+    def _worker_loop(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            ok = False
+            deferred = False
+            try:
+                ok = self._run_job(job)
+            except AdmissionRejected:
+                deferred = True
+            except Exception as exc:
+                logger.warning('预热页面失败: {} | 页码: {} | 错误: {}', job.file_path, job.page_num, exc)
+            finally:
+                with self._cond:
+                    self._running.discard(job.cache_key)
+                    if deferred:
+                        self._deferred += 1
+                    elif ok:
+                        self._completed += 1
+                    else:
+                        self._failed += 1
+
+    def _run_job(self, job: _PrefetchJob) -> bool:
+        return warm_page(job.file_path, job.page_num, job.params, cache_key=job.cache_key, cache=get_render_cache())
+
+
+def warm_page(file_path: str, page_num: int, params: PageRenderParams, *, cache_key: str, cache: RenderCache) -> bool:
+    """
+    以后台优先级把一页写入渲染缓存：缩放页面渲染后写入，原图（仅 RAR/7z）解压后只写入内存层。
+
+    渲染并发已满时抛出 AdmissionRejected（让路给前台请求）；返回是否成功。
+    """
+    entry = get_entry_by_index(file_path, page_num)
+    if entry is None:
+        return False
+
+    if params.max_side_px > 0:
+        rendered = render_page_cached(
+            file_path,
+            entry,
+            params,
+            cache_key=cache_key,
+            cache=cache,
+            record_stats=False,
+            priority=BACKGROUND,
+        )
+        return rendered is not None
+
+    with get_render_admission().slot(BACKGROUND):
+        stream = read_entry_stream(file_path, entry)
+    if stream is None:
+        return False
+    cache.put(cache_key, RenderedImage(data=stream.getvalue(), mimetype=guess_mimetype(entry.name)), persist=False)
+    return True
+
+
+_prefetcher = PagePrefetcher()
+
+
+def get_page_prefetcher() -> PagePrefetcher:
+    return _prefetcher
+
+
+def schedule_page_prefetch(
+    *,
+    file_id: int,
+    file_path: str,
+    page_num: int,
+    total_pages: int,
+    params: PageRenderParams,
+    cache: RenderCache,
+) -> int:
+    """按设置安排后续页预热（需要应用上下文读取设置；预热本身在后台线程执行）。"""
+    ahead = get_int_setting('reader.prefetch.ahead', default=3, min_value=0, max_value=16)
+    if ahead <= 0:
+        return 0
+    workers = get_int_setting('reader.prefetch.workers', default=2, min_value=1, max_value=8)
+    _prefetcher.configure(workers=workers)
+    return _prefetcher.schedule(
+        file_id=file_id,
+        file_path=file_path,
+        page_num=page_num,
+        total_pages=total_pages,
+        params=params,
+        ahead=ahead,
+        cache=cache,
+    )
@@ -0,0 +1,613 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, replace
+from typing import Callable, Generator, List, Mapping, Optional, Sequence, Tuple, TypeVar
+
+from loguru import logger
+
+from ..infrastructure.admission import BACKGROUND, INTERACTIVE, AdmissionController, AdmissionRejected
+from ..infrastructure.archive_reader import ArchiveEntry, get_entry_by_index, guess_mimetype, iter_entries_bytes, read_entry_stream
+from ..infrastructure.image_render import is_avif_supported, render_image_bytes, timed_render
+from ..infrastructure.memory_cache import ByteBudgetLRU
+from ..infrastructure.render_pool import FormatEncodeStats, RenderPoolFull, RenderProcessPool
+from ..infrastructure.single_flight import SingleFlight
+from .render_cache_service import PASSTHROUGH, RenderCache, RenderedImage
+from .settings_service import get_bool_setting, get_int_setting, get_str_setting
+
+
+# 说明：
+# - 页面渲染参数的解析、缓存键计算与 Pillow 渲染集中在这里，供页图接口与后台预热共用。
+# - 缓存键与页图 ETag 同源：文件签名 + 页码 + 条目 + 渲染参数，任一变化都会换键。
+# - 同一缓存键的并发渲染（前台请求、批量请求与后台预热撞在同一页）只执行一次，其余调用方共享结果。
+
+# - Pillow 解码/缩放/编码默认交给渲染进程池，请求线程与预热线程只负责取字节、等结果。
+
+T = TypeVar('T')
+
+_render_flights = SingleFlight(timeout_s=30.0)
+_render_pool = RenderProcessPool()
+# 解压 + 渲染的并发上限：前台请求优先，后台预热让路
+_render_admission = AdmissionController()
+# 各输出格式的编码次数、体积与耗时
+_encode_stats = FormatEncodeStats()
+
+# Accept 协商可选的输出格式及其 MIME 类型；JPEG 作为所有客户端都支持的兜底
+_NEGOTIABLE_FORMATS = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+# 参与协商的请求格式：png（无损）与 auto（保持原格式）按请求原样输出
+_NEGOTIATED_REQUEST_FORMATS = {'webp', 'jpeg', 'jpg', 'avif'}
+
+# 按页记录的灰度判定：(路径, mtime, size, 条目名) -> 是否灰度；同一页换分辨率/格式重新渲染时不再重复检测
+_MAX_PAGE_TONES = 200_000
+_page_tones: 'OrderedDict[Tuple[str, int, int, str], bool]' = OrderedDict()
+_page_tones_lock = threading.Lock()
+
+# 预览图读取的页面原始字节：阅读器先取预览、紧接着取完整页，完整页复用这次读取，不再解压第二次
+# 键同 page_tone_key（含文件签名），文件变化时自然失效
+_preview_sources = ByteBudgetLRU(32 * 1024 * 1024)
+
+
+def get_render_flights() -> SingleFlight:
+    return _render_flights
+
+
+def get_render_pool() -> RenderProcessPool:
+    return _render_pool
+
+
+def get_render_admission() -> AdmissionController:
+    return _render_admission
+
+
+def get_encode_stats() -> FormatEncodeStats:
+    return _encode_stats
+
+
+def is_format_negotiation_enabled() -> bool:
+    return get_bool_setting('reader.render.negotiate', default=True)
+
+
+def negotiate_output_format(requested: str, accepted_mimetypes: Sequence[str]) -> str:
+    """
+    按 Accept 中明确列出的图片类型选择输出格式（偏好顺序见 reader.render.negotiate.formats）。
+
+    只认明确列出的类型：`*/*`、`image/*` 不代表支持 AVIF/WebP，此时回退为 JPEG。
+    请求的是 png/auto 时不协商，原样返回。
+    """
+    if requested not in _NEGOTIATED_REQUEST_FORMATS:
+        return requested
+    accepted = {str(value).strip().lower() for value in accepted_mimetypes}
+    raw_order = get_str_setting('reader.render.negotiate.formats', default='avif,webp,jpeg')
+    for name in (item.strip().lower() for item in raw_order.split(',')):
+        mimetype = _NEGOTIABLE_FORMATS.get(name)
+        if mimetype is None or mimetype not in accepted:
+            continue
+        if name == 'avif' and not is_avif_supported():
+            continue
+        return name
+    return 'jpeg'
+
+
+def get_page_tone_stats() -> dict:
+    with _page_tones_lock:
+        return {'recorded': len(_page_tones), 'gray': sum(1 for value in _page_tones.values() if value)}
+
+
+def page_tone_key(file_path: str, entry: ArchiveEntry) -> Optional[Tuple[str, int, int, str]]:
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return file_path, int(stat.st_mtime), int(stat.st_size), str(entry.name or '')
+
+
+def lookup_page_tone(key: Optional[Tuple[str, int, int, str]]) -> Optional[bool]:
+    if key is None:
+        return None
+    with _page_tones_lock:
+        value = _page_tones.get(key)
+        if value is not None:
+            _page_tones.move_to_end(key)
+        return value
+
+
+def record_page_tone(key: Optional[Tuple[str, int, int, str]], is_gray: Optional[bool]) -> None:
+    if key is None or is_gray is None:
+        return
+    with _page_tones_lock:
+        _page_tones[key] = is_gray
+        _page_tones.move_to_end(key)
+        while len(_page_tones) > _MAX_PAGE_TONES:
+            _page_tones.popitem(last=False)
+
+
+def record_page_tones(file_path: str, entries: Sequence[ArchiveEntry], tones: Sequence[Optional[bool]]) -> None:
+    """批量记录整本的灰度判定（持久化的判定装入进程内，渲染时作为 gray_hint）。"""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return
+    mtime, size = int(stat.st_mtime), int(stat.st_size)
+    for entry, tone in zip(entries, tones):
+        record_page_tone((file_path, mtime, size, str(entry.name or '')), tone)
+
+
+def get_preview_sources() -> ByteBudgetLRU:
+    return _preview_sources
+
+
+def configure_preview_sources_from_settings() -> ByteBudgetLRU:
+    """按当前设置调整预览原始字节缓存的预算（需要应用上下文）。"""
+    _preview_sources.configure(get_int_setting('reader.preview.source_cache_mb', default=32, min_value=0, max_value=1024) * 1024 * 1024)
+    return _preview_sources
+
+
+def lookup_preview_source(file_path: str, entry: ArchiveEntry) -> Optional[bytes]:
+    """返回预览图刚读取过的页面原始字节（未命中返回 None）。"""
+    key = page_tone_key(file_path, entry)
+    if key is None or not _preview_sources.peek(key):
+        return None
+    return _preview_sources.get(key)
+
+
+def configure_render_admission_from_settings() -> AdmissionController:
+    """按当前设置调整解压 + 渲染的并发上限（需要应用上下文）。"""
+    _render_admission.configure(
+        limit=get_int_setting('reader.overload.max_concurrent', default=4, min_value=0, max_value=256),
+        interactive_reserve=get_int_setting('reader.overload.interactive_reserve', default=1, min_value=0, max_value=64),
+    )
+    return _render_admission
+
+
+def configure_render_pool_from_settings() -> RenderProcessPool:
+    """按当前设置调整渲染进程池（需要应用上下文；设置变更后下一次请求即生效）。"""
+    _render_pool.configure(
+        workers=get_int_setting('reader.render_pool.workers', default=2, min_value=0, max_value=32),
+        queue_depth=get_int_setting('reader.render_pool.queue_depth', default=16, min_value=0, max_value=256),
+    )
+    return _render_pool
+
+
+@dataclass(frozen=True)
+class PageRenderParams:
+    """页面渲染参数（max_side_px=0 表示原图）。"""
+
+    max_side_px: int
+    output_format: str
+    quality: int
+    resample: str
+    optimize: bool
+    webp_method: int
+    # 实际为灰度的页面按单通道编码
+    grayscale: bool = True
+    # quality=preview 的低质量占位图：读取的原始字节留给紧接着的完整页请求（不影响渲染结果，不计入缓存键）
+    preview: bool = False
+
+
+def _parse_int(raw_value) -> Optional[int]:
+    if raw_value is None or raw_value == '':
+        return None
+    try:
+        return int(str(raw_value).strip())
+    except ValueError:
+        return None
+
+
+def _parse_bool(raw_value) -> Optional[bool]:
+    if raw_value is None:
+        return None
+    value = str(raw_value).strip().lower()
+    if value in {'1', 'true', 'yes', 'y', 'on'}:
+        return True
+    if value in {'0', 'false', 'no', 'n', 'off'}:
+        return False
+    return None
+
+
+def resolve_page_render_params(args: Mapping[str, str]) -> PageRenderParams:
+    """
+    解析查询参数中的渲染参数，缺省值来自设置。
+
+    前端会把设置拼到查询参数里，确保“切换分辨率/质量”可以立刻刷新当前页；
+    未传参数时仍保持老行为（按设置的默认值，默认原图）。
+    """
+    default_max_side_px = get_int_setting('ui.reader.image.max_side_px', default=0, min_value=0, max_value=20000)
+    default_format = get_str_setting('ui.reader.image.render.format', default='webp')
+    default_quality = get_int_setting('ui.reader.image.render.quality', default=82, min_value=1, max_value=100)
+    default_resample = get_str_setting('ui.reader.image.render.resample', default='bilinear')
+    default_optimize = get_bool_setting('ui.reader.image.render.optimize', default=False)
+    default_webp_method = get_int_setting('ui.reader.image.render.webp_method', default=0, min_value=0, max_value=6)
+    grayscale = get_bool_setting('reader.render.grayscale', default=True)
+
+    if str(args.get('quality') or '').strip().lower() == 'preview':
+        return resolve_preview_render_params(grayscale=grayscale)
+
+    max_side_px = _parse_int(args.get('max_side_px'))
+    if max_side_px is None:
+        max_side_px = default_max_side_px
+
+    quality = _parse_int(args.get('quality'))
+    if quality is None:
+        quality = default_quality
+
+    optimize = _parse_bool(args.get('optimize'))
+    if optimize is None:
+        optimize = default_optimize
+
+    webp_method = _parse_int(args.get('webp_method'))
+    if webp_method is None:
+        webp_method = default_webp_method
+
+    return PageRenderParams(
+        max_side_px=max(0, min(20000, int(max_side_px))),
+        output_format=str(args.get('format') or default_format or 'webp').strip().lower(),
+        quality=max(1, min(100, int(quality))),
+        resample=str(args.get('resample') or default_resample or 'lanczos').strip().lower(),
+        optimize=bool(optimize),
+        webp_method=max(0, min(6, int(webp_method))),
+        grayscale=grayscale,
+    )
+
+
+def resolve_preview_render_params(*, grayscale: bool) -> PageRenderParams:
+    """
+    预览占位图参数：最长边很小、质量很低，前端模糊显示后再替换为完整页。
+
+    JPEG 原图按 draft 以 1/2~1/8 比例解码，预览的计算量远小于完整渲染。
+    """
+    return PageRenderParams(
+        max_side_px=get_int_setting('reader.preview.max_side_px', default=200, min_value=32, max_value=800),
+        output_format=get_str_setting('reader.preview.format', default='jpeg').strip().lower() or 'jpeg',
+        quality=get_int_setting('reader.preview.quality', default=30, min_value=1, max_value=100),
+        resample='bilinear',
+        optimize=False,
+        webp_method=0,
+        grayscale=grayscale,
+        preview=True,
+    )
+
+
+def page_cache_key(file_path: str, page_num: int, entry: ArchiveEntry, params: PageRenderParams) -> str:
+    """计算页面缓存键（同时作为 ETag），文件不可访问时使用占位签名。"""
+    try:
+        stat = os.stat(file_path)
+        file_sig = f'{int(stat.st_mtime)}-{int(stat.st_size)}'
+    except Exception:
+        file_sig = '0-0'
+
+    source = '|'.join(
+        [
+            file_sig,
+            str(page_num),
+            str(entry.name or ''),
+            str(entry.size or ''),
+            str(params.max_side_px),
+            str(params.output_format),
+            str(params.quality),
+            str(params.resample),
+            str(int(params.optimize)),
+            str(params.webp_method),
+            str(int(params.grayscale)),
+        ]
+    )
+    return hashlib.sha1(source.encode('utf-8')).hexdigest()
+
+
+@dataclass(frozen=True)
+class PagePart:
+    """批量返回中的单页结果；data 为 None 表示该页读取失败。"""
+
+    page_num: int
+    cache_key: str
+    data: Optional[bytes]
+    mimetype: str
+    # 渲染并发已满时以原图代替缩放结果
+    degraded: bool = False
+
+
+PlannedPage = Tuple[int, ArchiveEntry, str]
+
+
+def plan_page_batch(file_path: str, page_nums: Sequence[int], params: PageRenderParams) -> List[PlannedPage]:
+    """为批量返回解析条目与缓存键，返回 [(页码, 条目, 缓存键)]，越界页码被跳过。"""
+    planned: List[PlannedPage] = []
+    for page_num in page_nums:
+        entry = get_entry_by_index(file_path, page_num)
+        if entry is None:
+            continue
+        planned.append((page_num, entry, page_cache_key(file_path, page_num, entry, params)))
+    return planned
+
+
+def iter_page_batch(
+    file_path: str,
+    planned: Sequence[PlannedPage],
+    params: PageRenderParams,
+    *,
+    cache: Optional[RenderCache],
+    warm_original: bool = False,
+    wait_s: float = 0.0,
+) -> Generator[PagePart, None, None]:
+    """
+    按页码顺序产出多页结果，渲染参数与缓存键规则与单页接口一致。
+
+    - 缓存命中的页直接产出；其余页在一次批量解压中顺序读取（只打开一次压缩包）后再渲染。
+    - warm_original：原图模式下是否查询内存层中预热过的原图（与单页接口一致，仅 RAR/7z）。
+    - 渲染并发已满且等待 wait_s 仍拿不到名额时，该页降级为原图（PagePart.degraded=True）。
+    """
+
+    resolved = {}
+    passthrough = set()
+    misses: List[ArchiveEntry] = []
+    for page_num, entry, key in planned:
+        cached = None
+        if cache is not None and params.max_side_px > 0:
+            cached = cache.get(key)
+        elif cache is not None and warm_original:
+            cached = cache.get(key, memory_only=True)
+        if cached is not None and not cached.passthrough:
+            resolved[page_num] = cached
+            continue
+        if cached is not None:
+            passthrough.add(page_num)
+        misses.append(entry)
+
+    reader = iter_entries_bytes(file_path, misses)
+    try:
+        for page_num, entry, key in planned:
+            cached = resolved.get(page_num)
+            if cached is not None:
+                yield PagePart(page_num=page_num, cache_key=key, data=cached.data, mimetype=cached.mimetype)
+                continue
+
+            _, data = next(reader, (entry, None))
+            if data is not None and params.max_side_px > 0 and page_num not in passthrough:
+                try:
+                    rendered = _render_deduplicated(
+                        file_path,
+                        entry,
+                        params,
+                        cache_key=key,
+                        cache=cache,
+                        source=io.BytesIO(data),
+                        priority=INTERACTIVE,
+                        wait_s=wait_s,
+                    )
+                except AdmissionRejected:
+                    yield PagePart(page_num=page_num, cache_key=key, data=data, mimetype=guess_mimetype(entry.name), degraded=True)
+                    continue
+                if rendered is not None and not rendered.passthrough:
+                    yield PagePart(page_num=page_num, cache_key=key, data=rendered.data, mimetype=rendered.mimetype)
+                    continue
+            yield PagePart(page_num=page_num, cache_key=key, data=data, mimetype=guess_mimetype(entry.name))
+    finally:
+        reader.close()
+
+
+def render_page_cached(
+    file_path: str,
+    entry: ArchiveEntry,
+    params: PageRenderParams,
+    *,
+    cache_key: str,
+    cache: Optional[RenderCache],
+    record_stats: bool = True,
+    source: Optional[io.BytesIO] = None,
+    priority: str = INTERACTIVE,
+    wait_s: float = 0.0,
+) -> Optional[RenderedImage]:
+    """
+    先查渲染缓存，未命中时渲染并写回（失败结果不缓存）。返回值含义同 render_page_image。
+
+    未命中时需要取得解压 + 渲染名额：前台请求最多等待 wait_s，后台预热不等待；拿不到名额时抛出 AdmissionRejected。
+    """
+    if cache is not None:
+        cached = cache.get(cache_key, record=record_stats)
+        if cached is not None:
+            return cached
+
+    return _render_deduplicated(
+        file_path,
+        entry,
+        params,
+        cache_key=cache_key,
+        cache=cache,
+        source=source,
+        priority=priority,
+        wait_s=wait_s,
+    )
+
+
+def _render_deduplicated(
+    file_path: str,
+    entry: ArchiveEntry,
+    params: PageRenderParams,
+    *,
+    cache_key: str,
+    cache: Optional[RenderCache],
+    source: Optional[io.BytesIO],
+    priority: str,
+    wait_s: float,
+) -> Optional[RenderedImage]:
+    def run(run_priority: str) -> Optional[RenderedImage]:
+        return _render_and_store(
+            file_path,
+            entry,
+            params,
+            cache_key=cache_key,
+            cache=cache,
+            source=source,
+            priority=run_priority,
+            wait_s=wait_s,
+        )
+
+    try:
+        return _render_flights.do(cache_key, lambda: run(priority))
+    except AdmissionRejected as exc:
+        if exc.priority == BACKGROUND and priority == INTERACTIVE:
+            # 合并到的是让路失败的后台预热：以前台优先级自行执行一次
+            return run(priority)
+        raise
+
+
+def _render_and_store(
+    file_path: str,
+    entry: ArchiveEntry,
+    params: PageRenderParams,
+    *,
+    cache_key: str,
+    cache: Optional[RenderCache],
+    source: Optional[io.BytesIO],
+    priority: str,
+    wait_s: float,
+) -> Optional[RenderedImage]:
+    if cache is not None:
+        # 上一轮同键渲染可能刚刚结束：直接复用其写入的结果
+        cached = cache.get(cache_key, memory_only=True, record=False)
+        if cached is not None:
+            return cached
+
+    with _render_admission.slot(priority, wait_s):
+        rendered = render_page_image(
+            file_path,
+            entry,
+            max_side_px=params.max_side_px,
+            output_format=params.output_format,
+            quality=params.quality,
+            resample=params.resample,
+            optimize=params.optimize,
+            webp_method=params.webp_method,
+            grayscale=params.grayscale,
+            source=source,
+            keep_source=params.preview,
+            priority=priority,
+        )
+    if rendered is not None and cache is not None:
+        cache.put(cache_key, rendered)
+    return rendered
+
+
+def find_cached_downscaled(
+    file_path: str,
+    page_num: int,
+    entry: ArchiveEntry,
+    params: PageRenderParams,
+    cache: Optional[RenderCache],
+) -> Optional[Tuple[int, RenderedImage]]:
+    """
+    过载降级：查找同一页已缓存的更小尺寸渲染结果（按分辨率预设从大到小），返回 (max_side_px, 结果)。
+
+    只查缓存，不做任何解压或渲染；找不到时返回 None。
+    """
+    if cache is None or params.max_side_px <= 0:
+        return None
+    try:
+        presets = json.loads(get_str_setting('ui.reader.image.max_side_presets', default='[]'))
+    except (TypeError, ValueError):
+        presets = []
+    candidates = {int(value) for value in presets if isinstance(value, int) and 0 < value < params.max_side_px}
+    candidates.add(params.max_side_px // 2)
+    for max_side_px in sorted((value for value in candidates if value >= 320), reverse=True):
+        key = page_cache_key(file_path, page_num, entry, replace(params, max_side_px=max_side_px))
+        cached = cache.get(key, record=False)
+        if cached is not None and not cached.passthrough:
+            return max_side_px, cached
+    return None
+
+
+def render_page_image(
+    file_path,
+    entry,
+    *,
+    max_side_px: int,
+    output_format: str,
+    quality: int,
+    resample: str,
+    optimize: bool,
+    webp_method: int,
+    grayscale: bool = False,
+    source: Optional[io.BytesIO] = None,
+    keep_source: bool = False,
+    priority: str = INTERACTIVE,
+):
+    """
+    将页面图片缩放后再返回（用于降低传输与渲染压力）。
+
+    source：已解压的页面字节流（批量读取时传入），缺省时先查预览留下的原始字节，再按条目从压缩包读取。
+    keep_source：从压缩包读取后把原始字节留给紧接着的完整页请求（预览图使用）。
+    grayscale：实际为灰度的页面按单通道编码；判定结果按页记录，之后渲染同一页不再重复检测。
+
+    返回：
+    - RenderedImage：缩放后的图片；
+    - PASSTHROUGH：原图已不超过目标尺寸，无需缩放（可缓存该判定）；
+    - None：读取或渲染失败（回退到原图流式输出，不缓存）。
+
+    渲染进程池排队已满时抛出 AdmissionRejected，由调用方按过载策略降级。
+    """
+    if max_side_px <= 0:
+        return None
+
+    stream = source
+    if stream is None:
+        kept = lookup_preview_source(file_path, entry)
+        if kept is not None:
+            stream = io.BytesIO(kept)
+    if stream is None:
+        stream = read_entry_stream(file_path, entry)
+        if stream is None:
+            return None
+        if keep_source:
+            key = page_tone_key(file_path, entry)
+            if key is not None:
+                _preview_sources.put(key, stream.getvalue())
+
+    render_params = {
+        'max_side_px': int(max_side_px),
+        'output_format': output_format,
+        'quality': int(quality),
+        'resample': resample,
+        'optimize': bool(optimize),
+        'webp_method': int(webp_method),
+    }
+    tone_key = None
+    if grayscale:
+        tone_key = page_tone_key(file_path, entry)
+        render_params['grayscale'] = True
+        render_params['gray_hint'] = lookup_page_tone(tone_key)
+    source_bytes = stream.getvalue()
+    try:
+        (data, mimetype, is_gray), encode_s = run_render_task(render_image_bytes, source_bytes, render_params, priority=priority)
+    except AdmissionRejected:
+        raise
+    except Exception as exc:
+        logger.warning('渲染缩放页面失败: {} | 条目: {} | 错误: {}', file_path, getattr(entry, 'name', ''), exc)
+        return None
+    record_page_tone(tone_key, is_gray)
+    if not data:
+        return PASSTHROUGH
+    _encode_stats.record(mimetype, input_bytes=len(source_bytes), output_bytes=len(data), encode_s=encode_s)
+    return RenderedImage(data=data, mimetype=mimetype)
+
+
+def run_render_task(task: Callable[..., T], data: bytes, render_params: dict, *, priority: str = INTERACTIVE) -> Tuple[T, float]:
+    """
+    执行 task(data, **render_params)，返回 (结果, 渲染耗时秒数，不含排队)。
+
+    优先交给渲染进程池；未启用或进程池异常时在当前线程执行。
+    排队已满时抛出 AdmissionRejected（不在请求线程内渲染，否则过载时反而多占一份 CPU），由调用方按过载策略降级。
+    """
+    if _render_pool.enabled:
+        try:
+            return _render_pool.render(data, render_params, task=task)
+        except RenderPoolFull as exc:
+            if _render_pool.enabled:
+                raise AdmissionRejected(str(exc), priority=priority) from exc
+        except BrokenProcessPool:
+            pass
+    return timed_render(task, data, render_params)
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from .. import db
+from ..infrastructure.archive_reader import get_archive_entries, iter_entries_bytes
+from ..infrastructure.image_render import render_thumbnail
+from ..infrastructure.thumbnail_pack import Thumbnail, ThumbnailPackIndex, read_thumbnail_pack_index, write_thumbnail_pack
+from ..models.manga import File, FileThumbnailPack
+from .settings_service import get_bool_setting, get_int_setting
+
+
+# 说明：
+# - 页面缩略图（阅读器页码滑块/导航用）由后台任务按书生成：一次顺序读取整本（7z 固实块只解码一遍），
+#   每页用 draft 缩小解码后编码为小 JPEG，整本写成一个缩略图包（见 infrastructure/thumbnail_pack）。
+# - 阅读进程只读取包的偏移表，单张缩略图按字节区间直接输出，整包可一次下载。
+# - 阅读进度更新（PATCH）或 POST /files/<id>/thumbnails 时按需提交生成任务，GET 接口只读；空闲补齐默认关闭（reader.thumbnails.idle_build）。
+# - 生成结果记录在 file_thumbnail_packs 表：查找缺少缩略图包的书只查数据库，不逐本 stat 包文件。
+# - 缩小解码时顺带得到每页的显示尺寸与灰度判定，由任务写入页面尺寸表（见 page_geometry_service）。
+
+# 同一本书按需提交后，该时间内不重复提交
+_REQUEST_INTERVAL_S = 600.0
+_MAX_INDEXES = 256
+
+
+@dataclass(frozen=True)
+class ThumbnailPathConfig:
+    """缩略图包路径配置（分片方式与封面一致）。"""
+
+    base_dir: str
+    shard_count: int
+
+
+@dataclass(frozen=True)
+class ThumbnailSettings:
+    max_side: int
+    quality: int
+
+
+@dataclass(frozen=True)
+class ThumbnailPackResult:
+    """一次缩略图包生成的结果：成功页数，以及顺带得到的源文件签名、各页显示尺寸与灰度判定（失败页为 None）。"""
+
+    count: int
+    source_size: int
+    source_mtime: int
+    sizes: List[Optional[Tuple[int, int]]]
+    tones: List[Optional[bool]]
+
+
+def get_thumbnail_settings() -> ThumbnailSettings:
+    return ThumbnailSettings(
+        max_side=get_int_setting('reader.thumbnails.max_side', default=160, min_value=32, max_value=512),
+        quality=get_int_setting('reader.thumbnails.quality', default=60, min_value=1, max_value=100),
+    )
+
+
+def get_thumbnail_pack_path(config: ThumbnailPathConfig, file_id: int) -> str:
+    shard_count = max(1, int(config.shard_count))
+    shard_width = max(2, len(hex(shard_count - 1)) - 2)
+    shard = f'{int(file_id) % shard_count:0{shard_width}x}'
+    return os.path.join(config.base_dir, shard, f'{int(file_id)}.thumbs')
+
+
+def build_thumbnail_pack(
+    file_id: int,
+    file_path: str,
+    *,
+    config: ThumbnailPathConfig,
+    settings: ThumbnailSettings,
+) -> Optional[ThumbnailPackResult]:
+    """
+    顺序读取整本生成缩略图包（不依赖应用上下文）；文件不可读或没有页面时返回 None。
+
+    单页失败只在偏移表中记为空，不影响其余页面。
+    """
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    entries = get_archive_entries(file_path)
+    if not entries:
+        return None
+
+    thumbnails: List[Thumbnail] = []
+    sizes: List[Optional[Tuple[int, int]]] = []
+    tones: List[Optional[bool]] = []
+    for entry, data in iter_entries_bytes(file_path, entries):
+        thumbnail = None
+        size = None
+        tone = None
+        if data is not None:
+            try:
+                thumb_data, width, height, size, tone = render_thumbnail(data, max_side=settings.max_side, quality=settings.quality)
+                thumbnail = (thumb_data, width, height)
+            except Exception as exc:
+                logger.warning('生成页面缩略图失败: {} | 条目: {} | 错误: {}', file_path, entry.name, exc)
+        thumbnails.append(thumbnail)
+        sizes.append(size)
+        tones.append(tone)
+
+    write_thumbnail_pack(
+        get_thumbnail_pack_path(config, file_id),
+        source_size=int(stat.st_size),
+        source_mtime=int(stat.st_mtime),
+        max_side=settings.max_side,
+        thumbnails=thumbnails,
+    )
+    return ThumbnailPackResult(
+        count=sum(1 for thumbnail in thumbnails if thumbnail is not None),
+        source_size=int(stat.st_size),
+        source_mtime=int(stat.st_mtime),
+        sizes=sizes,
+        tones=tones,
+    )
+
+
+_indexes: 'OrderedDict[Tuple[str, int, int], ThumbnailPackIndex]' = OrderedDict()
+_indexes_lock = threading.Lock()
+_requested: 'OrderedDict[int, float]' = OrderedDict()
+
+
+def load_thumbnail_index(file_record: File, config: ThumbnailPathConfig, settings: ThumbnailSettings) -> Optional[Tuple[str, ThumbnailPackIndex]]:
+    """返回 (包路径, 偏移表)；包不存在、与文件记录不一致或缩略图边长已变更时返回 None。"""
+    path = get_thumbnail_pack_path(config, file_record.id)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+    if index is None:
+        index = read_thumbnail_pack_index(path)
+        if index is None:
+            return None
+        with _indexes_lock:
+            _indexes[key] = index
+            while len(_indexes) > _MAX_INDEXES:
+                _indexes.popitem(last=False)
+
+    if (
+        index.source_size != int(file_record.file_size or 0)
+        or index.source_mtime != int(file_record.file_mtime or 0)
+        or index.max_side != settings.max_side
+    ):
+        return None
+    return path, index
+
+
+def record_thumbnail_pack(file_id: int, *, file_size: int, file_mtime: int, max_side: int, page_count: int) -> None:
+    """记录已生成的缩略图包（不提交事务）。"""
+    record = db.session.get(FileThumbnailPack, int(file_id))
+    if record is None:
+        record = FileThumbnailPack(file_id=int(file_id))
+        db.session.add(record)
+    record.file_size = int(file_size)
+    record.file_mtime = int(file_mtime)
+    record.max_side = int(max_side)
+    record.page_count = int(page_count)
+
+
+def find_files_without_thumbnails(
+    settings: ThumbnailSettings,
+    *,
+    library_path_id: Optional[int] = None,
+    limit: Optional[int] = None,
+) -> List[File]:
+    """返回没有有效缩略图包记录的文件（不含缺失文件），最近阅读的优先。"""
+    query = (
+        db.session.query(File)
+        .outerjoin(FileThumbnailPack, FileThumbnailPack.file_id == File.id)
+        .filter(File.is_missing.is_(False), File.total_pages > 0)
+        .filter(
+            db.or_(
+                FileThumbnailPack.file_id.is_(None),
+                FileThumbnailPack.file_size != File.file_size,
+                FileThumbnailPack.file_mtime != File.file_mtime,
+                FileThumbnailPack.max_side != int(settings.max_side),
+            )
+        )
+    )
+    if library_path_id is not None:
+        query = query.filter(File.library_path_id == int(library_path_id))
+    query = query.order_by(File.last_read_date.is_(None), File.last_read_date.desc(), File.id.desc())
+    if limit is not None:
+        query = query.limit(int(limit))
+    return query.all()
+
+
+def delete_thumbnail_packs(file_ids: Sequence[int]) -> int:
+    """删除指定文件的缩略图包记录（不提交事务；包文件在提交后由 remove_thumbnail_pack_files 删除）。"""
+    if not file_ids:
+        return 0
+    return FileThumbnailPack.query.filter(FileThumbnailPack.file_id.in_(list(file_ids))).delete(synchronize_session=False)
+
+
+def remove_thumbnail_pack_files(config: ThumbnailPathConfig, file_ids: Sequence[int]) -> int:
+    """删除指定文件的缩略图包文件，返回删除的文件数（不存在的跳过）。"""
+    removed = 0
+    for file_id in file_ids:
+        try:
+            os.remove(get_thumbnail_pack_path(config, file_id))
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+
+def claim_thumbnail_request(file_id: int) -> bool:
+    """按需生成的去重：同一本书短时间内只提交一次任务；按需生成关闭时返回 False（需要应用上下文）。"""
+    if not get_bool_setting('reader.thumbnails.lazy', default=True):
+        return False
+    now = time.monotonic()
+    with _indexes_lock:
+        last = _requested.get(int(file_id))
+        if last is not None and now - last < _REQUEST_INTERVAL_S:
+            return False
+        _requested[int(file_id)] = now
+        _requested.move_to_end(int(file_id))
+        while len(_requested) > _MAX_INDEXES:
+            _requested.popitem(last=False)
+    return True
+
+
+def get_thumbnail_stats() -> Dict[str, int]:
+    with _indexes_lock:
+        return {'indexes': len(_indexes), 'requested': len(_requested)}
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import hashlib
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from ..infrastructure.admission import INTERACTIVE, AdmissionRejected
+from ..infrastructure.archive_reader import ArchiveEntry, read_entry_stream
+from ..infrastructure.image_render import render_tile_level
+from ..infrastructure.single_flight import SingleFlight
+from .page_render_service import (
+    PageRenderParams,
+    get_encode_stats,
+    get_render_admission,
+    lookup_page_tone,
+    page_cache_key,
+    page_tone_key,
+    record_page_tone,
+    run_render_task,
+)
+from .render_cache_service import RenderCache, RenderedImage
+
+
+# 说明：
+# - 超大页面（长条漫、高 dpi 扫描）按级切成固定尺寸的瓦片：0 级为原尺寸，每级宽高减半，直到整页落入一块瓦片。
+# - 瓦片按需生成：某一级的第一块瓦片被请求时解码整页一次，把该级全部瓦片编码写入渲染缓存，
+#   同一级的并发请求只解码一次；之后同级其他瓦片直接命中缓存。
+# - 瓦片缓存键由页面缓存键（按原图尺寸计算）+ 瓦片尺寸 + 级别 + 坐标组成，文件或渲染参数变化时自然换键。
+
+_tile_flights = SingleFlight(timeout_s=60.0)
+
+
+@dataclass(frozen=True)
+class TileLevel:
+    """某一级的尺寸与瓦片行列数。"""
+
+    level: int
+    width: int
+    height: int
+    cols: int
+    rows: int
+
+
+def compute_tile_levels(width: int, height: int, tile_size: int) -> List[TileLevel]:
+    """从 0 级（原尺寸）开始逐级减半，最后一级整页落入一块瓦片。"""
+    tile_size = max(1, int(tile_size))
+    levels: List[TileLevel] = []
+    level = 0
+    while True:
+        scale = 1 << level
+        level_width = max(1, -(-int(width) // scale))
+        level_height = max(1, -(-int(height) // scale))
+        levels.append(
+            TileLevel(
+                level=level,
+                width=level_width,
+                height=level_height,
+                cols=-(-level_width // tile_size),
+                rows=-(-level_height // tile_size),
+            )
+        )
+        if max(level_width, level_height) <= tile_size:
+            return levels
+        level += 1
+
+
+def tile_base_key(file_path: str, page_num: int, entry: ArchiveEntry, params: PageRenderParams) -> str:
+    """瓦片所属页面的缓存键：与缩放宽度无关，只取编码参数。"""
+    return page_cache_key(file_path, page_num, entry, replace(params, max_side_px=0))
+
+
+def tile_cache_key(base_key: str, tile_size: int, level: int, x: int, y: int) -> str:
+    return hashlib.sha1(f'{base_key}|tile|{int(tile_size)}|{int(level)}|{int(x)}|{int(y)}'.encode('utf-8')).hexdigest()
+
+
+def render_page_tile(
+    file_path: str,
+    entry: ArchiveEntry,
+    params: PageRenderParams,
+    *,
+    base_key: str,
+    tile_size: int,
+    level: int,
+    x: int,
+    y: int,
+    cache: Optional[RenderCache],
+    wait_s: float = 0.0,
+) -> Optional[RenderedImage]:
+    """
+    返回指定瓦片：先查渲染缓存，未命中时生成整级瓦片（同一级并发只生成一次）。
+
+    渲染并发已满时抛出 AdmissionRejected；读取或渲染失败返回 None。
+    """
+    key = tile_cache_key(base_key, tile_size, level, x, y)
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+
+    tiles = _tile_flights.do(
+        (base_key, int(tile_size), int(level)),
+        lambda: _render_level(file_path, entry, params, base_key=base_key, tile_size=tile_size, level=level, cache=cache, wait_s=wait_s),
+    )
+    if tiles is None:
+        return None
+    return tiles.get((x, y))
+
+
+def _render_level(
+    file_path: str,
+    entry: ArchiveEntry,
+    params: PageRenderParams,
+    *,
+    base_key: str,
+    tile_size: int,
+    level: int,
+    cache: Optional[RenderCache],
+    wait_s: float,
+) -> Optional[Dict[Tuple[int, int], RenderedImage]]:
+    render_params = {
+        'level': int(level),
+        'tile_size': int(tile_size),
+        'output_format': params.output_format,
+        'quality': int(params.quality),
+        'resample': params.resample,
+        'optimize': bool(params.optimize),
+        'webp_method': int(params.webp_method),
+    }
+    tone_key = None
+    if params.grayscale:
+        tone_key = page_tone_key(file_path, entry)
+        render_params['grayscale'] = True
+        render_params['gray_hint'] = lookup_page_tone(tone_key)
+
+    with get_render_admission().slot(INTERACTIVE, wait_s):
+        stream = read_entry_stream(file_path, entry)
+        if stream is None:
+            return None
+        source_bytes = stream.getvalue()
+        try:
+            (tiles, mimetype, is_gray), encode_s = run_render_task(render_tile_level, source_bytes, render_params)
+        except AdmissionRejected:
+            raise
+        except Exception as exc:
+            logger.warning('生成页面瓦片失败: {} | 条目: {} | 级别: {} | 错误: {}', file_path, getattr(entry, 'name', ''), level, exc)
+            return None
+
+    record_page_tone(tone_key, is_gray)
+    get_encode_stats().record(
+        mimetype,
+        input_bytes=len(source_bytes),
+        output_bytes=sum(len(data) for _, _, data in tiles),
+        encode_s=encode_s,
+    )
+    result: Dict[Tuple[int, int], RenderedImage] = {}
+    for x, y, data in tiles:
+        rendered = RenderedImage(data=data, mimetype=mimetype)
+        result[(x, y)] = rendered
+        if cache is not None:
+            cache.put(tile_cache_key(base_key, tile_size, level, x, y), rendered)
+    return result
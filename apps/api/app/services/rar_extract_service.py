@@ -0,0 +1,27 @@
+from __future__ import annotations
+
+from flask import current_app
+
+from ..infrastructure.archive_reader import get_rar_extract_cache, is_rar_archive
+from ..infrastructure.rar_extract_cache import RarExtractCache
+from .settings_service import get_bool_setting, get_int_setting
+
+
+# 说明：
+# - RAR 的整本解压缓存默认关闭，只在阅读请求中按设置启用；扫描、封面等后台任务进程从不整本解压。
+# - 开启后首次阅读只提交后台解压，当前页照常逐页解压；解压完成后的请求才读取解压目录。
+# - 设置变更后下一次阅读请求即生效；关闭后已解压的内容保留在磁盘上，重新开启时仍可使用。
+
+
+def configure_rar_extract_cache_from_settings(file_path: str) -> RarExtractCache:
+    """阅读 RAR 书籍前按当前设置调整解压缓存（需要应用上下文；非 RAR 文件不读取设置）。"""
+    cache = get_rar_extract_cache()
+    if not is_rar_archive(file_path):
+        return cache
+    enabled = get_bool_setting('reader.rar_cache.enabled', default=False)
+    disk_mb = get_int_setting('reader.rar_cache.disk_mb', default=4096, min_value=0, max_value=1024 * 1024)
+    cache.configure(
+        base_dir=current_app.config['RAR_EXTRACT_CACHE_PATH'],
+        budget_bytes=disk_mb * 1024 * 1024 if enabled else 0,
+    )
+    return cache
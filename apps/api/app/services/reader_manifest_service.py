@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+from urllib.parse import urlencode
+
+from ..infrastructure.archive_reader import ArchiveEntry, get_archive_entries
+from ..models.manga import File
+from .page_geometry_service import PageSize
+from .page_render_service import PageRenderParams, page_cache_key
+
+
+# 说明：
+# - 阅读会话清单：打开一本书所需的页列表、页图地址、续读页与书签一次返回，前端不再逐页请求元数据。
+# - 页列表来自页索引（数据库 / 进程内缓存）与扫描后记录的页面尺寸，缓存命中时不读取压缩包。
+# - 页图地址带上当前渲染参数，ETag 与单页接口一致；页列表按 (文件签名, 渲染参数, 尺寸是否就绪) 缓存在进程内。
+
+_MAX_MANIFESTS = 64
+_manifest_pages: 'OrderedDict[Hashable, List[dict]]' = OrderedDict()
+_manifest_lock = threading.Lock()
+
+
+def render_query(params: PageRenderParams) -> str:
+    """渲染参数对应的查询字符串：页图按该地址请求时与清单中的 ETag 一致。"""
+    if params.preview:
+        return 'quality=preview'
+    return urlencode(
+        {
+            'max_side_px': params.max_side_px,
+            'format': params.output_format,
+            'quality': params.quality,
+            'resample': params.resample,
+            'optimize': int(params.optimize),
+            'webp_method': params.webp_method,
+        }
+    )
+
+
+def build_manifest_pages(
+    file_record: File,
+    params: PageRenderParams,
+    *,
+    sizes: Optional[Sequence[PageSize]],
+    tile_min_side_px: int,
+) -> List[dict]:
+    """
+    返回每页的名称、大小、尺寸（已知时）、页图地址与 ETag。
+
+    tiles 表示该页最长边超过 tile_min_side_px，建议按瓦片读取。
+    """
+    file_path = file_record.file_path
+    try:
+        stat = os.stat(file_path)
+        signature: Tuple[int, int] = (int(stat.st_mtime), int(stat.st_size))
+    except OSError:
+        signature = (0, 0)
+    cache_key = (int(file_record.id), file_path, signature, params, sizes is not None, int(tile_min_side_px))
+    with _manifest_lock:
+        cached = _manifest_pages.get(cache_key)
+        if cached is not None:
+            _manifest_pages.move_to_end(cache_key)
+            return cached
+
+    entries: List[ArchiveEntry] = get_archive_entries(file_path)
+    query = render_query(params)
+    pages: List[dict] = []
+    for page_num, entry in enumerate(entries):
+        size = sizes[page_num] if sizes is not None and page_num < len(sizes) else None
+        pages.append(
+            {
+                'page': page_num,
+                'name': entry.name,
+                'size': entry.size,
+                'width': size[0] if size else None,
+                'height': size[1] if size else None,
+                'url': f'/api/v1/files/{file_record.id}/pages/{page_num}?{query}',
+                'etag': f'W/"{page_cache_key(file_path, page_num, entry, params)}"',
+                'tiles': bool(size) and tile_min_side_px > 0 and max(size) >= tile_min_side_px,
+            }
+        )
+
+    with _manifest_lock:
+        _manifest_pages[cache_key] = pages
+        _manifest_pages.move_to_end(cache_key)
+        while len(_manifest_pages) > _MAX_MANIFESTS:
+            _manifest_pages.popitem(last=False)
+    return pages
+
+
+def get_manifest_cache_stats() -> Dict[str, int]:
+    with _manifest_lock:
+        return {'items': len(_manifest_pages), 'max_items': _MAX_MANIFESTS}
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from flask import current_app
+
+from ..infrastructure.disk_cache import DiskByteCache
+from ..infrastructure.memory_cache import ByteBudgetLRU
+from .settings_service import get_bool_setting, get_int_setting
+
+
+# 说明：
+# - 缓存键为 build_page_response 中的 ETag 摘要（文件签名 + 页码 + 渲染参数），文件变更后自然换键。
+# - 内存层（字节预算 LRU）在前，磁盘层（instance/render_cache，容量 + 过期淘汰）在后；磁盘命中会回填内存层。
+# - “无需缩放”（原图已小于目标尺寸）的判定结果只记在内存层，避免每次都解码一遍才发现无需渲染。
+# - 后台预热的 RAR/7z 原图同样只记在内存层，原图请求命中时直接返回。
+
+_MIMETYPE_SUFFIXES = {
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+    'image/jpeg': '.jpg',
+    'image/png': '.png',
+}
+_SUFFIX_MIMETYPES = {suffix: mimetype for mimetype, suffix in _MIMETYPE_SUFFIXES.items()}
+
+# 直通标记在内存预算中的名义占用，避免零长度条目永远不被淘汰
+_PASSTHROUGH_NOMINAL_BYTES = 64
+
+
+@dataclass(frozen=True)
+class RenderedImage:
+    """渲染结果；data 为空表示“无需缩放，直接返回原图”。"""
+
+    data: bytes
+    mimetype: str
+
+    @property
+    def passthrough(self) -> bool:
+        return not self.data
+
+    def __len__(self) -> int:
+        return len(self.data) if self.data else _PASSTHROUGH_NOMINAL_BYTES
+
+
+PASSTHROUGH = RenderedImage(data=b'', mimetype='')
+
+
+class RenderCache:
+    """渲染结果的两级缓存（线程安全，可在无应用上下文的后台线程中使用）。"""
+
+    def __init__(self, *, memory_budget_bytes: int, disk: Optional[DiskByteCache]):
+        self._memory = ByteBudgetLRU(memory_budget_bytes)
+        self._disk = disk
+        self._lock = threading.Lock()
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+
+    def configure(self, *, memory_budget_bytes: int, disk_budget_bytes: int, disk_max_age_s: int, disk_dir: str) -> None:
+        self._memory.configure(memory_budget_bytes)
+        if self._disk is None:
+            self._disk = DiskByteCache(disk_dir, budget_bytes=disk_budget_bytes, max_age_s=disk_max_age_s)
+        else:
+            self._disk.configure(base_dir=disk_dir, budget_bytes=disk_budget_bytes, max_age_s=disk_max_age_s)
+
+    def contains(self, key: str) -> bool:
+        """仅检查内存层是否已有结果（不影响 LRU 顺序与统计），用于跳过重复的预热。"""
+        return self._memory.peek(key)
+
+    def get(self, key: str, *, memory_only: bool = False, record: bool = True) -> Optional[RenderedImage]:
+        """读取缓存；record=False 时不计入命中统计（后台预热使用，避免拉低命中率）。"""
+        cached = self._memory.get(key)
+        if cached is not None:
+            if record:
+                with self._lock:
+                    self._memory_hits += 1
+            return cached
+
+        disk = self._disk
+        if disk is not None and not memory_only:
+            hit = disk.get(key)
+            if hit is not None:
+                data, suffix = hit
+                rendered = RenderedImage(data=data, mimetype=_SUFFIX_MIMETYPES.get(suffix, 'application/octet-stream'))
+                self._memory.put(key, rendered)
+                if record:
+                    with self._lock:
+                        self._disk_hits += 1
+                return rendered
+
+        if record:
+            with self._lock:
+                self._misses += 1
+        return None
+
+    def put(self, key: str, rendered: RenderedImage, *, persist: bool = True) -> None:
+        """写入缓存；persist=False 时只写内存层（例如预热的原图，落盘只会复制一份书库）。"""
+        self._memory.put(key, rendered)
+        with self._lock:
+            self._stores += 1
+        if not persist or rendered.passthrough or self._disk is None:
+            return
+        suffix = _MIMETYPE_SUFFIXES.get(rendered.mimetype)
+        if suffix is not None:
+            self._disk.put(key, rendered.data, suffix)
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            totals = {
+                'memory_hits': self._memory_hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'stores': self._stores,
+            }
+        lookups = totals['memory_hits'] + totals['disk_hits'] + totals['misses']
+        totals['hit_ratio'] = round((totals['memory_hits'] + totals['disk_hits']) / lookups, 4) if lookups else 0.0
+        totals['memory'] = self._memory.stats()
+        totals['disk'] = self._disk.stats() if self._disk is not None else None
+        return totals
+
+
+_render_cache = RenderCache(memory_budget_bytes=128 * 1024 * 1024, disk=None)
+
+
+def get_render_cache() -> RenderCache:
+    return _render_cache
+
+
+def is_render_cache_enabled() -> bool:
+    return get_bool_setting('reader.render_cache.enabled', default=True)
+
+
+def configure_render_cache_from_settings() -> RenderCache:
+    """按当前设置调整缓存预算（需要应用上下文；设置变更后下一次请求即生效）。"""
+    memory_mb = get_int_setting('reader.render_cache.memory_mb', default=128, min_value=0, max_value=8192)
+    disk_mb = get_int_setting('reader.render_cache.disk_mb', default=2048, min_value=0, max_value=1024 * 1024)
+    max_age_days = get_int_setting('reader.render_cache.max_age_days', default=30, min_value=0, max_value=3650)
+    _render_cache.configure(
+        memory_budget_bytes=memory_mb * 1024 * 1024,
+        disk_budget_bytes=disk_mb * 1024 * 1024,
+        disk_max_age_s=max_age_days * 86400,
+        disk_dir=current_app.config['RENDER_CACHE_PATH'],
+    )
+    return _render_cache
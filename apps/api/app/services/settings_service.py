@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import json
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from loguru import logger
 
@@ -25,10 +26,63 @@ DEFAULT_SETTINGS: Dict[str, str] = {
     'scan.cover.quality_start': '80',
     'scan.cover.quality_min': '10',
     'scan.cover.quality_step': '10',
+    'scan.cover.nice': '10',
+    'scan.cover.executor': 'thread',
+    'scan.cover.workers': '0',
+    'scan.cover.grayscale': '1',
+    # 页面尺寸（扫描结束后由后台任务读取图片头记录宽高；off 关闭）
+    'scan.page_geometry.mode': 'scan',
     # 封面缓存
     'cover.cache.shard_count': '256',
+    'cover.sizes': '[160,320]',
+    'cover.sizes.quality': '75',
+    'cover.store.backend': 'files',
+    'cover.store.pack_max_mb': '256',
+    'cover.store.compact_dead_ratio': '0.3',
     # 阅读：后端流式输出
     'reader.stream.chunk_kb': '512',
+    # 阅读：未压缩（STORED）Zip 页面直接按文件字节区间输出（支持 Range，服务器可用 sendfile 零拷贝）
+    'reader.stream.zero_copy': '1',
+    # 阅读：服务端渲染缓存（缩放后的页图，内存 LRU + instance/render_cache 磁盘缓存）
+    'reader.render_cache.enabled': '1',
+    'reader.render_cache.memory_mb': '128',
+    'reader.render_cache.disk_mb': '2048',
+    'reader.render_cache.max_age_days': '30',
+    # 阅读：渲染进程池（Pillow 缩放/编码在独立进程执行；workers=0 表示在请求线程内渲染）
+    'reader.render_pool.workers': '2',
+    'reader.render_pool.queue_depth': '16',
+    'reader.overload.max_concurrent': '4',
+    'reader.overload.interactive_reserve': '1',
+    'reader.overload.wait_ms': '800',
+    'reader.overload.policy': 'original',
+    'reader.overload.retry_after_s': '2',
+    'reader.render.grayscale': '1',
+    'reader.render.negotiate': '1',
+    'reader.render.negotiate.formats': 'avif,webp,jpeg',
+    'reader.preview.max_side_px': '200',
+    'reader.preview.quality': '30',
+    'reader.preview.format': 'jpeg',
+    'reader.preview.source_cache_mb': '32',
+    'reader.auto_size.mode': 'explicit',
+    'reader.auto_size.target_ms': '1500',
+    'reader.tiles.tile_size': '1024',
+    'reader.tiles.min_side_px': '4096',
+    # 阅读：RAR/CBR 首次阅读时在后台整本解压到 instance/rar_cache，完成后直接读文件（按书 LRU 淘汰；默认关闭）
+    'reader.rar_cache.enabled': '0',
+    'reader.rar_cache.disk_mb': '4096',
+    # 阅读：后台预热后续页（同一渲染参数；ahead=0 关闭）
+    'reader.prefetch.ahead': '3',
+    'reader.prefetch.workers': '2',
+    'reader.thumbnails.max_side': '160',
+    'reader.thumbnails.quality': '60',
+    'reader.thumbnails.lazy': '1',
+    'reader.thumbnails.idle_build': '0',
+    'reader.thumbnails.idle_batch': '50',
+    'reader.warm.enabled': '1',
+    'reader.warm.trigger_pages': '3',
+    'reader.warm.pages': '4',
+    'reader.warm.startup_books': '5',
+    'reader.warm.nice': '10',
     # 通用：界面与体验
     'ui.language': 'zh',
     'ui.library.view_mode': 'grid',
@@ -209,6 +263,10 @@ class ScanCoverSettings:
     quality_start: int
     quality_min: int
     quality_step: int
+    nice: int
+    grayscale: bool
+    executor: str
+    workers: int
 
 
 @dataclass(frozen=True)
@@ -219,6 +277,7 @@ class ScanSettings:
     cover_regenerate_missing: bool
     cancel_check_interval_ms: int
     cover: ScanCoverSettings
+    page_geometry_mode: str
 
 
 def get_scan_settings() -> ScanSettings:
@@ -228,6 +287,12 @@ def get_scan_settings() -> ScanSettings:
     raw_cover_mode = get_str_setting('scan.cover.mode', default='scan').strip().lower()
     cover_mode = raw_cover_mode if raw_cover_mode in {'scan', 'off'} else 'scan'
 
+    raw_page_geometry_mode = get_str_setting('scan.page_geometry.mode', default='scan').strip().lower()
+    page_geometry_mode = raw_page_geometry_mode if raw_page_geometry_mode in {'scan', 'off'} else 'scan'
+
+    raw_cover_executor = get_str_setting('scan.cover.executor', default='thread').strip().lower()
+    cover_executor = raw_cover_executor if raw_cover_executor in {'thread', 'process'} else 'thread'
+
     cover_regenerate_missing = get_bool_setting('scan.cover.regenerate_missing', default=True)
     cancel_check_interval_ms = get_int_setting(
         'scan.cancel_check.interval_ms',
@@ -247,7 +312,12 @@ def get_scan_settings() -> ScanSettings:
             quality_start=get_int_setting('scan.cover.quality_start', default=80, min_value=1, max_value=100),
             quality_min=get_int_setting('scan.cover.quality_min', default=10, min_value=1, max_value=100),
             quality_step=get_int_setting('scan.cover.quality_step', default=10, min_value=1, max_value=50),
+            nice=get_int_setting('scan.cover.nice', default=10, min_value=0, max_value=19),
+            grayscale=get_bool_setting('scan.cover.grayscale', default=True),
+            executor=cover_executor,
+            workers=get_int_setting('scan.cover.workers', default=0, min_value=0, max_value=128),
         ),
+        page_geometry_mode=page_geometry_mode,
     )
     if settings.cover.quality_min > settings.cover.quality_start:
         logger.warning(
@@ -267,7 +337,12 @@ def get_scan_settings() -> ScanSettings:
                 quality_start=settings.cover.quality_start,
                 quality_min=min(settings.cover.quality_min, settings.cover.quality_start),
                 quality_step=settings.cover.quality_step,
+                nice=settings.cover.nice,
+                grayscale=settings.cover.grayscale,
+                executor=settings.cover.executor,
+                workers=settings.cover.workers,
             ),
+            page_geometry_mode=settings.page_geometry_mode,
         )
     return settings
 
@@ -275,3 +350,14 @@ def get_scan_settings() -> ScanSettings:
 def get_cover_cache_shard_count() -> int:
     """封面缓存分片目录数量（用于避免单目录文件过多）。"""
     return get_int_setting('cover.cache.shard_count', default=256, min_value=1, max_value=4096)
+
+
+def get_cover_sizes() -> List[int]:
+    """封面缩略宽度（像素，升序去重）：列表/网格按显示尺寸选用，首次请求时由主封面生成。"""
+    try:
+        raw = json.loads(get_str_setting('cover.sizes', default='[160,320]'))
+    except (TypeError, ValueError):
+        raw = []
+    if not isinstance(raw, list):
+        return []
+    return sorted({int(value) for value in raw if isinstance(value, int) and 32 <= value <= 2000})
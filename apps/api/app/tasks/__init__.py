@@ -2,4 +2,6 @@
 
 from .scanner import start_scan_task
 from .rename import batch_rename_task, tag_file_change_task, tag_split_task 
-from .maintenance import check_integrity_task
+from .maintenance import check_integrity_task, compact_cover_packs_periodically, compact_cover_packs_task
+from .page_geometry import build_page_geometry_task
+from .thumbnails import build_thumbnail_pack_task, build_thumbnail_packs_task, build_thumbnail_packs_when_idle
@@ -5,11 +5,14 @@ import datetime
 import os
 from typing import Optional
 
+from huey import crontab
 from loguru import logger
 
 from .. import db, huey, create_app
 from ..infrastructure.archive_reader import get_archive_entries
 from ..models.manga import File, Task
+from ..services.cover_store_service import PackCoverStore, get_cover_store
+from ..services.settings_service import get_float_setting
 from ..services.task_service import fail_task, finish_task, is_task_cancelled, mark_task_running, update_task_progress
 
 
@@ -72,3 +75,51 @@ def check_integrity_task(task_db_id: Optional[int] = None) -> str:
             fail_task(task_record, error_message=f'完整性检查失败: {str(exc)}')
             return 'failed'
 
+
+def _compact_cover_store():
+    """压缩封面包；未使用封面包存储时返回 None（需要应用上下文）。"""
+    store = get_cover_store()
+    if not isinstance(store, PackCoverStore):
+        return None
+    ratio = get_float_setting('cover.store.compact_dead_ratio', default=0.3, min_value=0.05, max_value=1.0)
+    result = store.compact(min_dead_ratio=ratio)
+    logger.info(
+        '封面包压缩完成：候选 {} 个包，搬移 {} 个封面，删除 {} 个包，回收 {} 字节',
+        result['packs'],
+        result['moved'],
+        result['removed'],
+        result['reclaimed_bytes'],
+    )
+    return result
+
+
+@huey.task()
+def compact_cover_packs_task(task_db_id: Optional[int] = None) -> str:
+    """压缩封面包：死数据占比超过 cover.store.compact_dead_ratio 的已封存包，搬移有效封面后删除。"""
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+
+    with app.app_context():
+        task_record = db.session.get(Task, int(task_db_id)) if task_db_id else None
+        try:
+            mark_task_running(task_record, current_file='正在压缩封面包...', total_files=0, processed_files=0)
+            result = _compact_cover_store()
+            finish_task(task_record, status='completed')
+            return 'skipped' if result is None else 'completed'
+        except Exception as exc:
+            db.session.rollback()
+            logger.exception('封面包压缩失败: {}', exc)
+            fail_task(task_record, error_message=f'封面包压缩失败: {str(exc)}')
+            return 'failed'
+
+
+@huey.periodic_task(crontab(hour='4', minute='30'))
+def compact_cover_packs_periodically() -> str:
+    """每天凌晨压缩一次封面包（仅封面包存储，不写任务记录）。"""
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+
+    with app.app_context():
+        try:
+            return 'skipped' if _compact_cover_store() is None else 'completed'
+        except Exception as exc:
+            logger.exception('封面包压缩失败: {}', exc)
+            return 'failed'
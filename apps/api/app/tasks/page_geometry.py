@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+
+from loguru import logger
+
+from .. import db, huey, create_app
+from ..infrastructure.archive_reader import close_archive_handles
+from ..models.manga import Task
+from ..services.page_geometry_service import PageSize, find_files_without_geometry, probe_page_sizes, save_page_geometry
+from ..services.settings_service import get_scan_settings
+from ..services.task_service import fail_task, finish_task, is_task_cancelled, mark_task_running, update_task_progress
+
+
+def _probe_book(file_path: str) -> List[PageSize]:
+    # 任务进程读完一本即关闭其句柄，不在句柄池中滞留（Windows 上会阻止重命名）
+    try:
+        return probe_page_sizes(file_path)
+    finally:
+        close_archive_handles(file_path)
+
+
+@huey.task()
+def build_page_geometry_task(library_path_id: Optional[int] = None, task_db_id: Optional[int] = None) -> str:
+    """
+    页面尺寸任务：
+    - 为缺少（或签名已过期）页面尺寸的文件读取每页图片头，记录宽高
+    - 线程池只负责读取压缩包；数据库写入统一在主线程完成
+    """
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+
+    with app.app_context():
+        task_record = db.session.get(Task, int(task_db_id)) if task_db_id else None
+        try:
+            pending = [
+                (int(record.id), str(record.file_path), int(record.file_size), int(record.file_mtime))
+                for record in find_files_without_geometry(library_path_id)
+            ]
+            total = len(pending)
+            mark_task_running(task_record, current_file='开始读取页面尺寸...', total_files=total, processed_files=0)
+
+            max_workers = max(1, min(get_scan_settings().max_workers, 8))
+            processed = 0
+            failed = 0
+            batch_size = 50
+
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                future_map = {
+                    executor.submit(_probe_book, file_path): (file_id, file_path, file_size, file_mtime)
+                    for file_id, file_path, file_size, file_mtime in pending
+                }
+                for future in as_completed(future_map):
+                    file_id, file_path, file_size, file_mtime = future_map[future]
+
+                    if is_task_cancelled(task_db_id):
+                        for other in future_map:
+                            other.cancel()
+                        db.session.commit()
+                        finish_task(task_record, status='cancelled', message='用户已取消')
+                        return 'cancelled'
+
+                    processed += 1
+                    try:
+                        sizes = future.result()
+                    except Exception as exc:
+                        failed += 1
+                        logger.warning('读取页面尺寸失败: {} | 错误: {}', os.path.basename(file_path), exc)
+                        sizes = None
+
+                    if sizes is not None:
+                        save_page_geometry(file_id, file_size=file_size, file_mtime=file_mtime, sizes=sizes)
+
+                    if processed % batch_size == 0 or processed == total:
+                        db.session.commit()
+                        update_task_progress(
+                            task_record,
+                            processed_files=processed,
+                            total_files=total,
+                            current_file=file_path,
+                        )
+
+            db.session.commit()
+            update_task_progress(task_record, processed_files=processed, total_files=total, current_file='')
+            logger.info('页面尺寸记录完成：共 {} 个文件，失败 {} 个', total, failed)
+            finish_task(task_record, status='completed')
+            return 'completed'
+        except Exception as exc:
+            db.session.rollback()
+            logger.exception('页面尺寸任务失败: {}', exc)
+            fail_task(task_record, error_message=f'页面尺寸任务失败: {str(exc)}')
+            return 'failed'
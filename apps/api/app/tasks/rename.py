@@ -5,12 +5,14 @@ import datetime
 import os
 import re
 import shutil
+import time
 from typing import List, Optional, Sequence
 
 from loguru import logger
 from sqlalchemy import or_ as sa_or
 
 from .. import create_app, db, huey
+from ..infrastructure.archive_reader import ARCHIVE_HANDLE_IDLE_TIMEOUT_S, close_archive_handles
 from ..models.manga import File, Tag, TagAlias, Task
 
 
@@ -47,16 +49,12 @@ def _is_within_dir(path: str, root_dir: str) -> bool:
     return path_norm.startswith(root_norm.rstrip(os.sep) + os.sep)
 
 
-def _rename_path(old_path: str, new_path: str) -> None:
-    if old_path == new_path:
-        return
+# 文件被其他进程占用（Windows 上 API 进程阅读中的句柄）时的重试次数；等待取句柄池清理线程关闭空闲句柄的最长时间
+_RENAME_RETRIES = 2
+_RENAME_RETRY_WAIT_S = ARCHIVE_HANDLE_IDLE_TIMEOUT_S * 1.5 + 2.0
 
-    os.makedirs(os.path.dirname(new_path), exist_ok=True)
-
-    same_path_ignore_case = os.path.normcase(old_path) == os.path.normcase(new_path)
-    if not same_path_ignore_case and os.path.exists(new_path):
-        raise ValueError('目标文件已存在，无法重命名')
 
+def _move_path(old_path: str, new_path: str, *, same_path_ignore_case: bool) -> None:
     try:
         if same_path_ignore_case and os.path.exists(new_path):
             temp_path = _build_safe_temp_path(old_path)
@@ -64,6 +62,9 @@ def _rename_path(old_path: str, new_path: str) -> None:
             os.rename(temp_path, new_path)
             return
         os.rename(old_path, new_path)
+    except PermissionError:
+        # 文件被占用：shutil.move 会先复制再删除源文件，删除失败时留下两份，交给调用方重试
+        raise
     except OSError as exc:
         # 跨盘移动或其他导致 os.rename 失败的情况，退化为 shutil.move
         try:
@@ -72,6 +73,30 @@ def _rename_path(old_path: str, new_path: str) -> None:
             raise exc
 
 
+def _rename_path(old_path: str, new_path: str) -> None:
+    if old_path == new_path:
+        return
+
+    os.makedirs(os.path.dirname(new_path), exist_ok=True)
+
+    same_path_ignore_case = os.path.normcase(old_path) == os.path.normcase(new_path)
+    if not same_path_ignore_case and os.path.exists(new_path):
+        raise ValueError('目标文件已存在，无法重命名')
+
+    for attempt in range(_RENAME_RETRIES + 1):
+        # 任务进程内（封面/缩略图生成）可能仍持有该文件的句柄，Windows 上会阻止改名
+        close_archive_handles(old_path)
+        try:
+            _move_path(old_path, new_path, same_path_ignore_case=same_path_ignore_case)
+            return
+        except PermissionError as exc:
+            # 其他进程（API 进程的阅读句柄池）持有的句柄只能等其空闲超时关闭
+            if attempt >= _RENAME_RETRIES:
+                raise
+            logger.warning('文件被占用，{} 秒后重试重命名: {} | 错误: {}', int(_RENAME_RETRY_WAIT_S), old_path, exc)
+            time.sleep(_RENAME_RETRY_WAIT_S)
+
+
 def _extract_filename_tags(filename: str) -> List[str]:
     return re.findall(r'\[([^\]]+)\]', filename)
 
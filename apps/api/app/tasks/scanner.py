@@ -1,22 +1,34 @@
 import datetime
 import hashlib
+import multiprocessing
 import os
 import re
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
-from typing import Iterable, List, Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 
-from flask import current_app
 from loguru import logger
 
 from .. import db, huey
 from .. import create_app
-from ..infrastructure.archive_reader import SUPPORTED_ARCHIVE_EXTENSIONS, get_archive_entries
-from ..models.manga import File, LibraryPath, Tag, TagAlias, Task
-from ..services.cover_service import CoverPathConfig, generate_cover, get_cover_path
+from ..infrastructure.archive_reader import (
+    SUPPORTED_ARCHIVE_EXTENSIONS,
+    ArchiveEntry,
+    close_archive_handles,
+    get_archive_entries,
+    list_archive_entries,
+)
+from ..infrastructure.thread_priority import lower_process_priority, lower_thread_priority
+from ..models.manga import File, FilePageIndex, LibraryPath, Tag, TagAlias, Task
+from ..services.cover_service import generate_cover
+from ..services.cover_store_service import CoverStore, get_cover_store
+from ..services.page_index_service import save_page_index
 from ..services.path_service import normalize_file_path
-from ..services.settings_service import get_cover_cache_shard_count, get_scan_settings, ScanSettings
+from ..services.settings_service import get_scan_settings, ScanCoverSettings, ScanSettings
+from ..services.task_service import create_task_record
+from .page_geometry import build_page_geometry_task
 
 
 @dataclass(frozen=True)
@@ -37,6 +49,111 @@ class CoverJob:
     force: bool
 
 
+def _generate_cover_job(job: CoverJob, store: CoverStore, cover: ScanCoverSettings) -> bool:
+    """
+    封面工作函数：模块级且参数均可 pickle，线程池与进程池共用。
+
+    读取封面页经过当前进程的句柄池，生成后立即关闭该书的句柄，扫描结束后任务进程不再占用压缩包。
+    """
+    try:
+        return _generate_cover(job, store, cover)
+    finally:
+        close_archive_handles(job.file_path)
+
+
+def _generate_cover(job: CoverJob, store: CoverStore, cover: ScanCoverSettings) -> bool:
+    return generate_cover(
+        file_id=job.file_id,
+        file_path=job.file_path,
+        store=store,
+        max_width=cover.max_width,
+        target_kb=cover.target_kb,
+        quality_start=cover.quality_start,
+        quality_min=cover.quality_min,
+        quality_step=cover.quality_step,
+        force=job.force,
+        grayscale=cover.grayscale,
+    )
+
+
+def _create_cover_thread_executor(cover: ScanCoverSettings, max_workers: int) -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=cover.workers or max_workers,
+        initializer=lower_thread_priority,
+        initargs=(cover.nice,),
+    )
+
+
+def _create_cover_executor(cover: ScanCoverSettings, max_workers: int) -> Executor:
+    """
+    封面生成执行器：
+    - thread：线程池，并发数默认沿用 scan.max_workers。
+    - process：进程池，缩放与 WebP 编码不再受 GIL 限制；并发数默认取 CPU 核数（不超过 scan.max_workers）。
+      子进程使用 forkserver/spawn 启动，不继承扫描线程持有的数据库连接与锁。
+      子进程在首次提交时才启动，启动失败或中途崩溃由 _iter_cover_results 回退到线程池。
+    """
+    if cover.executor == 'process':
+        workers = cover.workers or min(max_workers, os.cpu_count() or 1)
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=lower_process_priority,
+            initargs=(cover.nice,),
+        )
+    return _create_cover_thread_executor(cover, max_workers)
+
+
+def _iter_cover_results(
+    jobs: List[CoverJob],
+    store: CoverStore,
+    cover: ScanCoverSettings,
+    max_workers: int,
+) -> Iterator[Tuple[CoverJob, bool]]:
+    """
+    按完成顺序产出 (封面任务, 是否成功)。
+
+    进程池不可用（子进程无法启动或中途崩溃，提交或取结果时抛出 BrokenProcessPool）时，
+    尚未得到结果的任务改由线程池重新执行；调用方中途停止迭代时丢弃尚未开始的任务，只等待执行中的任务。
+    """
+    executor = _create_cover_executor(cover, max_workers)
+    pending = list(jobs)
+    try:
+        while pending:
+            future_map = {}
+            try:
+                for job in pending:
+                    future_map[executor.submit(_generate_cover_job, job, store, cover)] = job
+            except BrokenProcessPool:
+                pass
+            retry = pending[len(future_map):]
+
+            for future in as_completed(future_map):
+                job = future_map[future]
+                try:
+                    ok = bool(future.result())
+                except BrokenProcessPool:
+                    retry.append(job)
+                    continue
+                except Exception as exc:
+                    logger.warning('封面生成异常: {} | 错误: {}', os.path.basename(job.file_path), exc)
+                    ok = False
+                yield job, ok
+
+            if not retry:
+                return
+            logger.warning('封面进程池不可用，剩余 {} 个封面改用线程池生成', len(retry))
+            executor.shutdown(wait=False, cancel_futures=True)
+            executor = _create_cover_thread_executor(cover, max_workers)
+            pending = retry
+    except GeneratorExit:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    finally:
+        executor.shutdown(wait=True)
+
+
 def _normalize_path(path: str) -> str:
     """归一化路径，避免同一文件出现多种写法。"""
     return normalize_file_path(path)
@@ -89,22 +206,64 @@ def _calculate_sha256(file_path: str, *, chunk_size: int = 1024 * 1024) -> Optio
         return None
 
 
-def _analyze_archive(file_path: str, scan_settings: ScanSettings) -> Tuple[int, Optional[str], List[str]]:
+def _analyze_archive(file_path: str, scan_settings: ScanSettings) -> Tuple[List[ArchiveEntry], Optional[str], List[str]]:
     """
     轻量分析：
-    - 页数：仅读取压缩包目录索引（不解压整本）。
+    - 页索引：仅读取压缩包目录索引（不解压整本），由主线程持久化到数据库。
     - 内容哈希：按配置可选（需要读完整文件）。
     - 标签：从文件名提取。
     """
     entries = get_archive_entries(file_path)
-    total_pages = len(entries)
 
     content_sha256: Optional[str] = None
     if scan_settings.hash_mode == 'full':
         content_sha256 = _calculate_sha256(file_path)
 
     tags = _extract_tags_from_filename(file_path)
-    return total_pages, content_sha256, tags
+    return entries, content_sha256, tags
+
+
+def _find_records_without_page_index(records: List[File]) -> List[File]:
+    """找出页索引缺失或签名过期的记录（用于为未变更文件补建索引）。"""
+    if not records:
+        return []
+    indexed = {}
+    for chunk in _chunked([int(record.id) for record in records], 500):
+        rows = db.session.query(
+            FilePageIndex.file_id,
+            FilePageIndex.file_size,
+            FilePageIndex.file_mtime,
+        ).filter(FilePageIndex.file_id.in_(chunk))
+        for file_id, file_size, file_mtime in rows:
+            indexed[int(file_id)] = (file_size, file_mtime)
+    return [
+        record
+        for record in records
+        if indexed.get(int(record.id)) != (record.file_size, record.file_mtime)
+    ]
+
+
+def _enqueue_page_geometry_task(library_path: LibraryPath) -> None:
+    """扫描完成后提交页面尺寸任务（只处理缺少或过期尺寸的文件，失败不影响扫描结果）。"""
+    task_record = create_task_record(
+        name=f'记录页面尺寸: {library_path.path}',
+        task_type='page_geometry',
+        status='pending',
+        target_path=library_path.path,
+        target_library_path_id=library_path.id,
+        current_file='准备中...',
+    )
+    try:
+        task = build_page_geometry_task(library_path_id=library_path.id, task_db_id=task_record.id)
+        task_record.task_id = task.id
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        logger.warning('提交页面尺寸任务失败: {} | 错误: {}', library_path.path, exc)
+        task_record.status = 'failed'
+        task_record.error_message = f'提交页面尺寸任务失败: {exc}'
+        task_record.finished_at = datetime.datetime.utcnow()
+        db.session.commit()
 
 
 def _is_cancelled(task_db_id: Optional[int]) -> bool:
@@ -201,12 +360,7 @@ def start_scan_task(library_path_id: int, task_db_id: Optional[int] = None) -> s
                 return tags_by_id.get(int(tag_id))
             return None
 
-        cover_config = None
-        if cover_enabled:
-            cover_config = CoverPathConfig(
-                base_dir=current_app.config['COVER_CACHE_PATH'],
-                shard_count=get_cover_cache_shard_count(),
-            )
+        cover_store = get_cover_store() if cover_enabled else None
 
         try:
             discovered = list(_iter_archives(library_path.path))
@@ -294,10 +448,11 @@ def start_scan_task(library_path_id: int, task_db_id: Optional[int] = None) -> s
 
             cover_jobs: List[CoverJob] = []
             expected_cover_units = 0
-            if cover_enabled and cover_config and scan_settings.cover_regenerate_missing and unchanged_records:
+            if cover_enabled and cover_store and scan_settings.cover_regenerate_missing and unchanged_records:
+                # 按批检查封面是否存在（封面包只查索引，不逐个访问文件系统）
+                existing_covers = cover_store.existing(record.id for record in unchanged_records)
                 for record in unchanged_records:
-                    cover_path = get_cover_path(cover_config, record.id)
-                    if not os.path.exists(cover_path):
+                    if record.id not in existing_covers:
                         cover_jobs.append(CoverJob(file_id=record.id, file_path=record.file_path, force=True))
                 expected_cover_units += len(cover_jobs)
 
@@ -350,7 +505,8 @@ def start_scan_task(library_path_id: int, task_db_id: Optional[int] = None) -> s
                         return msg
 
                     try:
-                        total_pages, content_sha256, tag_names = future.result()
+                        entries, content_sha256, tag_names = future.result()
+                        total_pages = len(entries)
                     except Exception as exc:
                         analysis_errors += 1
                         processed += 1
@@ -412,6 +568,12 @@ def start_scan_task(library_path_id: int, task_db_id: Optional[int] = None) -> s
                             db.session.add(file_record)
 
                         db.session.flush()
+                        save_page_index(
+                            file_record.id,
+                            file_size=item.file_size,
+                            file_mtime=item.file_mtime,
+                            entries=entries,
+                        )
 
                         if tag_names:
                             for tag_name in tag_names:
@@ -423,7 +585,7 @@ def start_scan_task(library_path_id: int, task_db_id: Optional[int] = None) -> s
                         done_units += 1
                         update_progress(f'已处理: {os.path.basename(item.file_path)}')
 
-                        if cover_enabled and cover_config:
+                        if cover_enabled and cover_store:
                             cover_jobs.append(CoverJob(file_id=file_record.id, file_path=file_record.file_path, force=True))
 
                         if processed % 10 == 0 or processed == total_files:
@@ -444,29 +606,19 @@ def start_scan_task(library_path_id: int, task_db_id: Optional[int] = None) -> s
                         if processed % 10 == 0 or processed == total_files:
                             db.session.commit()
 
-            # 统一生成封面（避免在分析阶段反复打开压缩包）
-            if cover_enabled and cover_config and cover_jobs:
-                update_progress('开始生成封面...')
-                cover_success_ids: List[int] = []
+            # 为未变更但缺少页索引的文件补建索引（只读目录，不计入进度单元）
+            index_backfill = _find_records_without_page_index(unchanged_records)
+            if index_backfill:
+                update_progress(f'补建页索引: {len(index_backfill)} 个')
+                db.session.commit()
+                backfilled = 0
                 with ThreadPoolExecutor(max_workers=max_workers) as executor:
                     future_map = {
-                        executor.submit(
-                            generate_cover,
-                            file_id=job.file_id,
-                            file_path=job.file_path,
-                            config=cover_config,
-                            max_width=scan_settings.cover.max_width,
-                            target_kb=scan_settings.cover.target_kb,
-                            quality_start=scan_settings.cover.quality_start,
-                            quality_min=scan_settings.cover.quality_min,
-                            quality_step=scan_settings.cover.quality_step,
-                            force=job.force,
-                        ): job
-                        for job in cover_jobs
+                        executor.submit(list_archive_entries, record.file_path): record
+                        for record in index_backfill
                     }
-
                     for future in as_completed(future_map):
-                        job = future_map[future]
+                        record = future_map[future]
 
                         if is_cancelled():
                             msg = '扫描已取消。'
@@ -475,35 +627,60 @@ def start_scan_task(library_path_id: int, task_db_id: Optional[int] = None) -> s
                                 db.session.commit()
                             return msg
 
-                        ok = False
                         try:
-                            ok = bool(future.result())
+                            entries = future.result()
                         except Exception as exc:
-                            logger.warning('封面生成异常: {} | 错误: {}', os.path.basename(job.file_path), exc)
-                            ok = False
+                            logger.warning('补建页索引失败: {} | 错误: {}', os.path.basename(record.file_path), exc)
+                            continue
+
+                        save_page_index(
+                            record.id,
+                            file_size=record.file_size,
+                            file_mtime=record.file_mtime,
+                            entries=entries,
+                        )
+                        backfilled += 1
+                        if backfilled % 50 == 0:
+                            db.session.commit()
+                db.session.commit()
 
-                        done_units += 1
-                        if not ok:
-                            cover_errors += 1
-                            error_msg = f'封面生成失败: {os.path.basename(job.file_path)}'
-                            update_progress(error_msg)
-                        else:
-                            cover_success_ids.append(int(job.file_id))
-                            update_progress(f'封面已生成: {os.path.basename(job.file_path)}')
-
-                        if cover_success_ids and (len(cover_success_ids) >= 50 or done_units == work_total_units):
-                            now_ts = int(time.time())
-                            for chunk in _chunked(cover_success_ids, 500):
-                                (
-                                    File.query.filter(File.id.in_(chunk)).update(
-                                        {'cover_updated_at': now_ts},
-                                        synchronize_session=False,
-                                    )
+            # 统一生成封面（避免在分析阶段反复打开压缩包）
+            if cover_enabled and cover_store and cover_jobs:
+                update_progress('开始生成封面...')
+                cover_success_ids: List[int] = []
+                cover_results = _iter_cover_results(cover_jobs, cover_store, scan_settings.cover, max_workers)
+                for job, ok in cover_results:
+                    if is_cancelled():
+                        # 丢弃尚未开始的封面任务，只等待执行中的任务结束
+                        cover_results.close()
+                        msg = '扫描已取消。'
+                        if task_record:
+                            task_record.finished_at = datetime.datetime.utcnow()
+                            db.session.commit()
+                        return msg
+
+                    done_units += 1
+                    if not ok:
+                        cover_errors += 1
+                        error_msg = f'封面生成失败: {os.path.basename(job.file_path)}'
+                        update_progress(error_msg)
+                    else:
+                        cover_success_ids.append(int(job.file_id))
+                        update_progress(f'封面已生成: {os.path.basename(job.file_path)}')
+
+                    if cover_success_ids and (len(cover_success_ids) >= 50 or done_units == work_total_units):
+                        now_ts = int(time.time())
+                        for chunk in _chunked(cover_success_ids, 500):
+                            (
+                                File.query.filter(File.id.in_(chunk)).update(
+                                    {'cover_updated_at': now_ts},
+                                    synchronize_session=False,
                                 )
-                            cover_success_ids.clear()
+                            )
+                        cover_success_ids.clear()
 
-                        if task_record and (done_units % 20 == 0 or done_units == work_total_units):
-                            db.session.commit()
+                    if task_record and (done_units % 20 == 0 or done_units == work_total_units):
+                        db.session.commit()
 
             missing_files_count = File.query.filter_by(library_path_id=library_path.id, is_missing=True).count()
             logger.info(
@@ -524,6 +701,9 @@ def start_scan_task(library_path_id: int, task_db_id: Optional[int] = None) -> s
                 task_record.finished_at = datetime.datetime.utcnow()
                 db.session.commit()
 
+            if scan_settings.page_geometry_mode == 'scan':
+                _enqueue_page_geometry_task(library_path)
+
             return f'扫描完成: {library_path.path}'
 
         except Exception as exc:
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from flask import current_app
+from huey import crontab
+from loguru import logger
+
+from .. import db, huey, create_app
+from ..infrastructure.archive_reader import close_archive_handles
+from ..infrastructure.thread_priority import lower_thread_priority
+from ..models.manga import File, Task
+from ..services.page_geometry_service import save_page_tones
+from ..services.page_thumbnail_service import (
+    ThumbnailPackResult,
+    ThumbnailPathConfig,
+    ThumbnailSettings,
+    build_thumbnail_pack,
+    find_files_without_thumbnails,
+    get_thumbnail_settings,
+    load_thumbnail_index,
+    record_thumbnail_pack,
+)
+from ..services.settings_service import get_bool_setting, get_cover_cache_shard_count, get_int_setting, get_scan_settings
+from ..services.task_service import create_task_record, fail_task, finish_task, is_task_cancelled, mark_task_running, update_task_progress
+
+
+def _thumbnail_path_config() -> ThumbnailPathConfig:
+    return ThumbnailPathConfig(base_dir=current_app.config['THUMBNAIL_PACK_PATH'], shard_count=get_cover_cache_shard_count())
+
+
+def _save_thumbnail_result(file_id: int, result: ThumbnailPackResult, settings: ThumbnailSettings) -> None:
+    """记录已生成的缩略图包，并把顺带得到的灰度判定（及页面尺寸）写入页面尺寸表，阅读渲染时作为 gray_hint。"""
+    try:
+        record_thumbnail_pack(
+            file_id,
+            file_size=result.source_size,
+            file_mtime=result.source_mtime,
+            max_side=settings.max_side,
+            page_count=len(result.sizes),
+        )
+        save_page_tones(file_id, file_size=result.source_size, file_mtime=result.source_mtime, sizes=result.sizes, tones=result.tones)
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        logger.warning('保存缩略图包记录失败: {} | 错误: {}', file_id, exc)
+
+
+def _record_existing_pack(record: File, config: ThumbnailPathConfig, settings: ThumbnailSettings) -> bool:
+    """包文件已存在且有效（例如记录表建立前生成的包）时只补记录，不重新生成。"""
+    loaded = load_thumbnail_index(record, config, settings)
+    if loaded is None:
+        return False
+    index = loaded[1]
+    try:
+        record_thumbnail_pack(
+            int(record.id),
+            file_size=index.source_size,
+            file_mtime=index.source_mtime,
+            max_side=index.max_side,
+            page_count=len(index.entries),
+        )
+        db.session.commit()
+    except Exception as exc:
+        db.session.rollback()
+        logger.warning('保存缩略图包记录失败: {} | 错误: {}', record.id, exc)
+    return True
+
+
+def _build_pack(file_id: int, file_path: str, *, config: ThumbnailPathConfig, settings: ThumbnailSettings) -> Optional[ThumbnailPackResult]:
+    # 任务进程读完一本即关闭其句柄与 7z 解压会话，不在句柄池中滞留（Windows 上会阻止重命名）
+    try:
+        return build_thumbnail_pack(file_id, file_path, config=config, settings=settings)
+    finally:
+        close_archive_handles(file_path)
+
+
+def _new_executor() -> ThreadPoolExecutor:
+    # 缩略图生成在单个低优先级线程中执行，不长期改变 Huey 工作线程自身的优先级
+    return ThreadPoolExecutor(max_workers=1, initializer=lower_thread_priority, initargs=(get_scan_settings().cover.nice,))
+
+
+@huey.task()
+def build_thumbnail_pack_task(file_id: int) -> str:
+    """按需生成单本书的缩略图包（阅读进度更新或 POST 缩略图接口时提交，不写任务记录）。"""
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+
+    with app.app_context():
+        record = db.session.get(File, int(file_id))
+        if record is None or record.is_missing:
+            return 'missing'
+        config = _thumbnail_path_config()
+        settings = get_thumbnail_settings()
+        if _record_existing_pack(record, config, settings):
+            return 'exists'
+        with _new_executor() as executor:
+            result = executor.submit(_build_pack, int(record.id), str(record.file_path), config=config, settings=settings).result()
+        if result is None:
+            logger.warning('生成缩略图包失败: {}', record.file_path)
+            return 'failed'
+        _save_thumbnail_result(int(record.id), result, settings)
+        logger.info('缩略图包已生成: {} | {} 页', os.path.basename(record.file_path), result.count)
+        return 'completed'
+
+
+def _run_thumbnail_batch(task_record: Optional[Task], task_db_id: Optional[int], files) -> str:
+    config = _thumbnail_path_config()
+    settings = get_thumbnail_settings()
+    total = len(files)
+    mark_task_running(task_record, current_file='开始生成页面缩略图...', total_files=total, processed_files=0)
+
+    failed = 0
+    with _new_executor() as executor:
+        for processed, record in enumerate(files, start=1):
+            if is_task_cancelled(task_db_id):
+                finish_task(task_record, status='cancelled', message='用户已取消')
+                return 'cancelled'
+            file_id, file_path = int(record.id), str(record.file_path)
+            if _record_existing_pack(record, config, settings):
+                update_task_progress(task_record, processed_files=processed, total_files=total, current_file=file_path)
+                continue
+            try:
+                result = executor.submit(_build_pack, file_id, file_path, config=config, settings=settings).result()
+            except Exception as exc:
+                result = None
+                logger.warning('生成缩略图包失败: {} | 错误: {}', os.path.basename(file_path), exc)
+            if result is None:
+                failed += 1
+            else:
+                _save_thumbnail_result(file_id, result, settings)
+            update_task_progress(task_record, processed_files=processed, total_files=total, current_file=file_path)
+
+    logger.info('页面缩略图生成完成：共 {} 个文件，失败 {} 个', total, failed)
+    finish_task(task_record, status='completed')
+    return 'completed'
+
+
+@huey.task()
+def build_thumbnail_packs_task(library_path_id: Optional[int] = None, task_db_id: Optional[int] = None) -> str:
+    """批量生成缺少（或已过期）缩略图包的书，最近阅读的优先；每本顺序读取一遍。"""
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+
+    with app.app_context():
+        task_record = db.session.get(Task, int(task_db_id)) if task_db_id else None
+        try:
+            files = find_files_without_thumbnails(get_thumbnail_settings(), library_path_id=library_path_id)
+            return _run_thumbnail_batch(task_record, task_db_id, files)
+        except Exception as exc:
+            db.session.rollback()
+            logger.exception('页面缩略图任务失败: {}', exc)
+            fail_task(task_record, error_message=f'页面缩略图任务失败: {str(exc)}')
+            return 'failed'
+
+
+@huey.periodic_task(crontab(minute='*/30'))
+def build_thumbnail_packs_when_idle() -> str:
+    """空闲时（没有进行中的任务）补齐一批缩略图包，每轮最多 reader.thumbnails.idle_batch 本。"""
+    app = create_app(os.getenv('FLASK_CONFIG') or 'default')
+
+    with app.app_context():
+        if not get_bool_setting('reader.thumbnails.idle_build', default=False):
+            return 'disabled'
+        if db.session.query(Task.id).filter(Task.status.in_(['pending', 'running'])).first() is not None:
+            return 'busy'
+        batch = get_int_setting('reader.thumbnails.idle_batch', default=50, min_value=1, max_value=1000)
+        files = find_files_without_thumbnails(get_thumbnail_settings(), limit=batch)
+        if not files:
+            return 'idle'
+
+        task_record = create_task_record(name='生成页面缩略图（空闲）', task_type='thumbnails', status='pending', current_file='准备中...')
+        try:
+            return _run_thumbnail_batch(task_record, task_record.id, files)
+        except Exception as exc:
+            db.session.rollback()
+            logger.exception('页面缩略图任务失败: {}', exc)
+            fail_task(task_record, error_message=f'页面缩略图任务失败: {str(exc)}')
+            return 'failed'
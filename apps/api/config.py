@@ -18,6 +18,14 @@ class Config:
     }
     # Path for storing generated cover thumbnails
     COVER_CACHE_PATH = os.path.join(INSTANCE_PATH, 'covers')
+    # Path for cover pack files and their index (cover.store.backend=pack)
+    COVER_PACK_PATH = os.path.join(INSTANCE_PATH, 'cover_packs')
+    # Path for the on-disk cache of downscaled reader pages
+    RENDER_CACHE_PATH = os.path.join(INSTANCE_PATH, 'render_cache')
+    # Path for whole-book RAR extractions served to the reader
+    RAR_EXTRACT_CACHE_PATH = os.path.join(INSTANCE_PATH, 'rar_cache')
+    # Path for per-book page thumbnail packs
+    THUMBNAIL_PACK_PATH = os.path.join(INSTANCE_PATH, 'thumbnails')
     # Path for storing database backups
     BACKUP_PATH = os.path.join(INSTANCE_PATH, 'backups')
     
@@ -25,6 +33,14 @@ class Config:
     def init_app(app):
         # Create the cover cache directory if it doesn't exist
         os.makedirs(app.config['COVER_CACHE_PATH'], exist_ok=True)
+        # Create the cover pack directory (packs and the index are created on first write)
+        os.makedirs(app.config['COVER_PACK_PATH'], exist_ok=True)
+        # Create the rendered-page cache directory (the cache itself never creates directories)
+        os.makedirs(app.config['RENDER_CACHE_PATH'], exist_ok=True)
+        # Create the RAR extraction cache directory (books are extracted into it while reading)
+        os.makedirs(app.config['RAR_EXTRACT_CACHE_PATH'], exist_ok=True)
+        # Create the thumbnail pack directory (packs are written by background tasks)
+        os.makedirs(app.config['THUMBNAIL_PACK_PATH'], exist_ok=True)
 
 
 class DevelopmentConfig(Config):
@@ -4,7 +4,7 @@ from flask_migrate import Migrate
 from sqlalchemy import text
 from app import create_app, db, huey
 from config import INSTANCE_PATH
-from app.models.manga import File, Tag, TagType, TagAlias, FileTagMap, Bookmark, Like, Task
+from app.models.manga import File, FilePageGeometry, FilePageIndex, Tag, TagType, TagAlias, FileTagMap, Bookmark, Like, Task
 
 # 确保 instance 目录存在
 os.makedirs(INSTANCE_PATH, exist_ok=True)
@@ -50,12 +50,15 @@ with app.app_context():
                 DB_SCHEMA_VERSION,
             )
             _reset_sqlite_database(DB_SCHEMA_VERSION)
+        else:
+            # 新增表不属于破坏性变更：create_all 只会补建缺失的表，不影响已有数据。
+            db.create_all()
     else:
         db.create_all()
 
 @app.shell_context_processor
 def make_shell_context():
-    return dict(db=db, File=File, Tag=Tag, TagType=TagType, TagAlias=TagAlias, 
+    return dict(db=db, File=File, FilePageIndex=FilePageIndex, FilePageGeometry=FilePageGeometry, Tag=Tag, TagType=TagType, TagAlias=TagAlias, 
                 FileTagMap=FileTagMap, Bookmark=Bookmark, Like=Like, Task=Task)
 
 @app.cli.command()
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from app.infrastructure.archive_pool import ArchiveHandlePool
+
+
+class _FakeArchive:
+    def __init__(self, path):
+        self.path = path
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ArchiveHandlePoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = self._make_file('a.zip')
+        self.opened = []
+        self.pool = ArchiveHandlePool(self._open, max_handles=2, idle_timeout_s=60.0)
+
+    def tearDown(self):
+        self.pool.close_all()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _make_file(self, name):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'wb') as handle:
+            handle.write(b'x')
+        return path
+
+    def _open(self, path):
+        archive = _FakeArchive(path)
+        self.opened.append(archive)
+        return archive
+
+    def test_lease_reuses_idle_handle(self):
+        with self.pool.lease(self.path) as first:
+            pass
+        with self.pool.lease(self.path) as second:
+            pass
+        self.assertIs(first, second)
+        self.assertFalse(first.closed)
+        stats = self.pool.stats()
+        self.assertEqual(stats['opens'], 1)
+        self.assertEqual(stats['reuses'], 1)
+        self.assertEqual(stats['idle'], 1)
+
+    def test_nested_leases_get_separate_handles(self):
+        with self.pool.lease(self.path) as first, self.pool.lease(self.path) as second:
+            self.assertIsNot(first, second)
+        self.assertEqual(self.pool.stats()['idle'], 2)
+
+    def test_exception_closes_handle(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.lease(self.path) as archive:
+                raise RuntimeError('broken')
+        self.assertTrue(archive.closed)
+        self.assertEqual(self.pool.stats()['open'], 0)
+
+    def test_full_pool_opens_unpooled_handle(self):
+        with self.pool.lease(self.path), self.pool.lease(self.path):
+            with self.pool.lease(self.path) as extra:
+                self.assertEqual(self.pool.stats()['open'], 2)
+            self.assertTrue(extra.closed)
+        self.assertEqual(self.pool.stats()['open'], 2)
+
+    def test_lru_eviction_when_capacity_reached(self):
+        other = self._make_file('b.zip')
+        third = self._make_file('c.zip')
+        for path in (self.path, other, third):
+            with self.pool.lease(path):
+                pass
+        self.assertTrue(self.opened[0].closed)
+        self.assertFalse(self.opened[1].closed)
+        self.assertFalse(self.opened[2].closed)
+        self.assertEqual(self.pool.stats()['open'], 2)
+
+    def test_file_change_uses_new_handle(self):
+        with self.pool.lease(self.path) as first:
+            pass
+        with open(self.path, 'ab') as handle:
+            handle.write(b'more')
+        with self.pool.lease(self.path) as second:
+            pass
+        self.assertIsNot(first, second)
+
+    def test_discard_closes_idle_handles(self):
+        with self.pool.lease(self.path) as archive:
+            pass
+        self.pool.discard(self.path)
+        self.assertTrue(archive.closed)
+        self.assertEqual(self.pool.stats()['open'], 0)
+        self.assertEqual(self.pool.stats()['idle'], 0)
+
+    def test_discard_while_leased_closes_on_release(self):
+        with self.pool.lease(self.path) as archive:
+            self.pool.discard(self.path)
+            self.assertFalse(archive.closed)
+        self.assertTrue(archive.closed)
+        self.assertEqual(self.pool.stats()['open'], 0)
+        with self.pool.lease(self.path) as fresh:
+            pass
+        self.assertIsNot(fresh, archive)
+
+    def test_handles_opened_after_discard_are_pooled(self):
+        self.pool.discard(self.path)
+        with self.pool.lease(self.path) as archive:
+            pass
+        self.assertFalse(archive.closed)
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+    def test_discard_only_affects_matching_path(self):
+        other = self._make_file('b.zip')
+        with self.pool.lease(self.path) as first, self.pool.lease(other) as second:
+            self.pool.discard(other)
+        self.assertFalse(first.closed)
+        self.assertTrue(second.closed)
+
+    def test_concurrent_discard_and_release(self):
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(200):
+                    with self.pool.lease(self.path):
+                        pass
+            except Exception as exc:
+                errors.append(exc)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for _ in range(50):
+            self.pool.discard(self.path)
+        for thread in threads:
+            thread.join()
+        self.pool.discard(self.path)
+        self.assertEqual(errors, [])
+        self.assertEqual(self.pool.stats()['open'], 0)
+        self.assertTrue(all(archive.closed for archive in self.opened))
+
+    def test_idle_handles_expire(self):
+        self.pool.configure(idle_timeout_s=1.0)
+        with self.pool.lease(self.path) as archive:
+            pass
+        time.sleep(1.05)
+        self.assertFalse(self.pool._sweep_expired())
+        self.assertTrue(archive.closed)
+
+
+if __name__ == '__main__':
+    unittest.main()
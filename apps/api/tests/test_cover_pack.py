@@ -0,0 +1,149 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from app.infrastructure.cover_pack import CoverPack
+
+
+class CoverPackTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.pack = CoverPack(self.tmp_dir, max_pack_bytes=1024 * 1024)
+
+    def tearDown(self):
+        conn = getattr(self.pack._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _seal_all(self):
+        self.pack._connect().execute('UPDATE packs SET sealed = 1')
+
+    def test_put_locate_and_read(self):
+        located = self.pack.put(1, 0, b'cover-1')
+        self.pack.put(1, 200, b'small')
+
+        self.assertEqual(self.pack.locate(1), located)
+        self.assertEqual(self.pack.read(1), b'cover-1')
+        self.assertEqual(self.pack.read(1, 200), b'small')
+        self.assertIsNone(self.pack.locate(2))
+        self.assertIsNone(self.pack.read(1, 400))
+        with open(located.path, 'rb') as handle:
+            handle.seek(located.offset)
+            self.assertEqual(handle.read(located.length), b'cover-1')
+
+    def test_existing_only_matches_width(self):
+        self.pack.put(1, 0, b'a')
+        self.pack.put(2, 200, b'b')
+
+        self.assertEqual(self.pack.existing([1, 2, 3]), {1})
+        self.assertEqual(self.pack.existing([1, 2, 3], 200), {2})
+
+    def test_rewrite_counts_old_bytes_as_dead(self):
+        first = self.pack.put(1, 0, b'x' * 100)
+        second = self.pack.put(1, 0, b'y' * 40)
+
+        self.assertGreater(second.version, first.version)
+        self.assertEqual(self.pack.read(1), b'y' * 40)
+        stats = self.pack.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], 140)
+        self.assertEqual(stats['live_bytes'], 40)
+
+    def test_delete_subtracts_live_bytes(self):
+        self.pack.put(1, 0, b'x' * 100)
+        self.pack.put(1, 200, b'x' * 30)
+        self.pack.put(2, 0, b'y' * 50)
+
+        self.assertEqual(self.pack.delete([1, 3]), 2)
+        self.assertEqual(self.pack.delete([]), 0)
+
+        self.assertIsNone(self.pack.locate(1))
+        self.assertIsNone(self.pack.locate(1, 200))
+        self.assertEqual(self.pack.read(2), b'y' * 50)
+        stats = self.pack.stats()
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], 180)
+        self.assertEqual(stats['live_bytes'], 50)
+
+    def test_delete_spans_packs(self):
+        small = CoverPack(self.tmp_dir, max_pack_bytes=100)
+        try:
+            small.put(1, 0, b'a' * 80)
+            small.put(2, 0, b'b' * 80)
+            self.assertNotEqual(small.locate(1).path, small.locate(2).path)
+
+            self.assertEqual(small.delete([1, 2]), 2)
+            stats = small.stats()
+            self.assertEqual(stats['packs'], 2)
+            self.assertEqual(stats['live_bytes'], 0)
+        finally:
+            small._local.conn.close()
+
+    def test_full_pack_is_sealed_and_a_new_one_started(self):
+        small = CoverPack(self.tmp_dir, max_pack_bytes=100)
+        try:
+            first = small.put(1, 0, b'a' * 60)
+            second = small.put(2, 0, b'b' * 60)
+            sealed = small._connect().execute('SELECT pack_id, sealed FROM packs ORDER BY pack_id').fetchall()
+        finally:
+            small._local.conn.close()
+
+        self.assertNotEqual(first.path, second.path)
+        self.assertEqual([row[1] for row in sealed], [1, 0])
+
+    def test_compact_moves_live_entries_and_removes_pack(self):
+        kept = self.pack.put(1, 0, b'keep' * 10)
+        self.pack.put(2, 0, b'drop' * 40)
+        self.pack.put(3, 200, b'variant')
+        self.pack.delete([2])
+        self._seal_all()
+        old_path = kept.path
+
+        result = self.pack.compact(min_dead_ratio=0.5)
+
+        self.assertEqual(result['packs'], 1)
+        self.assertEqual(result['moved'], 2)
+        self.assertEqual(result['removed'], 1)
+        self.assertFalse(os.path.exists(old_path))
+        moved = self.pack.locate(1)
+        self.assertNotEqual(moved.path, old_path)
+        # 搬移不改变版本（封面接口的 ETag 取版本）
+        self.assertEqual(moved.version, kept.version)
+        self.assertEqual(self.pack.read(1), b'keep' * 10)
+        self.assertEqual(self.pack.read(3, 200), b'variant')
+        stats = self.pack.stats()
+        self.assertEqual(stats['packs'], 1)
+        self.assertEqual(stats['bytes'], stats['live_bytes'])
+        self.assertEqual(stats['live_bytes'], 40 + len(b'variant'))
+
+    def test_compact_skips_packs_below_ratio_and_active_pack(self):
+        self.pack.put(1, 0, b'x' * 100)
+        self.pack.put(2, 0, b'y' * 10)
+        self.pack.delete([2])
+
+        # 当前包未封存，不参与压缩
+        self.assertEqual(self.pack.compact(min_dead_ratio=0.0)['packs'], 0)
+
+        self._seal_all()
+        self.assertEqual(self.pack.compact(min_dead_ratio=0.5)['packs'], 0)
+        self.assertEqual(self.pack.read(1), b'x' * 100)
+
+    def test_compact_drops_entries_of_missing_pack(self):
+        located = self.pack.put(1, 0, b'gone')
+        self._seal_all()
+        os.remove(located.path)
+        self.pack.put(2, 0, b'dead')
+        self.pack.delete([2])
+        self._seal_all()
+
+        result = self.pack.compact(min_dead_ratio=0.0)
+
+        self.assertEqual(result['removed'], 2)
+        self.assertIsNone(self.pack.locate(1))
+        self.assertEqual(self.pack.stats()['entries'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import py7zr
+
+from app.infrastructure.archive_pool import ArchiveHandlePool
+from app.infrastructure.seven_zip_reader import SevenZipPageReader, _BookInfo
+
+
+PAGE_COUNT = 12
+PAGE_SIZE = 40 * 1024
+
+
+class _NonSolidPageReader(SevenZipPageReader):
+    """py7zr 只能写出固实归档：按非固实归档处理同一文件，覆盖非固实分支。"""
+
+    def _book_info(self, key, targets):
+        info = super()._book_info(key, targets)
+        return _BookInfo(solid=False, order=info.order)
+
+
+class SevenZipPageReaderTestMixin:
+    reader_class = SevenZipPageReader
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'book.cb7')
+        self.pages = {f'{index:02d}.png': os.urandom(PAGE_SIZE) for index in range(PAGE_COUNT)}
+        with py7zr.SevenZipFile(self.path, 'w') as archive:
+            for name, data in self.pages.items():
+                archive.writestr(data, name)
+        self.names = sorted(self.pages)
+        self.pool = ArchiveHandlePool(lambda path: py7zr.SevenZipFile(path, 'r'), max_handles=4, idle_timeout_s=60.0)
+        self.reader = self._make_reader()
+
+    def tearDown(self):
+        self.reader.close_path(self.path)
+        self.pool.close_all()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _make_reader(self, **kwargs):
+        options = {'cache_budget_bytes': 64 * 1024 * 1024, 'read_ahead': 2, 'idle_timeout_s': 30.0, 'wait_timeout_s': 10.0}
+        options.update(kwargs)
+        return self.reader_class(self.pool, **options)
+
+    def _stream(self, name):
+        return b''.join(self.reader.iter_chunks(self.path, name, self.names, 8192))
+
+    def test_sequential_read(self):
+        for name in self.names:
+            self.assertEqual(self.reader.read(self.path, name, self.names), self.pages[name])
+
+    def test_sequential_stream(self):
+        for name in self.names:
+            self.assertEqual(self._stream(name), self.pages[name])
+        self.assertLessEqual(self.reader.stats()['sessions'], 1)
+
+    def test_jump_back_after_eviction(self):
+        # 缓存只容纳约一页：回跳时已解压的页被淘汰，只能重新解压
+        self.reader = self._make_reader(cache_budget_bytes=PAGE_SIZE + 1024)
+        for name in self.names:
+            self.assertEqual(self._stream(name), self.pages[name])
+        self.assertEqual(self._stream(self.names[1]), self.pages[self.names[1]])
+        self.assertEqual(self.reader.read(self.path, self.names[0], self.names), self.pages[self.names[0]])
+
+    def test_jump_forward_then_back(self):
+        self.assertEqual(self._stream(self.names[8]), self.pages[self.names[8]])
+        self.assertEqual(self._stream(self.names[2]), self.pages[self.names[2]])
+        self.assertEqual(self._stream(self.names[9]), self.pages[self.names[9]])
+
+    def test_close_path_while_decoding(self):
+        # read_ahead=0：解压线程在请求页之后阻塞等待，模拟解压进行中的会话
+        self.reader = self._make_reader(read_ahead=0, cache_budget_bytes=PAGE_SIZE + 1024)
+        chunks = self.reader.iter_chunks(self.path, self.names[0], self.names, 4096)
+        self.assertTrue(next(chunks))
+        sessions = list(self.reader._sessions.values())
+        self.assertEqual(len(sessions), 1)
+
+        started = time.monotonic()
+        self.reader.close_path(self.path, timeout_s=5.0)
+        self.assertLess(time.monotonic() - started, 5.0)
+        self.assertFalse(sessions[0]._thread.is_alive())
+        self.assertEqual(self.reader.stats()['sessions'], 0)
+        chunks.close()
+
+        # 关闭后仍可重新读取，且文件不再被会话占用
+        self.assertEqual(self._stream(self.names[3]), self.pages[self.names[3]])
+        self.reader.close_path(self.path)
+        self.pool.discard(self.path)
+        renamed = self.path + '.renamed'
+        os.rename(self.path, renamed)
+        self.assertTrue(os.path.exists(renamed))
+        self.path = renamed
+
+
+class SolidSevenZipPageReaderTestCase(SevenZipPageReaderTestMixin, unittest.TestCase):
+    reader_class = SevenZipPageReader
+
+    def test_archive_is_solid(self):
+        with py7zr.SevenZipFile(self.path, 'r') as archive:
+            self.assertTrue(archive.archiveinfo().solid)
+
+
+class NonSolidSevenZipPageReaderTestCase(SevenZipPageReaderTestMixin, unittest.TestCase):
+    reader_class = _NonSolidPageReader
+
+    def test_stream_session_covers_only_following_pages(self):
+        self.assertEqual(self._stream(self.names[5]), self.pages[self.names[5]])
+        session = self.reader._sessions[next(iter(self.reader._sessions))]
+        self.assertEqual(session._target_set, set(self.names[5:]))
+        self.assertFalse(session.can_serve(self.names[4]))
+
+
+if __name__ == '__main__':
+    unittest.main()
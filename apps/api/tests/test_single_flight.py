@@ -0,0 +1,120 @@
+import threading
+import time
+import unittest
+
+from app.infrastructure.single_flight import SingleFlight
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def _run_concurrently(self, flight, key, fn, count):
+        """启动 count 个并发调用，返回 (结果列表, 异常列表)。"""
+        results = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            try:
+                value = flight.do(key, fn)
+                with lock:
+                    results.append(value)
+            except Exception as exc:
+                with lock:
+                    errors.append(exc)
+
+        threads = [threading.Thread(target=worker) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results, errors
+
+    def _wait_followers(self, flight, key, count, timeout_s=5.0):
+        deadline = time.monotonic() + timeout_s
+        while time.monotonic() < deadline:
+            with flight._lock:
+                call = flight._calls.get(key)
+                if call is not None and call.followers >= count:
+                    return
+            time.sleep(0.005)
+        self.fail('followers did not arrive')
+
+    def test_followers_share_leader_result(self):
+        flight = SingleFlight(timeout_s=5.0)
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            release.wait(5.0)
+            return object()
+
+        threads, results, errors = self._run_concurrently(flight, 'page', compute, 5)
+        self._wait_followers(flight, 'page', 4)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(result is results[0] for result in results))
+        stats = flight.stats()
+        self.assertEqual(stats['leaders'], 1)
+        self.assertEqual(stats['shared'], 4)
+        self.assertEqual(stats['inflight'], 0)
+
+    def test_error_propagates_to_followers(self):
+        flight = SingleFlight(timeout_s=5.0)
+        release = threading.Event()
+
+        def compute():
+            release.wait(5.0)
+            raise ValueError('decode failed')
+
+        threads, results, errors = self._run_concurrently(flight, 'page', compute, 3)
+        self._wait_followers(flight, 'page', 2)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [])
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(all(isinstance(exc, ValueError) for exc in errors))
+        self.assertEqual(flight.stats()['errors'], 1)
+
+    def test_follower_runs_itself_after_timeout(self):
+        flight = SingleFlight(timeout_s=0.1)
+        release = threading.Event()
+        leader_started = threading.Event()
+
+        def slow():
+            leader_started.set()
+            release.wait(5.0)
+            return 'leader'
+
+        threads, leader_results, _ = self._run_concurrently(flight, 'page', slow, 1)
+        self.assertTrue(leader_started.wait(5.0))
+        started = time.monotonic()
+        self.assertEqual(flight.do('page', lambda: 'follower'), 'follower')
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertEqual(flight.stats()['timeouts'], 1)
+
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(leader_results, ['leader'])
+
+    def test_results_are_not_cached(self):
+        flight = SingleFlight(timeout_s=1.0)
+        counter = iter(range(10))
+        self.assertEqual(flight.do('page', lambda: next(counter)), 0)
+        self.assertEqual(flight.do('page', lambda: next(counter)), 1)
+        self.assertEqual(flight.stats()['leaders'], 2)
+
+    def test_different_keys_run_independently(self):
+        flight = SingleFlight(timeout_s=1.0)
+        self.assertEqual(flight.do('a', lambda: 'a'), 'a')
+        self.assertEqual(flight.do('b', lambda: 'b'), 'b')
+        self.assertEqual(flight.stats()['shared'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from flask import Flask
+
+from app.api.v1.files import build_stored_page_response
+
+
+STRONG_ETAG = '"page-digest"'
+WEAK_ETAG = 'W/"page-digest"'
+
+
+class StoredPageResponseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'book.cbz')
+        self.prefix = b'PK-header-'
+        self.page = bytes(range(256)) * 4
+        with open(self.path, 'wb') as handle:
+            handle.write(self.prefix + self.page + b'-trailer')
+        self.app = Flask(__name__)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def _get(self, headers=None, etag_value=STRONG_ETAG):
+        with self.app.test_request_context('/', headers=headers or {}):
+            response = build_stored_page_response(
+                self.path,
+                (len(self.prefix), len(self.page)),
+                'image/jpeg',
+                etag_value,
+                64,
+            )
+            if response is None:
+                return None, b''
+            response.direct_passthrough = False
+            body = response.get_data()
+            response.close()
+            return response, body
+
+    def test_full_response(self):
+        response, body = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.page)
+        self.assertEqual(response.headers['Content-Length'], str(len(self.page)))
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertNotIn('Content-Range', response.headers)
+
+    def test_closed_range(self):
+        response, body = self._get({'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.page[10:20])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 10-19/{len(self.page)}')
+        self.assertEqual(response.headers['Content-Length'], '10')
+
+    def test_open_ended_range(self):
+        response, body = self._get({'Range': 'bytes=1000-'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.page[1000:])
+        self.assertEqual(response.headers['Content-Range'], f'bytes 1000-{len(self.page) - 1}/{len(self.page)}')
+
+    def test_suffix_range(self):
+        response, body = self._get({'Range': 'bytes=-5'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.page[-5:])
+        self.assertEqual(response.headers['Content-Range'], f'bytes {len(self.page) - 5}-{len(self.page) - 1}/{len(self.page)}')
+
+    def test_unsatisfiable_range(self):
+        response, body = self._get({'Range': f'bytes={len(self.page)}-'})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response.headers['Content-Range'], f'bytes */{len(self.page)}')
+        self.assertEqual(body, b'')
+
+    def test_multiple_ranges_return_full_page(self):
+        response, body = self._get({'Range': 'bytes=0-1,5-6'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.page)
+
+    def test_if_range_matching_etag(self):
+        response, body = self._get({'Range': 'bytes=0-9', 'If-Range': STRONG_ETAG})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(body, self.page[:10])
+
+    def test_if_range_mismatched_etag(self):
+        response, body = self._get({'Range': 'bytes=0-9', 'If-Range': '"stale-digest"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.page)
+
+    def test_if_range_date_returns_full_page(self):
+        response, _ = self._get({'Range': 'bytes=0-9', 'If-Range': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_weak_etag_never_yields_partial_content(self):
+        for if_range in (WEAK_ETAG, STRONG_ETAG):
+            with self.subTest(if_range=if_range):
+                response, body = self._get({'Range': 'bytes=0-9', 'If-Range': if_range}, etag_value=WEAK_ETAG)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(body, self.page)
+
+    def test_if_range_without_etag_returns_full_page(self):
+        response, _ = self._get({'Range': 'bytes=0-9', 'If-Range': STRONG_ETAG}, etag_value=None)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unreadable_file_returns_none(self):
+        os.remove(self.path)
+        response, _ = self._get({'Range': 'bytes=0-9'})
+        self.assertIsNone(response)
+
+
+if __name__ == '__main__':
+    unittest.main()
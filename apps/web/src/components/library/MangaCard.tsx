@@ -7,7 +7,7 @@ import { useTranslation } from 'react-i18next'
 import { useNavigate } from 'react-router-dom'
 import { http } from '@/api/http'
 import { useAppSettingsStore } from '@/store/appSettings'
-import type { LibraryCardFieldKey } from '@/store/uiSettings'
+import type { LibraryCardFieldKey, LibraryGridColumns } from '@/store/uiSettings'
 import { useUiSettingsStore } from '@/store/uiSettings'
 
 export type MangaTag = {
@@ -22,6 +22,7 @@ export type MangaItem = {
   display_name?: string | null
   folder_name?: string | null
   cover_url?: string | null
+  cover_srcset?: string | null
   file_size?: number | null
   total_pages?: number | null
   last_read_page?: number | null
@@ -51,6 +52,24 @@ const escapeXml = (value: unknown) =>
     .replaceAll('"', '&quot;')
     .replaceAll("'", '&apos;')
 
+// 与 library.css 中 .manga-grid 的断点一致（由宽到窄）
+const gridBreakpoints: Array<[keyof LibraryGridColumns, number]> = [
+  ['2xl', 1536],
+  ['xl', 1280],
+  ['lg', 1024],
+  ['md', 768],
+  ['sm', 640]
+]
+
+// 列表视图封面列宽为 140px（窄屏 120px）
+const LIST_COVER_SIZES = '140px'
+
+const buildGridCoverSizes = (columns: LibraryGridColumns) =>
+  [
+    ...gridBreakpoints.map(([key, minWidth]) => `(min-width: ${minWidth}px) ${Math.ceil(100 / Math.max(1, columns[key]))}vw`),
+    `${Math.ceil(100 / Math.max(1, columns.base))}vw`
+  ].join(', ')
+
 const formatDateTime = (value: string | null | undefined) => {
   if (!value) {
     return ''
@@ -69,6 +88,12 @@ export default function MangaCard({ manga, hideWishlistButton = false, viewMode
   const libraryLazyRootMarginPx = useAppSettingsStore((state) => state.libraryLazyRootMarginPx)
   const libraryCardFields = useUiSettingsStore((state) => state.libraryCardFields)
   const libraryAuthorTagTypeId = useUiSettingsStore((state) => state.libraryAuthorTagTypeId)
+  const libraryGridColumns = useUiSettingsStore((state) => state.libraryGridColumns)
+
+  const coverSizes = useMemo(
+    () => (viewMode === 'list' ? LIST_COVER_SIZES : buildGridCoverSizes(libraryGridColumns)),
+    [libraryGridColumns, viewMode]
+  )
 
   const visibleFields = useMemo<LibraryCardFieldKey[]>(
     () => (viewMode === 'list' ? libraryCardFields.list : libraryCardFields.grid),
@@ -354,8 +379,17 @@ export default function MangaCard({ manga, hideWishlistButton = false, viewMode
     if (!shouldLoadCover || !coverUrl) {
       return <div className="manga-card-cover__placeholder" />
     }
-    return <img src={coverUrl} alt={displayName} loading="lazy" onError={(event) => ((event.currentTarget.src = fallbackCover), undefined)} />
-  }, [displayName, fallbackCover, manga.cover_url, shouldLoadCover])
+    return (
+      <img
+        src={coverUrl}
+        srcSet={manga.cover_srcset || undefined}
+        sizes={manga.cover_srcset ? coverSizes : undefined}
+        alt={displayName}
+        loading="lazy"
+        onError={(event) => ((event.currentTarget.srcset = ''), (event.currentTarget.src = fallbackCover), undefined)}
+      />
+    )
+  }, [coverSizes, displayName, fallbackCover, manga.cover_srcset, manga.cover_url, shouldLoadCover])
 
   const progressBar =
     hasField('progress_bar') && totalPages > 0 ? (
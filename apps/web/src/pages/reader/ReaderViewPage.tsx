@@ -12,6 +12,7 @@ import { type BookmarkRecord, useReaderBookmarks } from '@/pages/reader/hooks/us
 import { useReaderFileInfo } from '@/pages/reader/hooks/useReaderFileInfo'
 import { useReaderManga } from '@/pages/reader/hooks/useReaderManga'
 import { useReaderStyleVars } from '@/pages/reader/hooks/useReaderStyleVars'
+import { useReaderThroughputReporter } from '@/pages/reader/hooks/useReaderThroughputReporter'
 import { useReaderToolbarUi } from '@/pages/reader/hooks/useReaderToolbarUi'
 import type { ReaderPanelKey } from '@/pages/reader/types'
 import { DEFAULT_READER_TAP_ZONES, type ReaderTapZoneAction, type ReaderTapZonesConfig } from '@/store/appSettings'
@@ -69,6 +70,7 @@ export default function ReaderViewPage() {
   const { bookmarks: bookmarkList, refresh: refreshBookmarks, isBookmarked, add: addBookmark, update: updateBookmark, remove: removeBookmark } =
     useReaderBookmarks(id)
   const { loading: fileInfoLoading, error: fileInfoError, data: fileInfoData, reset: resetFileInfo, fetch: fetchFileInfo } = useReaderFileInfo(id)
+  useReaderThroughputReporter(Boolean(id))
 
   const [isPagingEnabled, setIsPagingEnabled] = useState(() => Boolean(readerSplitDefaultEnabled))
   const [isCurrentImageWide, setIsCurrentImageWide] = useState(false)
@@ -0,0 +1,54 @@
+import { useEffect } from 'react'
+import { http } from '@/api/http'
+
+// 页图下载吞吐样本：取浏览器 Resource Timing 的实际传输字节（transferSize）与响应体下载耗时，
+// 定期上报给后端用于自动分辨率。服务端只能看到写入 socket/反向代理的时间，无法代替客户端测量。
+const PAGE_URL_PATTERN = /\/api\/v1\/files\/\d+\/pages(\/\d+)?(\?|$)/
+// 过小的响应主要受往返延迟影响，不作为样本（与后端估计器的下限一致）
+const MIN_SAMPLE_BYTES = 64 * 1024
+const FLUSH_INTERVAL_MS = 15000
+const MAX_PENDING_SAMPLES = 20
+
+type ThroughputSample = {
+  bytes: number
+  ms: number
+}
+
+export const useReaderThroughputReporter = (enabled: boolean) => {
+  useEffect(() => {
+    if (!enabled || typeof PerformanceObserver === 'undefined') return
+
+    let pending: ThroughputSample[] = []
+
+    const flush = () => {
+      if (!pending.length) return
+      const samples = pending
+      pending = []
+      http.post('/api/v1/reader/throughput-samples', { samples }).catch(() => undefined)
+    }
+
+    const observer = new PerformanceObserver((list) => {
+      for (const entry of list.getEntries() as PerformanceResourceTiming[]) {
+        if (!PAGE_URL_PATTERN.test(entry.name)) continue
+        // transferSize 为 0 表示命中浏览器缓存；responseStart 之前的等待包含服务端渲染时间，不计入下载耗时
+        const ms = entry.responseEnd - entry.responseStart
+        if (entry.transferSize < MIN_SAMPLE_BYTES || ms <= 0) continue
+        pending.push({ bytes: entry.transferSize, ms: Math.round(ms * 10) / 10 })
+      }
+      if (pending.length >= MAX_PENDING_SAMPLES) flush()
+    })
+
+    try {
+      observer.observe({ type: 'resource' })
+    } catch {
+      return
+    }
+    const timer = setInterval(flush, FLUSH_INTERVAL_MS)
+
+    return () => {
+      observer.disconnect()
+      clearInterval(timer)
+      flush()
+    }
+  }, [enabled])
+}